@@ -0,0 +1,29 @@
+import pytest
+import numpy as np
+
+import pyn5
+
+pytest.importorskip("pytest_benchmark")
+
+
+@pytest.fixture
+def random():
+    return np.random.RandomState(1991)
+
+
+@pytest.fixture
+def file_(tmp_path):
+    yield pyn5.File(tmp_path / "bench.n5", "a")
+
+
+@pytest.fixture
+def h5_file(tmp_path):
+    h5py = pytest.importorskip("h5py")
+    with h5py.File(tmp_path / "bench.hdf5", "a") as f:
+        yield f
+
+
+@pytest.fixture
+def z5_file(tmp_path):
+    z5py = pytest.importorskip("z5py")
+    yield z5py.N5File(str(tmp_path / "bench_z5.n5"), "a")
@@ -0,0 +1,40 @@
+"""Compare reading in N5 axis order then making the result C-contiguous
+against reading directly in C order."""
+
+import numpy as np
+import pytest
+
+SHAPE = (128, 128, 128)
+CHUNKS = (64, 64, 64)
+
+
+@pytest.fixture
+def dataset(file_, random):
+    data = random.randint(0, 255, SHAPE, dtype=np.uint8)
+    ds = file_.create_dataset("ds", data=data, chunks=CHUNKS, compression="raw")
+    return ds._impl
+
+
+def read_f_order(impl):
+    arr = impl.read_ndarray([0, 0, 0], SHAPE[::-1]).transpose()
+    # as required by most C extensions
+    return np.ascontiguousarray(arr)
+
+
+def read_c_order(impl):
+    arr = impl.read_ndarray([0, 0, 0], SHAPE, c_order=True)
+    return np.ascontiguousarray(arr)
+
+
+@pytest.mark.benchmark(group="axis_order")
+def test_read_f_order(benchmark, dataset):
+    benchmark(read_f_order, dataset)
+
+
+@pytest.mark.benchmark(group="axis_order")
+def test_read_c_order(benchmark, dataset):
+    arr = dataset.read_ndarray([0, 0, 0], SHAPE, c_order=True)
+    assert arr.flags.c_contiguous
+    assert np.ascontiguousarray(arr) is arr
+
+    benchmark(read_c_order, dataset)
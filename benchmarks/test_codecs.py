@@ -0,0 +1,58 @@
+"""Read and write throughput, and compression ratio, of each codec
+for several dtypes and chunk sizes.
+
+Data is smooth with some noise, roughly like microscopy images."""
+
+import numpy as np
+import pytest
+
+from pyn5 import CompressionType
+
+SHAPE = (128, 128, 128)
+CODECS = [c.value for c in CompressionType]
+DTYPES = ["uint8", "uint16", "float32"]
+CHUNKS = [(32, 32, 32), (64, 64, 64), (128, 128, 128)]
+
+
+def make_data(random, dtype):
+    z, y, x = np.indices(SHAPE)
+    smooth = 100 + 50 * np.sin(z / 10) * np.cos(y / 15) + x / 4
+    data = smooth + random.normal(0, 5, SHAPE)
+    return data.astype(dtype)
+
+
+def chunk_id(chunks):
+    return "x".join(str(c) for c in chunks)
+
+
+@pytest.fixture(params=DTYPES)
+def data(request, random):
+    return make_data(random, request.param)
+
+
+@pytest.mark.parametrize("chunks", CHUNKS, ids=chunk_id)
+@pytest.mark.parametrize("codec", CODECS)
+@pytest.mark.benchmark(group="codec_write")
+def test_write(benchmark, file_, data, codec, chunks):
+    ds = file_.create_dataset(
+        "ds", shape=SHAPE, dtype=data.dtype, chunks=chunks, compression=codec
+    )
+
+    def write():
+        ds[...] = data
+
+    benchmark(write)
+    benchmark.extra_info["MB/s"] = data.nbytes / 1e6 / benchmark.stats.stats.mean
+    benchmark.extra_info["compression_ratio"] = ds.compression_ratio
+
+
+@pytest.mark.parametrize("chunks", CHUNKS, ids=chunk_id)
+@pytest.mark.parametrize("codec", CODECS)
+@pytest.mark.benchmark(group="codec_read")
+def test_read(benchmark, file_, data, codec, chunks):
+    ds = file_.create_dataset("ds", data=data, chunks=chunks, compression=codec)
+
+    result = benchmark(ds.__getitem__, Ellipsis)
+    np.testing.assert_equal(result, data)
+    benchmark.extra_info["MB/s"] = data.nbytes / 1e6 / benchmark.stats.stats.mean
+    benchmark.extra_info["compression_ratio"] = ds.compression_ratio
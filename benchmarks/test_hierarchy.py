@@ -0,0 +1,42 @@
+"""Time to walk a container with many small groups (e.g. one per cell or tile),
+with and without the hierarchy cache."""
+
+import pytest
+
+import pyn5
+
+N_GROUPS = 2000
+
+
+@pytest.fixture
+def container(tmp_path):
+    path = tmp_path / "many.n5"
+    f = pyn5.File(path, "a")
+    for i in range(N_GROUPS):
+        g = f.create_group(f"tiles/{i // 100}/{i}")
+        g.attrs["offset"] = [i, i, i]
+        g.create_dataset("mask", shape=(8, 8), dtype="uint8", chunks=(8, 8))
+    return path
+
+
+@pytest.mark.parametrize("cache_hierarchy", [False, True])
+@pytest.mark.benchmark(group="hierarchy")
+def test_visititems(benchmark, container, cache_hierarchy):
+    def visit():
+        f = pyn5.File(container, "r", cache_hierarchy=cache_hierarchy)
+        found = []
+        f.visititems(lambda name, obj: found.append(obj.attrs.get("offset")))
+        return found
+
+    found = benchmark(visit)
+    assert len(found) == 1 + 20 + 2 * N_GROUPS
+
+
+@pytest.mark.benchmark(group="hierarchy")
+def test_contains_cached(benchmark, container):
+    f = pyn5.File(container, "r", cache_hierarchy=True)
+
+    def contains():
+        return sum(f"tiles/{i // 100}/{i}/mask" in f for i in range(N_GROUPS))
+
+    assert benchmark(contains) == N_GROUPS
@@ -0,0 +1,24 @@
+"""Compare reads of an uncompressed dataset through the decoder, by memory-mapping
+chunk files, and as views onto mapped chunks, for whole-chunk and multi-chunk reads."""
+
+import numpy as np
+import pytest
+
+SHAPE = (128, 256, 256)
+CHUNKS = (64, 64, 64)
+
+
+@pytest.mark.parametrize("roi", ["chunk", "multi_chunk"])
+@pytest.mark.parametrize("dtype", ["uint8", "uint16"])
+@pytest.mark.parametrize("mode", ["decode", "mmap", "mmap_views"])
+@pytest.mark.benchmark(group="mmap_read")
+def test_read_raw(benchmark, file_, random, roi, dtype, mode):
+    data = random.randint(0, 256, SHAPE).astype(dtype)
+    ds = file_.create_dataset("ds", data=data, chunks=CHUNKS, compression="raw")
+    ds.use_mmap = mode != "decode"
+    ds.mmap_views = mode == "mmap_views"
+    sl = np.s_[:64, 64:128, :64] if roi == "chunk" else np.s_[32:96, 32:224, 32:224]
+
+    arr = benchmark(ds.__getitem__, sl)
+    np.testing.assert_equal(arr, data[sl])
+    benchmark.extra_info["MB/s"] = arr.nbytes / 1e6 / benchmark.stats.stats.mean
@@ -0,0 +1,36 @@
+"""Time to open many small datasets, as workers processing one tile each do."""
+
+import pytest
+
+import pyn5
+
+N_DATASETS = 200
+
+
+@pytest.fixture
+def container(tmp_path):
+    path = tmp_path / "small.n5"
+    f = pyn5.File(path, "a")
+    for i in range(N_DATASETS):
+        f.create_dataset(f"ds{i}", shape=(16, 16), dtype="uint8", chunks=(16, 16))
+    return path
+
+
+@pytest.mark.benchmark(group="open")
+def test_open_h5_like(benchmark, container):
+    f = pyn5.File(container, "r")
+
+    def open_all():
+        return [f[f"ds{i}"] for i in range(N_DATASETS)]
+
+    benchmark(open_all)
+    benchmark.extra_info["datasets/s"] = N_DATASETS / benchmark.stats.stats.mean
+
+
+@pytest.mark.benchmark(group="open")
+def test_open_wrapper(benchmark, container):
+    def open_all():
+        return [pyn5.open(str(container), f"ds{i}") for i in range(N_DATASETS)]
+
+    benchmark(open_all)
+    benchmark.extra_info["datasets/s"] = N_DATASETS / benchmark.stats.stats.mean
@@ -0,0 +1,22 @@
+"""Compare sampling scattered voxels one at a time with batched point reads."""
+
+import numpy as np
+import pytest
+
+SHAPE = (128, 128, 128)
+CHUNKS = (32, 32, 32)
+N_POINTS = 10000
+
+
+@pytest.mark.parametrize("batched", [True, False])
+@pytest.mark.benchmark(group="read_points")
+def test_read_points(benchmark, file_, random, batched):
+    data = random.randint(0, 2**16, SHAPE).astype(np.uint32)
+    ds = file_.create_dataset("ds", data=data, chunks=CHUNKS, compression="gzip")
+    coords = np.stack([random.randint(0, n, N_POINTS) for n in SHAPE], axis=1)
+
+    if batched:
+        arr = benchmark(ds.read_points, coords)
+    else:
+        arr = benchmark(lambda: np.array([ds[tuple(c)] for c in coords]))
+    np.testing.assert_equal(arr, data[tuple(coords.T)])
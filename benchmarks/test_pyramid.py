@@ -0,0 +1,33 @@
+"""Throughput of building a 3-level pyramid with each downsampling method,
+for intensity images and uint64 labels."""
+
+import numpy as np
+import pytest
+
+from pyn5 import build_pyramid
+
+SHAPE = (128, 128, 128)
+CHUNKS = (64, 64, 64)
+FACTORS = [2, 2, 2]
+
+
+def make_labels(random):
+    """Blocky labels with large ids, roughly like a segmentation"""
+    coarse = random.randint(0, 2**40, tuple(s // 8 for s in SHAPE), dtype=np.uint64)
+    return np.kron(coarse, np.ones((8, 8, 8), dtype=np.uint64))
+
+
+@pytest.mark.parametrize(
+    "dtype,method",
+    [("uint8", "mean"), ("uint8", "max"), ("uint64", "mode"), ("float32", "mean")],
+)
+@pytest.mark.benchmark(group="pyramid")
+def test_build_pyramid(benchmark, file_, random, dtype, method):
+    if dtype == "uint64":
+        data = make_labels(random)
+    else:
+        data = random.randint(0, 256, SHAPE).astype(dtype)
+    s0 = file_.create_dataset("pyr/s0", data=data, chunks=CHUNKS, compression="raw")
+
+    benchmark(build_pyramid, s0, FACTORS, method)
+    benchmark.extra_info["MB/s"] = data.nbytes / 1e6 / benchmark.stats.stats.mean
@@ -0,0 +1,33 @@
+"""Compare reading a training batch of random crops one at a time with one batched read."""
+
+import numpy as np
+import pytest
+
+SHAPE = (128, 256, 256)
+CHUNKS = (16, 64, 64)
+CROP = (8, 64, 64)
+BATCH = 256
+
+
+@pytest.mark.parametrize("batched", [True, False])
+@pytest.mark.benchmark(group="read_many")
+def test_read_many(benchmark, file_, random, batched):
+    data = random.randint(0, 256, SHAPE).astype(np.uint8)
+    ds = file_.create_dataset("ds", data=data, chunks=CHUNKS, compression="gzip")
+    offsets = np.stack(
+        [random.randint(0, n - c + 1, BATCH) for n, c in zip(SHAPE, CROP)], axis=1
+    )
+
+    def one_at_a_time():
+        return np.stack(
+            [
+                ds[tuple(slice(o, o + c) for o, c in zip(offset, CROP))]
+                for offset in offsets
+            ]
+        )
+
+    if batched:
+        arr = benchmark(ds.read_many, offsets, CROP)
+    else:
+        arr = benchmark(one_at_a_time)
+    assert arr.shape == (BATCH,) + CROP
@@ -0,0 +1,48 @@
+"""Compare writing a sparse volume with and without skipping chunks
+which are entirely the fill value."""
+
+import numpy as np
+import pytest
+
+SHAPE = (128, 128, 128)
+CHUNKS = (32, 32, 32)
+
+
+@pytest.fixture
+def sparse_data(random):
+    """~95% of chunks are empty"""
+    data = np.zeros(SHAPE, dtype=np.uint64)
+    data[:32, :32, :96] = random.randint(1, 1000, (32, 32, 96), dtype=np.uint64)
+    return data
+
+
+def stored_bytes(ds):
+    return sum(p.stat().st_size for p in ds._path.glob("**/*") if p.is_file())
+
+
+@pytest.mark.parametrize("write_empty_chunks", [True, False])
+@pytest.mark.benchmark(group="sparse_write")
+def test_write_sparse(benchmark, file_, sparse_data, write_empty_chunks):
+    ds = file_.create_dataset(
+        "ds", shape=SHAPE, dtype=sparse_data.dtype, chunks=CHUNKS, compression="gzip"
+    )
+    ds.write_empty_chunks = write_empty_chunks
+
+    def write():
+        ds[...] = sparse_data
+
+    benchmark(write)
+    benchmark.extra_info["stored_bytes"] = stored_bytes(ds)
+    np.testing.assert_equal(ds[...], sparse_data)
+
+
+@pytest.mark.parametrize("write_empty_chunks", [True, False])
+@pytest.mark.benchmark(group="sparse_read")
+def test_read_sparse(benchmark, file_, sparse_data, write_empty_chunks):
+    ds = file_.create_dataset(
+        "ds", shape=SHAPE, dtype=sparse_data.dtype, chunks=CHUNKS, compression="gzip"
+    )
+    ds.write_empty_chunks = write_empty_chunks
+    ds[...] = sparse_data
+
+    benchmark(ds.__getitem__, Ellipsis)
@@ -0,0 +1,23 @@
+"""Overhead of collecting I/O statistics, on reads of many small chunks."""
+
+import numpy as np
+import pytest
+
+import pyn5
+
+SHAPE = (64, 256, 256)
+CHUNKS = (8, 32, 32)
+
+
+@pytest.mark.parametrize("enabled", [False, True])
+@pytest.mark.benchmark(group="stats")
+def test_read_stats(benchmark, file_, random, enabled):
+    data = random.randint(0, 256, SHAPE).astype(np.uint8)
+    ds = file_.create_dataset("ds", data=data, chunks=CHUNKS, compression="raw")
+
+    pyn5.set_stats_enabled(enabled)
+    try:
+        benchmark(ds.__getitem__, Ellipsis)
+    finally:
+        pyn5.set_stats_enabled(False)
+    benchmark.extra_info["stats"] = ds.stats()
@@ -0,0 +1,23 @@
+"""Compare strided reads (e.g. for thumbnails) with reading the whole region
+and striding it in numpy."""
+
+import numpy as np
+import pytest
+
+SHAPE = (128, 128, 128)
+CHUNKS = (16, 16, 16)
+
+
+@pytest.mark.parametrize("step", [2, 4, 32])
+@pytest.mark.parametrize("pushdown", [True, False])
+@pytest.mark.benchmark(group="strided_read")
+def test_read_strided(benchmark, file_, random, step, pushdown):
+    data = random.randint(0, 256, SHAPE).astype(np.uint8)
+    ds = file_.create_dataset("ds", data=data, chunks=CHUNKS, compression="gzip")
+    sl = (slice(None, None, step),) * len(SHAPE)
+
+    if pushdown:
+        arr = benchmark(ds.__getitem__, sl)
+    else:
+        arr = benchmark(lambda: ds[...][sl])
+    np.testing.assert_equal(arr, data[sl])
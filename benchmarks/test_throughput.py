@@ -0,0 +1,170 @@
+"""Read and write throughput and latency across dtypes, chunk shapes, compression,
+ROI alignment and thread counts, through the rust API, the h5py-like API and
+``python_wrappers``, with h5py and z5py as baselines where they are installed.
+
+Every benchmark reports MB/s of uncompressed data in ``extra_info``."""
+
+import numpy as np
+import pytest
+
+import pyn5
+
+SHAPE = (128, 256, 256)
+DTYPES = ["uint8", "uint16", "float32"]
+CHUNKS = [(32, 32, 32), (64, 64, 64), (16, 128, 128)]
+COMPRESSIONS = ["raw", "gzip"]
+# the same size, either aligned to every chunk shape or to none
+ROIS = {
+    "aligned": np.s_[64:128, 128:256, 0:128],
+    "unaligned": np.s_[37:101, 75:203, 51:179],
+}
+THREADS = [1, 4, None]
+
+
+def chunk_id(chunks):
+    return "x".join(str(c) for c in chunks)
+
+
+def start_shape(roi):
+    return [sl.start for sl in roi], [sl.stop - sl.start for sl in roi]
+
+
+def report(benchmark, nbytes):
+    benchmark.extra_info["MB/s"] = nbytes / 1e6 / benchmark.stats.stats.mean
+
+
+@pytest.fixture(params=DTYPES)
+def data(request, random):
+    # a narrow range, so that compression has something to do
+    return random.randint(0, 64, SHAPE).astype(request.param)
+
+
+@pytest.fixture(params=CHUNKS, ids=chunk_id)
+def chunks(request):
+    return request.param
+
+
+@pytest.fixture(params=COMPRESSIONS)
+def compression(request):
+    return request.param
+
+
+@pytest.fixture
+def dataset(file_, data, chunks, compression):
+    return file_.create_dataset("ds", data=data, chunks=chunks, compression=compression)
+
+
+@pytest.mark.parametrize("threads", THREADS, ids=str)
+@pytest.mark.parametrize("roi", ROIS)
+@pytest.mark.benchmark(group="read_ndarray")
+def test_read_ndarray(benchmark, dataset, data, roi, threads):
+    dataset.threads = threads
+    start, shape = start_shape(ROIS[roi])
+
+    arr = benchmark(dataset._impl.read_ndarray, start, shape, c_order=True)
+    np.testing.assert_equal(arr, data[ROIS[roi]])
+    report(benchmark, arr.nbytes)
+
+
+@pytest.mark.parametrize("threads", THREADS, ids=str)
+@pytest.mark.parametrize("roi", ROIS)
+@pytest.mark.benchmark(group="write_ndarray")
+def test_write_ndarray(benchmark, dataset, data, roi, threads):
+    dataset.threads = threads
+    start, _ = start_shape(ROIS[roi])
+    arr = np.ascontiguousarray(data[ROIS[roi]])
+
+    benchmark(dataset._impl.write_ndarray, start, arr, dataset.fillvalue, c_order=True)
+    report(benchmark, arr.nbytes)
+
+
+@pytest.mark.parametrize("roi", ROIS)
+@pytest.mark.benchmark(group="getitem")
+def test_getitem(benchmark, dataset, data, roi):
+    arr = benchmark(dataset.__getitem__, ROIS[roi])
+    np.testing.assert_equal(arr, data[ROIS[roi]])
+    report(benchmark, arr.nbytes)
+
+
+@pytest.mark.parametrize("roi", ROIS)
+@pytest.mark.benchmark(group="setitem")
+def test_setitem(benchmark, dataset, data, roi):
+    arr = data[ROIS[roi]]
+
+    benchmark(dataset.__setitem__, ROIS[roi], arr)
+    report(benchmark, arr.nbytes)
+
+
+@pytest.mark.parametrize("roi", ROIS)
+@pytest.mark.benchmark(group="wrapper_write")
+def test_wrapper_write(benchmark, dataset, data, roi):
+    start, shape = start_shape(ROIS[roi])
+    # python_wrappers uses N5 axis order
+    bounds = (np.array(start[::-1]), np.array(start[::-1]) + shape[::-1])
+    arr = data[ROIS[roi]].T
+
+    benchmark(pyn5.write, dataset._impl, bounds, arr, data.dtype)
+    report(benchmark, arr.nbytes)
+
+
+@pytest.mark.parametrize("size", ["voxel", "chunk"])
+@pytest.mark.benchmark(group="read_latency")
+def test_read_latency(benchmark, file_, random, size):
+    data = random.randint(0, 64, SHAPE).astype(np.uint8)
+    ds = file_.create_dataset("ds", data=data, chunks=(64, 64, 64), compression="gzip")
+    sl = np.s_[70, 80, 90] if size == "voxel" else np.s_[64:128, 64:128, 64:128]
+
+    benchmark(ds.__getitem__, sl)
+
+
+@pytest.mark.parametrize("roi", ROIS)
+@pytest.mark.benchmark(group="getitem")
+def test_getitem_h5py(benchmark, h5_file, data, chunks, compression, roi):
+    ds = h5_file.create_dataset(
+        "ds",
+        data=data,
+        chunks=chunks,
+        compression=None if compression == "raw" else "gzip",
+    )
+
+    arr = benchmark(ds.__getitem__, ROIS[roi])
+    np.testing.assert_equal(arr, data[ROIS[roi]])
+    report(benchmark, arr.nbytes)
+
+
+@pytest.mark.parametrize("roi", ROIS)
+@pytest.mark.benchmark(group="setitem")
+def test_setitem_h5py(benchmark, h5_file, data, chunks, compression, roi):
+    ds = h5_file.create_dataset(
+        "ds",
+        shape=SHAPE,
+        dtype=data.dtype,
+        chunks=chunks,
+        compression=None if compression == "raw" else "gzip",
+    )
+    arr = data[ROIS[roi]]
+
+    benchmark(ds.__setitem__, ROIS[roi], arr)
+    report(benchmark, arr.nbytes)
+
+
+@pytest.mark.parametrize("roi", ROIS)
+@pytest.mark.benchmark(group="getitem")
+def test_getitem_z5py(benchmark, z5_file, data, chunks, compression, roi):
+    ds = z5_file.create_dataset("ds", data=data, chunks=chunks, compression=compression)
+
+    arr = benchmark(ds.__getitem__, ROIS[roi])
+    np.testing.assert_equal(arr, data[ROIS[roi]])
+    report(benchmark, arr.nbytes)
+
+
+@pytest.mark.parametrize("roi", ROIS)
+@pytest.mark.benchmark(group="setitem")
+def test_setitem_z5py(benchmark, z5_file, data, chunks, compression, roi):
+    ds = z5_file.create_dataset(
+        "ds", shape=SHAPE, dtype=data.dtype, chunks=chunks, compression=compression
+    )
+    arr = data[ROIS[roi]]
+
+    benchmark(ds.__setitem__, ROIS[roi], arr)
+    report(benchmark, arr.nbytes)
@@ -10,6 +10,8 @@ from h5py_like import Mode
 
 from .python_wrappers import open, read, write
 from .pyn5 import (
+    BlockCache,
+    FileHandle,
     DatasetUINT8,
     DatasetUINT16,
     DatasetUINT32,
@@ -21,17 +23,33 @@ from .pyn5 import (
     DatasetFLOAT32,
     DatasetFLOAT64,
     create_dataset,
+    set_num_threads,
+    get_num_threads,
+    set_stats_enabled,
+    get_stats_enabled,
+    io_stats,
+    reset_io_stats,
 )
 from .attributes import AttributeManager
 from .dataset import Dataset
 from .file_group import File, Group
 from .common import CompressionType
+from .rechunk import rechunk
+from .pyramid import build_pyramid
 
 __all__ = [
     "open",
     "read",
     "write",
     "create_dataset",
+    "set_num_threads",
+    "get_num_threads",
+    "set_stats_enabled",
+    "get_stats_enabled",
+    "io_stats",
+    "reset_io_stats",
+    "BlockCache",
+    "FileHandle",
     "DatasetUINT8",
     "DatasetUINT16",
     "DatasetUINT32",
@@ -47,5 +65,7 @@ __all__ = [
     "Dataset",
     "AttributeManager",
     "CompressionType",
+    "rechunk",
+    "build_pyramid",
     "Mode",
 ]
@@ -1,12 +1,14 @@
 import errno
 import json
-from contextlib import contextmanager
+import os
+import uuid
+from contextlib import contextmanager, suppress
 from copy import deepcopy
 from functools import wraps
 
 from pathlib import Path
 
-from typing import Iterator, Any, Dict
+from typing import Iterator, Any, Dict, Optional
 
 import numpy as np
 
@@ -48,6 +50,10 @@ class AttributeManager(AttributeManagerBase):
     The ``_dump_kwargs`` member variable is passed as kwargs to ``json.dump`` on write.
     By default, it is an empty dict.
     New instances make a deep copy of the class variable.
+
+    Parsed attributes are cached, and only re-read when the attributes file changes
+    (as seen by its modification time, size and inode).
+    Use ``batch()`` or ``update()`` to make many changes with a single write.
     """
 
     _dataset_keys = {"dimensions", "blockSize", "dataType", "compression"}
@@ -62,6 +68,10 @@ class AttributeManager(AttributeManagerBase):
         self._path = Path(dpath) / "attributes.json"
         self._dump_kwargs = deepcopy(self._dump_kwargs)
         self._has_dataset_keys_ = None
+        self._cached = None
+        self._cached_stat = None
+        self._pending = None
+        self._pending_dirty = False
         super().__init__(mode)
 
     @classmethod
@@ -76,77 +86,136 @@ class AttributeManager(AttributeManagerBase):
 
     @restrict_metadata
     def __setitem__(self, k, v) -> None:
-        with self._open_attributes(True) as attrs:
+        with self._mutate() as attrs:
             attrs[k] = v
 
     @restrict_metadata
     def __delitem__(self, v) -> None:
-        with self._open_attributes(True) as attrs:
+        with self._mutate() as attrs:
             del attrs[v]
 
     def __getitem__(self, k):
-        with self._open_attributes() as attrs:
-            return attrs[k]
+        if self._is_hidden(k):
+            raise KeyError(k)
+        return deepcopy(self._attributes()[k])
 
     def __len__(self) -> int:
-        with self._open_attributes() as attrs:
-            return len(attrs)
+        return len(self._visible_attributes())
 
     def __iter__(self) -> Iterator:
         yield from self.keys()
 
     def keys(self):
-        with self._open_attributes() as attrs:
-            return attrs.keys()
+        return self._visible_attributes().keys()
 
     def values(self):
         """Mutations are not written back to the attributes file"""
-        with self._open_attributes() as attrs:
-            return attrs.values()
+        return deepcopy(self._visible_attributes()).values()
 
     def items(self):
         """Mutations are not written back to the attributes file"""
-        with self._open_attributes() as attrs:
-            return attrs.items()
+        return deepcopy(self._visible_attributes()).items()
 
     def __contains__(self, item):
-        with self._open_attributes() as attrs:
-            return item in attrs
+        return not self._is_hidden(item) and item in self._attributes()
+
+    @mutation
+    def update(self, *args, **kwargs):
+        """Update attributes from a mapping or iterable of pairs, and/or keyword arguments,
+        writing the attributes file once."""
+        with self.batch():
+            super().update(*args, **kwargs)
+
+    @contextmanager
+    def batch(self):
+        """Context manager within which changes to the attributes are held in memory,
+        to be written in one go on exit.
+
+        If an exception is raised within the block, nothing is written.
+        Nested batches are written when the outermost one exits.
+        """
+        if self._pending is not None:
+            yield self
+            return
+
+        self._pending = deepcopy(self._attributes())
+        self._pending_dirty = False
+        try:
+            yield self
+        except BaseException:
+            self._pending = None
+            raise
+
+        attrs, self._pending = self._pending, None
+        if self._pending_dirty:
+            self._write_attributes(attrs)
+
+    def _is_hidden(self, key) -> bool:
+        return key in self._dataset_keys and self._is_dataset()
 
     def _is_dataset(self) -> bool:
         if self._has_dataset_keys_ is None:
-            try:
-                with open(self._path, "r") as f:
-                    self._has_dataset_keys_ = self._dataset_keys.issubset(json.load(f))
-            except ValueError:
-                self._has_dataset_keys_ = False
-            except IOError as e:
-                if e.errno == errno.ENOENT:
-                    self._has_dataset_keys_ = False
-                else:
-                    raise
+            self._has_dataset_keys_ = self._dataset_keys.issubset(self._attributes())
         return self._has_dataset_keys_
 
-    @contextmanager
-    def _open_attributes(self, write: bool = False) -> Dict[str, Any]:
-        """Return attributes as a context manager.
+    def _stat(self):
+        """Return a key which changes with the attributes file, or None if it is missing"""
+        try:
+            st = os.stat(self._path)
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size, st.st_ino
 
-        N5 metadata keys are stripped from the dict.
+    def _attributes(self) -> Dict[str, Any]:
+        """Return all attributes, including N5 metadata.
 
-        :param write: Whether to write changes to the attributes dict.
-        :return: attributes as a dict
+        The file is only re-read if it has changed since it was last read or written.
+        The returned dict is shared, and must not be mutated.
         """
-        attributes = self._read_attributes()
+        if self._pending is not None:
+            return self._pending
+
+        stat = self._stat()
+        if stat is None or stat != self._cached_stat:
+            self._cached = self._read_attributes()
+            self._cached_stat = stat
+        return self._cached
 
+    def _seed(self, text: Optional[str], stat) -> "AttributeManager":
+        """Cache attributes which have already been read, e.g. by ``scan_hierarchy``.
+
+        :param text: contents of the attributes file, or None if there is none
+        :param stat: as returned by ``_stat`` just before the file was read
+        """
+        try:
+            self._cached = {} if text is None else json.loads(text)
+        except ValueError:
+            self._cached = {}
+        self._cached_stat = stat
+        return self
+
+    def _visible_attributes(self) -> Dict[str, Any]:
+        """Return a shallow copy of the attributes, without N5 metadata keys for datasets"""
+        attrs = self._attributes()
         if self._is_dataset():
-            hidden_attrs = {k: attributes.pop(k) for k in self._dataset_keys}
-        else:
-            hidden_attrs = dict()
+            return {k: v for k, v in attrs.items() if k not in self._dataset_keys}
+        return dict(attrs)
+
+    @contextmanager
+    def _mutate(self) -> Dict[str, Any]:
+        """Return all attributes, including N5 metadata, as a context manager.
+
+        Changes to the dict are written to the attributes file on exit,
+        or at the end of the current batch.
+        """
+        if self._pending is not None:
+            yield self._pending
+            self._pending_dirty = True
+            return
 
+        attributes = deepcopy(self._attributes())
         yield attributes
-        if write:
-            hidden_attrs.update(attributes)
-            self._write_attributes(hidden_attrs)
+        self._write_attributes(attributes)
 
     def _read_attributes(self):
         """Return attributes or an empty dict if they do not exist"""
@@ -164,6 +233,21 @@ class AttributeManager(AttributeManagerBase):
         return attributes
 
     def _write_attributes(self, attrs):
-        """Write dict to attributes file, using AttributeManager's encoder and kwargs."""
-        with open(self._path, "w") as f:
-            json.dump(attrs, f, cls=self._encoder, **self._dump_kwargs)
+        """Write dict to attributes file, using AttributeManager's encoder and kwargs.
+
+        The attributes are written to a temporary file which is then renamed over the
+        attributes file, so that readers never see a partial write.
+        """
+        text = json.dumps(attrs, cls=self._encoder, **self._dump_kwargs)
+        tmp_path = self._path.with_name(f".{self._path.name}.{uuid.uuid4().hex}")
+        try:
+            with open(tmp_path, "x") as f:
+                f.write(text)
+            os.replace(tmp_path, self._path)
+        except BaseException:
+            with suppress(FileNotFoundError):
+                os.remove(tmp_path)
+            raise
+
+        self._cached = json.loads(text)
+        self._cached_stat = self._stat()
@@ -27,7 +27,7 @@ class CompressionType(StrEnum):
     RAW = "raw"
     BZIP2 = "bzip2"
     GZIP = "gzip"
-    # LZ4 = "lz4"
+    LZ4 = "lz4"
     # XZ = "xz"
 
 
@@ -35,6 +35,6 @@ compression_args = {
     CompressionType.RAW: None,
     CompressionType.BZIP2: "blockSize",
     CompressionType.GZIP: "level",
-    # CompressionType.LZ4: "blockSize",
+    CompressionType.LZ4: "blockSize",
     # CompressionType.XZ: "preset",
 }
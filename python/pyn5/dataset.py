@@ -1,13 +1,18 @@
-from copy import copy
-
-from typing import Union, Tuple, Optional, Any
+import asyncio
+import itertools
+import json
+import struct
+from collections import deque
+from concurrent.futures import Future
+from typing import Union, Tuple, Optional, Any, List, Iterator, Callable, Dict
 
 import numpy as np
 
 from h5py_like import DatasetBase, AttributeManagerBase, mutation
-from h5py_like.shape_utils import thread_read_fn, thread_write_fn
+from h5py_like.shape_utils import Indexer, NullSlicingException
 from pyn5.attributes import AttributeManager
 from .pyn5 import (
+    BlockCache,
     DatasetUINT8,
     DatasetUINT16,
     DatasetUINT32,
@@ -20,6 +25,7 @@ from .pyn5 import (
     DatasetFLOAT64,
 )
 
+FILL_VALUE_KEY = "fillValue"
 
 dataset_types = {
     np.dtype("uint8"): DatasetUINT8,
@@ -35,23 +41,152 @@ dataset_types = {
 }
 
 
+def _resolve(future: asyncio.Future, error: Optional[str]):
+    if future.done():
+        return
+    if error is None:
+        future.set_result(None)
+    else:
+        future.set_exception(OSError(error))
+
+
+async def _await_io(start, *args, **kwargs):
+    """Start I/O in the background with a rust ``*_async`` method, and wait for it.
+
+    If the awaiting task is cancelled, blocks which are not yet being read
+    or written are skipped.
+    """
+    loop = asyncio.get_event_loop()
+    future = loop.create_future()
+
+    def callback(error):
+        try:
+            loop.call_soon_threadsafe(_resolve, future, error)
+        except RuntimeError:
+            pass  # loop is closed: nothing is waiting
+
+    pending = start(*args, callback, **kwargs)
+    try:
+        await future
+    except asyncio.CancelledError:
+        pending.cancel()
+        raise
+
+
+def _start_io(start, *args, **kwargs) -> Tuple[Future, Any]:
+    """Start I/O in the background with a rust ``*_async`` method.
+
+    :return: future which is resolved when the I/O is done, and handle to cancel it
+    """
+    future = Future()
+
+    def callback(error):
+        if error is None:
+            future.set_result(None)
+        else:
+            future.set_exception(OSError(error))
+
+    return future, start(*args, callback, **kwargs)
+
+
+def _morton_key(position: Tuple[int, ...]) -> int:
+    """Index of a grid position along the Z-order (Morton) curve"""
+    key = 0
+    ndim = len(position)
+    for bit in range(max(position, default=0).bit_length()):
+        for axis, p in enumerate(position):
+            key |= ((p >> bit) & 1) << (bit * ndim + ndim - 1 - axis)
+    return key
+
+
+def _grid_positions(
+    lo: Tuple[int, ...], hi: Tuple[int, ...], order: str
+) -> Iterator[Tuple[int, ...]]:
+    """Positions within the grid box from ``lo`` to ``hi`` (exclusive),
+    in C (last axis fastest), F (first axis fastest) or Morton order"""
+    ranges = [range(start, stop) for start, stop in zip(lo, hi)]
+    order = order.upper()
+    if order == "C":
+        return itertools.product(*ranges)
+    elif order == "F":
+        return (p[::-1] for p in itertools.product(*ranges[::-1]))
+    elif order == "MORTON":
+        return iter(sorted(itertools.product(*ranges), key=_morton_key))
+    raise ValueError(f"Unknown order '{order}': use 'C', 'F' or 'morton'")
+
+
+def _map_block(path, dtype: np.dtype) -> Optional[np.ndarray]:
+    """Map the data of an uncompressed N5 block file into memory.
+
+    :param path: path of the block file
+    :param dtype: dtype of the dataset
+    :return: read-only array in h5py axis order, with big-endian ``dtype``,
+        or None if the block does not exist
+    """
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        return None
+    with f:
+        mode, ndim = struct.unpack(">HH", f.read(4))
+        size = struct.unpack(f">{ndim}I", f.read(4 * ndim))[::-1]
+        offset = 4 * (1 + ndim) + (4 if mode == 1 else 0)
+        dtype = dtype.newbyteorder(">")
+        if not all(size):
+            return np.empty(size, dtype)  # empty files cannot be mapped
+        return np.asarray(np.memmap(f, dtype, "r", offset, size))
+
+
+def _open_dataset(filename: str, mode: str, name: str, threads: Optional[int]):
+    """Reopen a pickled dataset"""
+    from .file_group import File  # noqa would be a circular import
+
+    ds = File(filename, mode)[name]
+    ds.threads = threads
+    return ds
+
+
 class Dataset(DatasetBase):
-    threads = None
+    write_empty_chunks = True
+    """If False, chunks which would be entirely ``fillvalue`` are not written,
+    and are deleted if they already exist.
+    Reads do not distinguish these from chunks which are written."""
+
+    use_mmap = False
+    """If True and the dataset is uncompressed ("raw"), chunks are read by mapping
+    their files into memory and copying straight from them into the result,
+    rather than reading and decoding them."""
+
+    mmap_views = False
+    """If True (as well as ``use_mmap``), unstrided reads within one chunk return
+    a read-only view onto the mapped file, without copying, if the data's byte order
+    matches (1-byte dtypes, or on big-endian machines).
+
+    Chunks are rewritten in place, so rewriting or deleting a chunk, through any
+    handle or process, while a view of it exists makes accessing the view crash
+    the interpreter (SIGBUS). Only enable this for chunks which are not written
+    while views are in use."""
 
     def __init__(
-        self, basename: str, parent: "Group"
-    ):  # noqa would need circular imports
+        self,
+        basename: str,
+        parent: "Group",  # noqa would need circular imports
+        attrs: Optional[AttributeManager] = None,
+    ):
         """
 
         :param basename: basename of the dataset
         :param parent: group to which the dataset belongs
+        :param attrs: attribute manager of the dataset, if its attributes have
+            already been read (default create one)
         """
         super().__init__(basename, parent)
         self._path = self.parent._path / self.basename
-        self._attrs = AttributeManager.from_container(self)
-        self.threads = copy(self.threads)
+        if attrs is None:
+            attrs = AttributeManager.from_container(self)
+        self._attrs = attrs
 
-        attrs = self._attrs._read_attributes()
+        attrs = self._attrs._attributes()
 
         try:
             self._shape = tuple(attrs["dimensions"][::-1])
@@ -59,12 +194,91 @@ class Dataset(DatasetBase):
             self._chunks = tuple(attrs["blockSize"][::-1])
         except KeyError:
             raise ValueError(f"Not a dataset (missing metadata key): {self._path}")
+        self._fillvalue = self._dtype.type(attrs.get(FILL_VALUE_KEY, 0))
+        self._metadata = attrs
+
+        self._impl = self._open_impl()
+        self._impl.block_cache = self.file.block_cache
+        self._impl.fill_value = self._fillvalue
 
-        self._impl = dataset_types[self.dtype](
-            str(self.file._path),
+    def _open_impl(self):
+        """Open the rust dataset from the already-parsed metadata,
+        sharing the file's handle"""
+        impl = dataset_types[self.dtype].from_attributes(
+            self.file._handle,
             self.name[1:],
-            True,  # raise error if dataset does not exist on disk
+            self._metadata["dimensions"],
+            self._metadata["blockSize"],
+            json.dumps(self._metadata["compression"]),
         )
+        old = getattr(self, "_impl", None)
+        if old is not None:
+            impl.num_threads = old.num_threads
+            impl.block_cache = old.block_cache
+            impl.fill_value = old.fill_value
+            impl.share_stats(old)
+        return impl
+
+    def __reduce__(self):
+        # reopen by path, e.g. in spawned data loader workers, without truncating
+        mode = "r+" if self.mode.writable else "r"
+        return _open_dataset, (str(self.file.filename), mode, self.name, self.threads)
+
+    def _sync_shape(self):
+        """Pick up changes to the shape made through other handles.
+
+        This stats the attributes file, so public methods call it once
+        and then use the cached ``_shape``.
+        """
+        attrs = self._attrs._attributes()
+        if attrs is self._metadata:
+            return
+        self._metadata = attrs
+        shape = tuple(attrs["dimensions"][::-1])
+        if shape != self._shape:
+            self._shape = shape
+            self._impl = self._open_impl()
+
+    @property
+    def threads(self) -> Optional[int]:
+        """Number of threads used to decode and encode blocks of this dataset.
+
+        If None (default), the pool shared by all datasets is used:
+        see ``pyn5.set_num_threads``.
+        """
+        return self._impl.num_threads
+
+    @threads.setter
+    def threads(self, value: Optional[int]):
+        self._impl.num_threads = value
+
+    def stats(self) -> Dict[str, int]:
+        """I/O statistics of this dataset, collected while ``pyn5.set_stats_enabled(True)``.
+
+        Counts of blocks and bytes read, written, decoded and encoded,
+        and nanoseconds (summed over threads) spent in each phase of I/O:
+        see ``DatasetUINT8.stats`` for the keys.
+        Time not accounted for by these is spent elsewhere, e.g. in Python.
+        """
+        return self._impl.stats()
+
+    def reset_stats(self):
+        """Set this dataset's I/O statistics to zero"""
+        self._impl.reset_stats()
+
+    @property
+    def block_cache(self) -> Optional[BlockCache]:
+        """Cache of decoded blocks used by reads of this dataset, or None (default).
+
+        Defaults to the ``block_cache`` of the file.
+        Writes through this dataset invalidate the blocks they touch,
+        but writes from elsewhere are not seen until the cache is cleared.
+        """
+        return self._impl.block_cache
+
+    @block_cache.setter
+    def block_cache(self, value: Optional[BlockCache]):
+        self._impl.block_cache = value
 
     @property
     def dims(self):
@@ -72,69 +286,563 @@ class Dataset(DatasetBase):
 
     @property
     def shape(self) -> Tuple[int, ...]:
+        self._sync_shape()
         return self._shape
 
+    @property
+    def ndim(self) -> int:
+        return len(self._shape)
+
+    @property
+    def _indexer(self) -> Indexer:
+        return Indexer(self._shape)
+
     @property
     def dtype(self) -> np.dtype:
         return self._dtype
 
     @property
-    def maxshape(self) -> Tuple[int, ...]:
-        return self.shape
+    def maxshape(self) -> Tuple[Optional[int], ...]:
+        """N5 datasets can be resized without limit"""
+        return (None,) * self.ndim
 
     @property
     def fillvalue(self) -> Any:
-        return 0
+        """Value of voxels in chunks which have not been written.
+
+        Stored in the ``"fillValue"`` attribute; 0 if that is not set.
+        """
+        return self._fillvalue
 
     @property
     def chunks(self) -> Optional[Tuple[int, ...]]:
         return self._chunks
 
+    @mutation
     def resize(self, size: Union[int, Tuple[int, ...]], axis: Optional[int] = None):
-        raise NotImplementedError()
+        """Change the shape of the dataset.
+
+        Growing only changes the dataset's metadata: new regions read as ``fillvalue``.
+        Shrinking also deletes chunks beyond the new shape and truncates chunks
+        which straddle it, in parallel, so that growing again exposes ``fillvalue``
+        rather than old data.
+
+        :param size: new shape, or new length of ``axis``
+        :param axis: if given, only this axis is resized
+        """
+        self._sync_shape()
+        if axis is not None:
+            shape = list(self._shape)
+            shape[axis] = size
+            size = shape
+        elif np.isscalar(size):
+            size = [size]
+        size = tuple(int(s) for s in size)
+
+        if len(size) != self.ndim:
+            raise ValueError(
+                f"New shape {size} has a different rank to dataset shape {self._shape}"
+            )
+        if any(s < 0 for s in size):
+            raise ValueError(f"Invalid shape {size}")
+
+        if any(new < old for new, old in zip(size, self._shape)):
+            self._impl.prune_blocks(size, c_order=True)
+
+        with self._attrs._mutate() as attrs:
+            attrs["dimensions"] = list(size[::-1])
+        self._sync_shape()
+
+    @mutation
+    def append(self, data, axis: int = 0):
+        """Grow the dataset along ``axis`` and write ``data`` to the new region.
+
+        :param data: array with the same shape as the dataset
+            (or without ``axis``, to append a single slice)
+        :param axis: axis along which to append
+        :return: slices of the dataset which ``data`` was written to
+        """
+        data = np.asarray(data, dtype=self.dtype)
+        if data.ndim == self.ndim - 1:
+            data = np.expand_dims(data, axis)
+        axis = axis % self.ndim
+        self._sync_shape()
+        shape = self._shape
+        if data.ndim != self.ndim or any(
+            length != shape[dim] for dim, length in enumerate(data.shape) if dim != axis
+        ):
+            raise ValueError(
+                f"Cannot append data of shape {data.shape} along axis {axis} "
+                f"to dataset of shape {shape}"
+            )
+        start = shape[axis]
+        self.resize(start + data.shape[axis], axis)
+
+        slices = tuple(
+            slice(start, start + length) if dim == axis else slice(0, length)
+            for dim, length in enumerate(data.shape)
+        )
+        self[slices] = data
+        return slices
+
+    def _read_into(self, translation: Tuple[int, ...], out: np.ndarray):
+        """Read the region starting at ``translation`` into ``out``, in place"""
+        if self._mmap_enabled():
+            return self._read_mmap(translation, out.shape, out)
+        self._impl.read_ndarray_into(translation, out, c_order=True)
+        return out
+
+    def _mmap_enabled(self) -> bool:
+        return self.use_mmap and self._metadata["compression"]["type"] == "raw"
+
+    def _read_mmap(
+        self,
+        start: Tuple[int, ...],
+        shape: Tuple[int, ...],
+        out: Optional[np.ndarray] = None,
+    ) -> np.ndarray:
+        """Read the region of ``shape`` at ``start`` from memory-mapped chunks.
+
+        If ``mmap_views``, ``out`` is None and the region is within one existing
+        chunk whose byte order is native, a read-only view onto the mapped file
+        is returned.
+        """
+        stop = tuple(b + n for b, n in zip(start, shape))
+        lo = tuple(b // c for b, c in zip(start, self.chunks))
+        hi = tuple(-(-e // c) for e, c in zip(stop, self.chunks))
+        positions = list(_grid_positions(lo, hi, "C"))
+
+        def map_chunk(position):
+            path = self._path.joinpath(*(str(p) for p in reversed(position)))
+            origin = tuple(p * c for p, c in zip(position, self.chunks))
+            dst = tuple(
+                slice(max(b, o) - b, min(e, o + c) - b)
+                for b, e, o, c in zip(start, stop, origin, self.chunks)
+            )
+            src = tuple(
+                slice(d.start + b - o, d.stop + b - o)
+                for d, b, o in zip(dst, start, origin)
+            )
+            return _map_block(path, self.dtype), src, dst
+
+        if (
+            self.mmap_views
+            and out is None
+            and len(positions) == 1
+            and self.dtype.newbyteorder(">").isnative
+        ):
+            chunk, src, _ = map_chunk(positions[0])
+            if chunk is not None and chunk[src].shape == tuple(shape):
+                return chunk[src].view(self.dtype)
+
+        if out is None:
+            out = np.empty(shape, self.dtype)
+        for position in positions:
+            chunk, src, dst = map_chunk(position)
+            region = out[dst]
+            piece = None if chunk is None else chunk[src]
+            if piece is None or piece.shape != region.shape:
+                # missing, or truncated at the edge of the dataset
+                region[...] = self._fillvalue
+            if piece is not None:
+                region[tuple(slice(0, n) for n in piece.shape)] = piece
+        return out
+
+    def _read_strided(
+        self, start: Tuple[int, ...], shape: Tuple[int, ...], stride: Tuple[int, ...]
+    ) -> np.ndarray:
+        """Read ``arr[::stride]`` of the region of ``shape`` at ``start``,
+        reading only the blocks which contain selected voxels"""
+        # a negative stride selects voxels counting back from the end of the region
+        first = tuple(
+            b + (n - 1) % -s if s < 0 else b for b, n, s in zip(start, shape, stride)
+        )
+        step = tuple(abs(s) for s in stride)
+        out = np.empty(tuple(-(-n // k) for n, k in zip(shape, step)), self.dtype)
+        self._impl.read_ndarray_into(first, out, c_order=True, step=step)
+        return out[tuple(slice(None, None, -1 if s < 0 else None) for s in stride)]
 
     def __getitem__(self, args) -> np.ndarray:
-        def inner_fn(translation, dimensions):
-            return self._impl.read_ndarray(
-                translation[::-1], dimensions[::-1]
-            ).transpose()
+        self._sync_shape()
+        try:
+            start, read_shape, stride, out_shape = self._indexer[args]
+        except NullSlicingException:
+            stride = (1,)
 
-        if self.threads:
+        if set(stride) == {1}:
 
             def fn(translation, dimensions):
-                return thread_read_fn(
-                    translation,
-                    dimensions,
-                    self.chunks,
-                    self.shape,
-                    inner_fn,
-                    self.threads,
-                )
+                if self._mmap_enabled():
+                    return self._read_mmap(translation, dimensions)
+                return self._read_into(translation, np.empty(dimensions, self.dtype))
+
+            return self._getitem(args, fn, self._astype)
+
+        dtype = self.dtype if self._astype is None else np.dtype(self._astype)
+        arr = np.asarray(self._read_strided(start, read_shape, stride), dtype=dtype)
+        return arr.reshape(out_shape)
 
+    def read_points(self, coords, fill_value=None) -> np.ndarray:
+        """Read the voxels at many scattered points.
+
+        Points are grouped by chunk, so each chunk containing any of them is
+        read and decoded once; chunks are read in parallel.
+
+        :param coords: (N, ndim) array of integer coordinates
+        :param fill_value: value for points outside the dataset;
+            if None (default), they raise a ValueError
+        :return: (N,) array of the voxels at ``coords``, in the same order
+        """
+        self._sync_shape()
+        coords = np.ascontiguousarray(coords, dtype=np.int64)
+        if coords.ndim != 2 or coords.shape[1] != self.ndim:
+            raise ValueError(
+                f"Expected an (N, {self.ndim}) array of coordinates, got shape {coords.shape}"
+            )
+        if fill_value is not None:
+            fill_value = self.dtype.type(fill_value).item()
+        arr = self._impl.read_points(coords, c_order=True, out_of_bounds=fill_value)
+        return arr if self._astype is None else arr.astype(self._astype)
+
+    def read_many(
+        self, offsets, shape: Tuple[int, ...], out: Optional[np.ndarray] = None
+    ) -> np.ndarray:
+        """Read many regions of the same shape, e.g. random crops for a training batch.
+
+        Every region's chunks are read in parallel without holding the GIL,
+        and chunks shared by several regions are read and decoded once.
+        This can be used in data loader worker processes, whether forked or
+        spawned (datasets can be pickled).
+
+        :param offsets: (N, ndim) array of the start of each region
+        :param shape: shape of every region
+        :param out: (N, *shape) array with this dataset's dtype to read into
+            (default a new array)
+        :return: (N, *shape) array of the regions
+        """
+        offsets = np.asarray(offsets, dtype=np.int64)
+        shape = tuple(int(s) for s in shape)
+        if (
+            offsets.ndim != 2
+            or offsets.shape[1] != self.ndim
+            or len(shape) != self.ndim
+        ):
+            raise ValueError(
+                f"Expected an (N, {self.ndim}) array of offsets and a {self.ndim}D shape, "
+                f"got offsets of shape {offsets.shape} and shape {shape}"
+            )
+        self._sync_shape()
+        if np.any(offsets < 0) or np.any(offsets + shape > self._shape):
+            raise ValueError(
+                f"Regions of shape {shape} are out of bounds of dataset {self.name} "
+                f"with shape {self._shape}"
+            )
+
+        expected = (len(offsets),) + shape
+        if out is None:
+            arr = np.empty(expected, self.dtype)
+        elif out.shape != expected:
+            raise ValueError(f"Output array has shape {out.shape}, expected {expected}")
         else:
-            fn = inner_fn
+            arr = out
+        self._impl.read_many_into(offsets.astype(np.uint64), arr, c_order=True)
+        if out is None and self._astype is not None:
+            return arr.astype(self._astype)
+        return arr
+
+    async def aread(self, args=Ellipsis) -> np.ndarray:
+        """Read ``self[args]`` without blocking the event loop.
+
+        Blocks are fetched and decoded on the dataset's thread pool,
+        rather than in a thread per request.
+        Cancelling the awaiting task stops fetching further blocks.
+        """
+        self._sync_shape()
+        try:
+            start, read_shape, _, _ = self._indexer[args]
+        except NullSlicingException:
+            return self[args]
 
-        return self._getitem(args, fn, self._astype)
+        out = np.empty(read_shape, self.dtype)
+        await _await_io(self._impl.read_ndarray_into_async, start, out, c_order=True)
+        return self._getitem(args, lambda translation, dimensions: out, self._astype)
 
     @mutation
-    def __setitem__(self, args, val):
-        def inner_fn(offset, arr):
-            return self._impl.write_ndarray(
-                offset[::-1], arr.transpose(), self.fillvalue
+    async def awrite(self, args, val):
+        """Set ``self[args] = val`` without blocking the event loop.
+
+        Blocks are encoded and written on the dataset's thread pool.
+        ``val`` must not be modified until this returns.
+        Cancelling the awaiting task stops writing further blocks,
+        but blocks already written are not rolled back.
+        """
+        self._sync_shape()
+        writes = []
+        self._setitem(args, val, lambda offset, arr: writes.append((offset, arr)))
+        for offset, arr in writes:
+            await _await_io(
+                self._impl.write_ndarray_async,
+                offset,
+                arr,
+                self.fillvalue,
+                c_order=True,
+                skip_fill=not self.write_empty_chunks,
             )
 
-        if self.threads:
+    def iter_blocks(
+        self,
+        roi=Ellipsis,
+        tile_shape: Optional[Tuple[int, ...]] = None,
+        order: str = "C",
+        prefetch: int = 2,
+    ) -> Iterator[Tuple[Tuple[slice, ...], np.ndarray]]:
+        """Iterate over a region in chunk-aligned tiles, reading ahead in the background.
+
+        Tiles are read on the dataset's thread pool while earlier ones are consumed,
+        so at most ``prefetch + 1`` tiles are in memory at once.
+
+        :param roi: region to iterate over, as for ``__getitem__`` (but not strided)
+        :param tile_shape: shape of tiles, rounded up to a multiple of the chunk shape
+            (default one chunk)
+        :param order: order in which to visit tiles: "C" (last axis fastest),
+            "F" (first axis fastest) or "morton" (Z-order, for locality in all axes)
+        :param prefetch: how many tiles to read ahead of the one being consumed
+        :return: iterator of (tuple of slices into the dataset, array) pairs,
+            where tiles at the edge of the region are truncated
+        """
+        self._sync_shape()
+        try:
+            start, read_shape, stride, _ = self._indexer[roi]
+        except NullSlicingException:
+            return
+        if set(stride) != {1}:
+            raise NotImplementedError("Strided iteration is not supported")
+
+        if tile_shape is None:
+            tile_shape = self.chunks
+        tile_shape = tuple(
+            max(1, -(-t // c)) * c for t, c in zip(tile_shape, self.chunks)
+        )
+        stop = tuple(b + s for b, s in zip(start, read_shape))
+        yield from self._iter_tiles(start, stop, tile_shape, order, prefetch)
+
+    def _iter_tiles(
+        self,
+        start: Tuple[int, ...],
+        stop: Tuple[int, ...],
+        tile_shape: Tuple[int, ...],
+        order: str = "C",
+        prefetch: int = 2,
+        skip: Optional[Callable[[Tuple[slice, ...]], bool]] = None,
+    ) -> Iterator[Tuple[Tuple[slice, ...], np.ndarray]]:
+        """Read the region from ``start`` to ``stop`` in tiles aligned to a grid
+        of ``tile_shape``, as for ``iter_blocks``.
+
+        Tiles for which ``skip(slices)`` is true are not read or yielded.
+        """
+        lo = tuple(b // t for b, t in zip(start, tile_shape))
+        hi = tuple(-(-e // t) for e, t in zip(stop, tile_shape))
 
-            def fn(offset, arr):
-                return thread_write_fn(
-                    offset, arr, self.chunks, self.shape, inner_fn, self.threads
+        in_flight = deque()
+        try:
+            for position in _grid_positions(lo, hi, order):
+                slices = tuple(
+                    slice(max(p * t, b), min((p + 1) * t, e))
+                    for p, t, b, e in zip(position, tile_shape, start, stop)
+                )
+                if skip is not None and skip(slices):
+                    continue
+                out = np.empty(tuple(sl.stop - sl.start for sl in slices), self.dtype)
+                future, pending = _start_io(
+                    self._impl.read_ndarray_into_async,
+                    tuple(sl.start for sl in slices),
+                    out,
+                    c_order=True,
                 )
+                in_flight.append((slices, out, future, pending))
 
-        else:
-            fn = inner_fn
+                while len(in_flight) > prefetch:
+                    slices, out, future, _ = in_flight.popleft()
+                    future.result()
+                    yield slices, out
+
+            while in_flight:
+                slices, out, future, _ = in_flight.popleft()
+                future.result()
+                yield slices, out
+        finally:
+            for _, _, _, pending in in_flight:
+                pending.cancel()
+
+    def read_direct(self, dest, source_sel=None, dest_sel=None):
+        """Read data directly from the dataset into an existing NumPy array.
+
+        If the destination (``dest[dest_sel]``) is a writeable view with this
+        dataset's dtype and the source selection is not strided,
+        blocks are decoded straight into it without an intermediate array.
+        Otherwise, falls back to reading and copying.
+        """
+        if source_sel is None:
+            source_sel = Ellipsis
+
+        out = dest if dest_sel is None else dest[dest_sel]
+
+        self._sync_shape()
+        try:
+            start, read_shape, stride, out_shape = self._indexer[source_sel]
+        except NullSlicingException:
+            return
 
+        if (
+            out.dtype != self.dtype
+            or set(stride) != {1}
+            or out.shape != out_shape
+            or not out.flags.writeable
+            or any(s < 0 for s in out.strides)
+            or not np.may_share_memory(out, dest)
+        ):
+            return super().read_direct(dest, source_sel, dest_sel)
+
+        view = out.view()
+        try:
+            view.shape = read_shape
+        except AttributeError:
+            return super().read_direct(dest, source_sel, dest_sel)
+
+        self._read_into(start, view)
+
+    @mutation
+    def __setitem__(self, args, val):
+        def fn(offset, arr):
+            return self._impl.write_ndarray(
+                offset,
+                arr,
+                self.fillvalue,
+                c_order=True,
+                skip_fill=not self.write_empty_chunks,
+            )
+
+        self._sync_shape()
         return self._setitem(args, val, fn)
 
+    def chunk_index(
+        self, sizes: bool = False
+    ) -> Union[np.ndarray, Tuple[np.ndarray, np.ndarray]]:
+        """Find which chunks are stored, without reading them.
+
+        The dataset's directory tree is walked in parallel, without the GIL.
+
+        :param sizes: whether to also return the stored (compressed) size of each chunk
+        :return: (N, ndim) array of chunk grid positions, sorted;
+            and if ``sizes``, an (N,) array of sizes in bytes
+        """
+        self._sync_shape()
+        positions, nbytes = self._impl.block_index(c_order=True)
+        if sizes:
+            return positions, nbytes
+        return positions
+
+    def iter_chunks(self) -> Iterator[Tuple[slice, ...]]:
+        """Iterate over the regions of the dataset covered by stored chunks.
+
+        Unlike h5py, chunks which have not been written are skipped.
+
+        :return: iterator of tuples of slices, clipped to the shape of the dataset
+        """
+        self._sync_shape()
+        for position in self.chunk_index():
+            yield tuple(
+                slice(p * c, min((p + 1) * c, s))
+                for p, c, s in zip(position.tolist(), self.chunks, self._shape)
+            )
+
+    @property
+    def nbytes_stored(self) -> int:
+        """Total size in bytes of the stored chunks"""
+        _, sizes = self.chunk_index(sizes=True)
+        return int(sizes.sum())
+
+    @property
+    def compression_ratio(self) -> float:
+        """Ratio of the uncompressed to the stored size of the stored chunks,
+        or NaN if there are none"""
+        positions, sizes = self.chunk_index(sizes=True)
+        if not len(positions):
+            return float("nan")
+        chunks = np.array(self.chunks)
+        start = positions.astype(np.int64) * chunks
+        chunk_shapes = np.minimum(chunks, np.array(self.shape) - start)
+        nbytes = int(chunk_shapes.prod(axis=1).sum()) * self.dtype.itemsize
+        return nbytes / int(sizes.sum())
+
+    def nonempty_bounding_box(self) -> Optional[Tuple[slice, ...]]:
+        """Smallest region containing all stored chunks, or None if there are none.
+
+        This is chunk-aligned (except at the edge of the dataset):
+        chunks which are stored but entirely ``fillvalue`` are included.
+
+        :return: tuple of slices which can be used to index the dataset
+        """
+        self._sync_shape()
+        positions = self.chunk_index()
+        if not len(positions):
+            return None
+        start = positions.min(axis=0).tolist()
+        stop = (positions.max(axis=0) + 1).tolist()
+        return tuple(
+            slice(b * c, min(e * c, s))
+            for b, e, c, s in zip(start, stop, self.chunks, self._shape)
+        )
+
+    def _positions(self, positions) -> np.ndarray:
+        """Coerce block grid positions to a C-contiguous (N, ndim) array"""
+        return np.ascontiguousarray(positions, dtype=np.uint64).reshape(-1, self.ndim)
+
+    def read_blocks(
+        self, positions, stack: bool = True
+    ) -> Union[np.ndarray, List[Optional[np.ndarray]]]:
+        """Read many whole blocks at once.
+
+        Blocks are fetched and decoded concurrently, without the GIL.
+
+        :param positions: (N, ndim) array-like of block grid positions
+        :param stack: if True (default), return an array of shape (N, *chunks),
+            in which missing blocks and voxels beyond the edge of the dataset
+            are filled with ``fillvalue``.
+            Otherwise, return a list of arrays with the shape of each block as stored,
+            or None where the block does not exist.
+        :return: array or list of arrays
+        """
+        self._sync_shape()
+        positions = self._positions(positions)
+        if not stack:
+            return self._impl.read_blocks(positions, c_order=True)
+
+        out = np.empty((len(positions),) + self.chunks, self.dtype)
+        self._impl.read_blocks_into(positions, out, c_order=True)
+        return out
+
+    @mutation
+    def write_blocks(self, positions, arrays):
+        """Write many whole blocks at once.
+
+        Blocks are encoded and written concurrently, without the GIL.
+
+        :param positions: (N, ndim) array-like of block grid positions
+        :param arrays: sequence of N arrays, or an array of shape (N, *chunks).
+            Arrays for blocks at the edge of the dataset may have the full chunk
+            shape or be truncated at the dataset boundary.
+        """
+        self._sync_shape()
+        positions = self._positions(positions)
+        if isinstance(arrays, np.ndarray):
+            arrays = np.ascontiguousarray(arrays, dtype=self.dtype)
+        else:
+            arrays = [np.ascontiguousarray(arr, dtype=self.dtype) for arr in arrays]
+        self._impl.write_blocks(
+            positions, arrays, c_order=True, skip_fill=not self.write_empty_chunks
+        )
+
     @property
     def attrs(self) -> AttributeManagerBase:
         return self._attrs
@@ -1,9 +1,9 @@
 import json
-
+import os
 import shutil
 import warnings
-from pathlib import Path
-from typing import Iterator
+from pathlib import Path, PurePosixPath
+from typing import Dict, Iterator, List, Optional, Tuple, Union
 
 import numpy as np
 
@@ -13,25 +13,102 @@ from h5py_like.base import H5ObjectLike
 from h5py_like.shape_utils import guess_chunks
 
 from pyn5 import Dataset
+from pyn5.dataset import FILL_VALUE_KEY
 from .common import compression_args
 from .attributes import AttributeManager
-from .pyn5 import create_dataset
+from .pyn5 import create_dataset, copy_blocks, scan_hierarchy, BlockCache, FileHandle
 
 N5_VERSION = "2.0.2"
 N5_VERSION_INFO = tuple(int(i) for i in N5_VERSION.split("."))
 
 
+def _copy_node(source, dpath: Path, depth: Optional[int], without_attrs: bool):
+    """Copy a group or dataset to the directory ``dpath``.
+
+    :param depth: how many levels of a group's members to copy (default all)
+    """
+    dpath.mkdir()
+    attrs = source.attrs._attributes()
+    if without_attrs:
+        keep = AttributeManager._dataset_keys | {FILL_VALUE_KEY}
+        attrs = {k: v for k, v in attrs.items() if k in keep}
+    if attrs:
+        AttributeManager(dpath)._write_attributes(attrs)
+
+    if isinstance(source, Dataset):
+        copy_blocks(str(source._path), str(dpath), source.ndim)
+    elif depth is None or depth > 0:
+        for name, child in source.items():
+            child_depth = None if depth is None else depth - 1
+            _copy_node(child, dpath / name, child_depth, without_attrs)
+
+
+def _join(*names: str) -> str:
+    return "/".join(n for n in names if n)
+
+
+class _Hierarchy:
+    """Groups and datasets found by one ``scan_hierarchy`` walk below a group.
+
+    Paths are relative to that group, which is ``""``.
+    """
+
+    def __init__(self, path: Path):
+        self.nodes: Dict[str, Tuple[bool, Optional[str], Optional[tuple]]] = dict()
+        self.children: Dict[str, List[str]] = dict()
+        for node_path, is_dataset, text, stat in scan_hierarchy(str(path), None):
+            self.add(node_path, is_dataset, text, stat)
+
+    def add(self, path: str, is_dataset: bool, text=None, stat=None):
+        """Record a node, with the text and ``stat`` of its attributes file if known"""
+        if path not in self.nodes and path:
+            parent, _, name = path.rpartition("/")
+            self.children.setdefault(parent, []).append(name)
+        self.nodes[path] = (is_dataset, text, stat)
+
+    def discard(self, path: str):
+        """Forget a node and all of its descendants"""
+        if self.nodes.pop(path, None) is None:
+            return
+        parent, _, name = path.rpartition("/")
+        self.children[parent].remove(name)
+        prefix = path + "/"
+        for mapping in (self.nodes, self.children):
+            for key in [k for k in mapping if k == path or k.startswith(prefix)]:
+                del mapping[key]
+
+
 class Group(GroupBase):
-    def __init__(self, basename: str, parent: "Group"):
+    def __init__(
+        self, basename: str, parent: "Group", attrs: Optional[AttributeManager] = None
+    ):
         """
 
         :param basename: basename of the group
         :param parent: group to which the group belongs
+        :param attrs: attribute manager of the group, if its attributes have
+            already been read (default create one)
         """
         super().__init__(basename, parent)
         self._path = self.parent._path / self.basename
 
-        self._attrs = AttributeManager.from_container(self)
+        if attrs is None:
+            attrs = AttributeManager.from_container(self)
+        self._attrs = attrs
+
+    def _hierarchy(self) -> Optional[Tuple[_Hierarchy, str]]:
+        """The file's cached hierarchy and this group's path within it,
+        or None if the file does not cache its hierarchy"""
+        hierarchy = self.file._cached_hierarchy()
+        if hierarchy is None:
+            return None
+        return hierarchy, self.name.lstrip("/")
+
+    def _child_from_node(self, name: str, node) -> H5ObjectLike:
+        """Open a child found by ``scan_hierarchy``, without re-reading its attributes"""
+        is_dataset, text, stat = node
+        attrs = AttributeManager(self._path / name, self.mode)._seed(text, stat)
+        return (Dataset if is_dataset else Group)(name, self, attrs)
 
     def _create_child_group(self, name) -> GroupBase:
         dpath = self._path / name
@@ -47,6 +124,10 @@ class Group(GroupBase):
                 raise TypeError(f"Dataset found at {dpath}")
 
         dpath.mkdir()
+        cached = self._hierarchy()
+        if cached is not None:
+            hierarchy, prefix = cached
+            hierarchy.add(_join(prefix, name), False)
         return Group(name, self)
 
     def _create_child_dataset(
@@ -58,8 +139,12 @@ class Group(GroupBase):
         chunks=None,
         compression=None,
         compression_opts=None,
+        fillvalue=None,
         **kwds,
     ):
+        # h5py_like passes on the whole (possibly nested) name given to create_dataset
+        name = PurePosixPath(name).name
+
         for key in kwds:
             warnings.warn(
                 f"pyn5 does not implement '{key}' argument for create_dataset; it will be ignored"
@@ -121,20 +206,39 @@ class Group(GroupBase):
             compression_str,
         )
 
+        if fillvalue is not None:
+            fillvalue = dtype.type(fillvalue)
+            if fillvalue != 0:
+                AttributeManager(dpath, self.mode)[FILL_VALUE_KEY] = fillvalue.item()
+
+        cached = self._hierarchy()
+        if cached is not None:
+            hierarchy, prefix = cached
+            hierarchy.add(_join(prefix, name), True)
+
         ds = Dataset(name, self)
         if data is not None:
             ds[...] = data
         return ds
 
     def _get_child(self, name) -> H5ObjectLike:
+        cached = self._hierarchy()
+        if cached is not None:
+            hierarchy, prefix = cached
+            try:
+                node = hierarchy.nodes[_join(prefix, name)]
+            except KeyError:
+                raise KeyError(name) from None
+            return self._child_from_node(name, node)
+
         dpath = self._path / name
         if not dpath.is_dir():
             raise KeyError()
-        attrs = AttributeManager(dpath)
+        attrs = AttributeManager(dpath, self.mode)
         if attrs._is_dataset():
-            return Dataset(name, self)
+            return Dataset(name, self, attrs)
         else:
-            return Group(name, self)
+            return Group(name, self, attrs)
 
     @mutation
     def __setitem__(self, name, obj):
@@ -152,8 +256,47 @@ class Group(GroupBase):
         expand_refs=False,
         without_attrs=False,
     ):
-        """Not implemented"""
-        raise NotImplementedError()
+        """Copy a group or dataset, possibly into another file.
+
+        Chunks are copied byte for byte, in parallel, without being decompressed
+        (using ``copy_file_range``, and so reflinks, where the filesystem supports it).
+        To change chunking or compression, use ``pyn5.rechunk``.
+
+        :param source: Group or Dataset, or its path relative to this group
+        :param dest: Group in which to put the copy, or the path of the copy
+            relative to this group
+        :param name: name of the copy if ``dest`` is a Group
+            (default the name of ``source``)
+        :param shallow: only copy the immediate members of a group
+        :param expand_soft: ignored: N5 has no links
+        :param expand_external: ignored: N5 has no links
+        :param expand_refs: ignored: N5 has no references
+        :param without_attrs: do not copy attributes (other than dataset metadata)
+        """
+        if isinstance(source, str):
+            source = self[source]
+
+        if isinstance(dest, GroupBase):
+            if name is None:
+                name = PurePosixPath(source.name).name
+        else:
+            dest_path = PurePosixPath(dest)
+            dest = self.file if dest_path.is_absolute() else self
+            parent = str(dest_path.parent).lstrip("/")
+            if parent not in ("", "."):
+                dest = dest.require_group(parent)
+            name = dest_path.name
+
+        if not name:
+            raise ValueError("Cannot copy to the root group")
+        if name in dest:
+            raise FileExistsError(f"Group or dataset found at {dest._path / name}")
+        dest.raise_on_readonly()
+        dpath = dest._path / name
+        if Path(source._path).resolve() in dpath.resolve().parents:
+            raise ValueError(f"Cannot copy {source.name} into itself")
+        _copy_node(source, dpath, 1 if shallow else None, without_attrs)
+        dest.file.clear_hierarchy_cache()
 
     @property
     def attrs(self) -> AttributeManager:
@@ -161,22 +304,89 @@ class Group(GroupBase):
 
     @mutation
     def __delitem__(self, v) -> None:
-        shutil.rmtree(self[v]._path)
+        obj = self[v]
+        shutil.rmtree(obj._path)
+        cached = self._hierarchy()
+        if cached is not None:
+            hierarchy, _ = cached
+            hierarchy.discard(obj.name.lstrip("/"))
 
     def __len__(self) -> int:
+        cached = self._hierarchy()
+        if cached is not None:
+            hierarchy, prefix = cached
+            return len(hierarchy.children.get(prefix, ()))
+
         counter = 0
         for _ in self:
             counter += 1
         return counter
 
     def __iter__(self) -> Iterator:
-        for path in self._path.iterdir():
-            if path.is_dir():
-                yield path.name
+        cached = self._hierarchy()
+        if cached is not None:
+            hierarchy, prefix = cached
+            names = list(hierarchy.children.get(prefix, ()))
+        else:
+            with os.scandir(self._path) as entries:
+                names = [entry.name for entry in entries if entry.is_dir()]
+        yield from names
+
+    def __contains__(self, name) -> bool:
+        ancestor, group_names, last_name = self._descend(name)
+        if not last_name:
+            return super().__contains__(name)
+
+        cached = ancestor._hierarchy()
+        if cached is not None:
+            hierarchy, prefix = cached
+            return _join(prefix, *group_names, last_name) in hierarchy.nodes
+        elif not group_names:
+            return (ancestor._path / last_name).is_dir()
+        return super().__contains__(name)
+
+    def _recurse(self):
+        """Depth-first search, using one walk of the hierarchy (or the cached one)
+        rather than listing each group and reading each attributes file in turn"""
+        cached = self._hierarchy()
+        if cached is None:
+            cached = _Hierarchy(self._path), ""
+        yield from self._recurse_nodes(*cached, "")
+
+    def _recurse_nodes(self, hierarchy: _Hierarchy, prefix: str, relative: str):
+        for name in list(hierarchy.children.get(prefix, ())):
+            path = _join(prefix, name)
+            child = self._child_from_node(name, hierarchy.nodes[path])
+            yield _join(relative, name), child
+            if isinstance(child, Group):
+                yield from child._recurse_nodes(hierarchy, path, _join(relative, name))
 
 
 class File(FileMixin, Group):
-    def __init__(self, name, mode=Mode.READ_WRITE_CREATE):
+    def __init__(
+        self,
+        name,
+        mode=Mode.READ_WRITE_CREATE,
+        block_cache: Optional[Union[BlockCache, int]] = None,
+        cache_hierarchy: bool = False,
+    ):
+        """
+
+        :param name: path of the N5 container
+        :param mode: Mode
+        :param block_cache: cache of decoded blocks shared by all datasets
+            opened from this file, or its capacity in bytes (default no cache).
+        :param cache_hierarchy: whether to find all groups and datasets in one walk
+            when first needed, and use that to list, find and open them.
+            Changes made through this object are kept up to date, but changes
+            made elsewhere are not seen until ``clear_hierarchy_cache`` is called.
+        """
+        if isinstance(block_cache, int):
+            block_cache = BlockCache(block_cache)
+        self.block_cache = block_cache
+        self.cache_hierarchy = cache_hierarchy
+        self._hierarchy_cache = None
+        self._handle_ = None
         super().__init__(name, mode)
         self._require_dir(self.filename)
         self._path = self.filename
@@ -187,19 +397,24 @@ class File(FileMixin, Group):
         """Not implemented"""
         raise NotImplementedError()
 
-    def copy(
-        self,
-        source,
-        dest,
-        name=None,
-        shallow=False,
-        expand_soft=False,
-        expand_external=False,
-        expand_refs=False,
-        without_attrs=False,
-    ):
-        """Not implemented"""
-        raise NotImplementedError()
+    @property
+    def _handle(self) -> FileHandle:
+        """Rust handle on the container, shared by the datasets opened from this file"""
+        if self._handle_ is None:
+            self._handle_ = FileHandle(str(self._path))
+        return self._handle_
+
+    def _cached_hierarchy(self) -> Optional[_Hierarchy]:
+        if not self.cache_hierarchy:
+            return None
+        if self._hierarchy_cache is None:
+            self._hierarchy_cache = _Hierarchy(self._path)
+        return self._hierarchy_cache
+
+    def clear_hierarchy_cache(self):
+        """Forget the groups and datasets found so far,
+        e.g. to see changes made by other processes"""
+        self._hierarchy_cache = None
 
     def _require_dir(self, dpath: Path):
         if dpath.is_file():
@@ -0,0 +1,153 @@
+"""Multiscale pyramids of downsampled datasets, as used by viewers such as
+Neuroglancer and BigDataViewer."""
+
+import functools
+import itertools
+import math
+from typing import List, Sequence, Tuple, Union
+
+import numpy as np
+
+from .dataset import Dataset
+from .rechunk import DEFAULT_MAX_MEM, _compression_args, _grow_tile, _round_up
+
+SCALES_KEY = "scales"
+DOWNSAMPLING_FACTORS_KEY = "downsamplingFactors"
+METHODS = ("mean", "mode", "max")
+
+
+def _lcm(a: int, b: int) -> int:
+    return a * b // math.gcd(a, b)
+
+
+def pyramid_tile_shape(
+    shape: Tuple[int, ...],
+    chunks: Tuple[int, ...],
+    factors: Sequence[Tuple[int, ...]],
+    itemsize: int,
+    max_bytes: int,
+) -> Tuple[int, ...]:
+    """Choose the shape of the tiles of a dataset from which to build a pyramid.
+
+    Tiles are whole numbers of the coarsest level's windows, so that no window
+    straddles two tiles. Where it fits in ``max_bytes``, each level's part of a tile
+    is also a whole number of its chunks, so that every chunk is written once;
+    failing that, tiles are aligned to the source's chunks if possible.
+    Tiles are then grown, last axis first, as far as ``max_bytes`` allows.
+
+    :param factors: downsampling factors of each level relative to the source
+    :return: tile shape
+    """
+    coarsest = factors[-1]
+    candidates = [
+        tuple(
+            functools.reduce(_lcm, (c * f[axis] for f in factors), c)
+            for axis, c in enumerate(chunks)
+        ),
+        tuple(_lcm(c, f) for c, f in zip(chunks, coarsest)),
+        tuple(coarsest),
+    ]
+    for unit in candidates:
+        # a tile covering a whole axis needs no further alignment
+        unit = tuple(min(u, _round_up(n, f)) for u, n, f in zip(unit, shape, coarsest))
+        if np.prod(unit, dtype=np.int64) * itemsize <= max_bytes:
+            break
+    return _grow_tile(unit, shape, itemsize, max_bytes)
+
+
+def build_pyramid(
+    dataset: Dataset,
+    factors: Sequence[Union[int, Sequence[int]]],
+    method: str = "mean",
+    max_mem: int = DEFAULT_MAX_MEM,
+) -> List[Dataset]:
+    """Write downsampled copies of a dataset as the levels of a multiscale pyramid.
+
+    The dataset must be called ``s0``; level ``i`` is written alongside it as ``s{i}``,
+    downsampled from level ``i - 1`` by ``factors[i - 1]``.
+    Levels which already exist are overwritten, if their shape and dtype match.
+    The source is read once, in tiles chosen by ``pyramid_tile_shape``,
+    reading the next tile while every level is computed from the current one;
+    downsampling and encoding are parallelised across cores.
+    New levels have the source's chunks, compression and fill value.
+
+    Each level's ``downsamplingFactors`` attribute, and the group's ``scales``
+    and ``downsamplingFactors`` attributes (a list with one entry per level),
+    give the factors relative to ``s0`` in N5 axis order.
+
+    :param dataset: full-resolution dataset, called ``s0``
+    :param factors: downsampling factors of each level relative to the previous one;
+        an int for every axis, or one per axis
+    :param method: how to reduce each window: "mean", "mode" (e.g. for labels) or "max".
+        Integer means are rounded; ties for the mode go to the smallest value.
+    :param max_mem: approximate limit on memory used for data, in bytes
+    :return: every level, starting with ``dataset``
+    """
+    if dataset.basename != "s0":
+        raise ValueError(
+            f"Pyramid source must be called 's0', not '{dataset.basename}'"
+        )
+    if method not in METHODS:
+        raise ValueError(
+            f"Unknown downsampling method '{method}': use one of {METHODS}"
+        )
+    if not factors:
+        raise ValueError("No downsampling factors given")
+
+    ndim = dataset.ndim
+    relative = []
+    for f in factors:
+        f = (int(f),) * ndim if np.isscalar(f) else tuple(int(i) for i in f)
+        if len(f) != ndim or min(f, default=1) < 1:
+            raise ValueError(f"Invalid downsampling factors {f} for {ndim}D dataset")
+        relative.append(f)
+    absolute = list(
+        itertools.accumulate(relative, lambda a, b: tuple(i * j for i, j in zip(a, b)))
+    )
+
+    group = dataset.parent
+    compression, compression_opts = _compression_args(dataset)
+    levels = [dataset]
+    shape = dataset.shape
+    for i, f in enumerate(relative, 1):
+        shape = tuple(-(-s // fi) for s, fi in zip(shape, f))
+        name = f"s{i}"
+        if name in group:
+            ds = group[name]
+            if ds.shape != shape or ds.dtype != dataset.dtype:
+                raise ValueError(
+                    f"Existing dataset {ds.name} has shape {ds.shape} and dtype "
+                    f"{ds.dtype}, expected {shape} and {dataset.dtype}"
+                )
+        else:
+            ds = group.create_dataset(
+                name,
+                shape=shape,
+                dtype=dataset.dtype,
+                chunks=dataset.chunks,
+                compression=compression,
+                compression_opts=compression_opts,
+                fillvalue=dataset.fillvalue,
+            )
+        levels.append(ds)
+
+    # 3 source tiles: one being read, one being downsampled, and the levels' data
+    tile = pyramid_tile_shape(
+        dataset.shape, dataset.chunks, absolute, dataset.dtype.itemsize, max_mem // 3
+    )
+    start = (0,) * ndim
+    for slices, arr in dataset._iter_tiles(start, dataset.shape, tile, prefetch=1):
+        for ds, rel, ab in zip(levels[1:], relative, absolute):
+            arr = dataset._impl.downsample(arr, rel, method)
+            ds[
+                tuple(
+                    slice(sl.start // f, sl.start // f + n)
+                    for sl, f, n in zip(slices, ab, arr.shape)
+                )
+            ] = arr
+
+    scales = [[1] * ndim] + [list(f[::-1]) for f in absolute]
+    for ds, scale in zip(levels, scales):
+        ds.attrs[DOWNSAMPLING_FACTORS_KEY] = scale
+    group.attrs.update({SCALES_KEY: scales, DOWNSAMPLING_FACTORS_KEY: scales})
+    return levels
@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 
 """Main module."""
+
 import json
 from pathlib import Path
 import logging
@@ -8,6 +9,7 @@ from typing import Tuple
 import numpy as np
 
 from .pyn5 import (
+    FileHandle,
     DatasetUINT8,
     DatasetUINT16,
     DatasetUINT32,
@@ -20,6 +22,7 @@ from .pyn5 import (
     DatasetFLOAT64,
 )
 
+_dataset_keys = {"dimensions", "blockSize", "dataType", "compression"}
 
 dataset_types = {
     np.dtype("uint8"): DatasetUINT8,
@@ -42,6 +45,7 @@ def open(root_path: str, dataset: str, dtype: str = "", read_only=True):
     """
 
     # Check the attributes file:
+    attributes = None
     attributes_file = Path(root_path, dataset, "attributes.json")
     if attributes_file.exists():
         with attributes_file.open("r") as f:
@@ -50,7 +54,7 @@ def open(root_path: str, dataset: str, dtype: str = "", read_only=True):
         if expected_dtype is not None:
             if dtype == "":
                 # Use the expected dtype
-                return open(root_path, dataset, expected_dtype.upper(), read_only)
+                dtype = expected_dtype.upper()
             elif dtype != expected_dtype.upper():
                 # When in doubt use the user specified dtype
                 logging.warning(
@@ -58,6 +62,7 @@ def open(root_path: str, dataset: str, dtype: str = "", read_only=True):
                         dtype, expected_dtype.upper()
                     )
                 )
+                attributes = None
 
     unsupported_dtype_msg = (
         "Given dtype {} is not supported. Please choose from ({})".format(
@@ -75,26 +80,31 @@ def open(root_path: str, dataset: str, dtype: str = "", read_only=True):
 
     try:
         dataset_type = dataset_types[dtype]
-        return dataset_type(root_path, dataset, read_only)
     except KeyError:
         raise ValueError(unsupported_dtype_msg)
 
+    if attributes is not None and _dataset_keys.issubset(attributes):
+        # don't make rust read the attributes again
+        return dataset_type.from_attributes(
+            FileHandle(str(root_path), read_only),
+            dataset,
+            attributes["dimensions"],
+            attributes["blockSize"],
+            json.dumps(attributes["compression"]),
+        )
+    return dataset_type(root_path, dataset, read_only)
+
 
 def read(dataset, bounds: Tuple[np.ndarray, np.ndarray], dtype: type = int):
     """
-    Temporary hacky method until dataset.read_ndarray returns np.ndarray
+    Read the region of ``dataset`` from ``bounds[0]`` (inclusive) to ``bounds[1]``
+    (exclusive), in N5 axis order, as an array of ``dtype``.
 
-    Note: passing in dtype is necessary since numpy arrays are float by default.
-          dataset.get_data_type() could be implemented, but a better solution would
-          be to have dataset.read_ndarray return a numpy array.
+    Works for any number of dimensions; blocks are read in parallel.
     """
-    bounds = (bounds[0].astype(int), bounds[1].astype(int))
-    return (
-        np.array(dataset.read_ndarray(list(bounds[0]), list(bounds[1] - bounds[0])))
-        .reshape(list(bounds[1] - bounds[0])[::-1])
-        .transpose([2, 1, 0])
-        .astype(dtype)
-    )
+    start = [int(i) for i in bounds[0]]
+    shape = [int(stop) - begin for begin, stop in zip(start, bounds[1])]
+    return dataset.read_ndarray(start, shape).astype(dtype, copy=False)
 
 
 def write(
@@ -104,60 +114,16 @@ def write(
     dtype=int,
 ):
     """
-    Temporary hacky method until dataset.write_ndarray is implemented in rust-n5
-    and the PyO3 wrapper
-    """
-    input_data = input_data.astype(dtype)
-    input_bounds = (input_bounds[0].astype(int), input_bounds[1].astype(int))
-    start_block_index = input_bounds[0] // dataset.block_shape
-    stop_block_index = (
-        input_bounds[1] + dataset.block_shape - 1
-    ) // dataset.block_shape
-    for i in range(start_block_index[0], stop_block_index[0]):
-        for j in range(start_block_index[1], stop_block_index[1]):
-            for k in range(start_block_index[2], stop_block_index[2]):
-                block_index = np.array([i, j, k], dtype=int)
-                block_bounds = (
-                    block_index * dataset.block_shape,
-                    (block_index + 1) * dataset.block_shape,
-                )
+    Write ``input_data``, cast to ``dtype`` and then to the dataset's dtype,
+    to the region of ``dataset`` from ``input_bounds[0]`` (inclusive)
+    to ``input_bounds[1]`` (exclusive), in N5 axis order.
 
-                if all(block_bounds[0] >= input_bounds[0]) and all(
-                    block_bounds[1] <= input_bounds[1]
-                ):
-                    # Overwrite block data entirely
-                    block_data = input_data[
-                        tuple(
-                            map(
-                                slice,
-                                block_bounds[0] - input_bounds[0],
-                                block_bounds[1] - input_bounds[0],
-                            )
-                        )
-                    ]
-                else:
-                    block_data = read(dataset, block_bounds, dtype)
-
-                    intersection_bounds = (
-                        np.maximum(block_bounds[0], input_bounds[0]),
-                        np.minimum(block_bounds[1], input_bounds[1]),
-                    )
-                    relative_block_bounds = tuple(
-                        map(
-                            slice,
-                            intersection_bounds[0] - block_bounds[0],
-                            intersection_bounds[1] - block_bounds[0],
-                        )
-                    )
-                    relative_data_bounds = tuple(
-                        map(
-                            slice,
-                            intersection_bounds[0] - input_bounds[0],
-                            intersection_bounds[1] - input_bounds[0],
-                        )
-                    )
-                    block_data[relative_block_bounds] = input_data[relative_data_bounds]
-
-                dataset.write_block(
-                    block_index, block_data.transpose([2, 1, 0]).flatten()
-                )
+    Works for any number of dimensions. Blocks are encoded and written in a
+    single parallel call, which merges partially covered blocks with their
+    existing contents.
+    """
+    start = [int(i) for i in input_bounds[0]]
+    shape = [int(stop) - begin for begin, stop in zip(start, input_bounds[1])]
+    data = np.asarray(input_data)[tuple(slice(0, s) for s in shape)]
+    data = data.astype(dtype, copy=False).astype(dataset.dtype, copy=False)
+    dataset.write_ndarray(start, data, dataset.fill_value)
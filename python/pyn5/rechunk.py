@@ -0,0 +1,241 @@
+"""Out-of-core rechunking and recompression of datasets."""
+
+import argparse
+import math
+from typing import Any, Optional, Tuple
+
+import numpy as np
+
+from .common import compression_args
+from .dataset import Dataset
+from .file_group import File, Group
+from .pyn5 import copy_blocks
+
+DEFAULT_MAX_MEM = 256 * 2**20
+
+#: Attribute recording how far an unfinished ``rechunk`` has got
+PROGRESS_KEY = "rechunkProgress"
+
+
+def _round_up(n: int, multiple: int) -> int:
+    return -(-n // multiple) * multiple
+
+
+def tile_shape(
+    shape: Tuple[int, ...],
+    src_chunks: Tuple[int, ...],
+    dst_chunks: Tuple[int, ...],
+    itemsize: int,
+    max_bytes: int,
+) -> Tuple[int, ...]:
+    """Choose the shape of the tiles in which to copy a dataset between chunkings.
+
+    Tiles are whole numbers of destination chunks, so that every destination chunk
+    is written exactly once. Where it fits in ``max_bytes``, they are also whole
+    numbers of source chunks, so that every source chunk is decoded only once.
+    Tiles are then grown, last axis first, as far as ``max_bytes`` allows.
+
+    :return: tile shape, which is at least one destination chunk
+    """
+    unit = tuple(
+        min(s * d // math.gcd(s, d), _round_up(n, d))
+        for s, d, n in zip(src_chunks, dst_chunks, shape)
+    )
+    if np.prod(unit, dtype=np.int64) * itemsize > max_bytes:
+        unit = tuple(dst_chunks)
+    return _grow_tile(unit, shape, itemsize, max_bytes)
+
+
+def _grow_tile(
+    unit: Tuple[int, ...], shape: Tuple[int, ...], itemsize: int, max_bytes: int
+) -> Tuple[int, ...]:
+    """Grow a tile by whole multiples of ``unit``, last axis first,
+    until it covers ``shape`` or would exceed ``max_bytes``"""
+    tile = list(unit)
+    for axis in reversed(range(len(shape))):
+        others = np.prod(tile, dtype=np.int64) // tile[axis] * itemsize
+        max_len = max_bytes // others
+        n_units = min(max_len // unit[axis], -(-shape[axis] // unit[axis]))
+        tile[axis] = int(unit[axis] * max(1, n_units))
+    return tuple(tile)
+
+
+def _compression(ds: Dataset) -> dict:
+    return ds.attrs._attributes()["compression"]
+
+
+def _compression_args(ds: Dataset) -> Tuple[str, Any]:
+    """``compression`` and ``compression_opts`` with which to create a dataset like ``ds``"""
+    compression = _compression(ds)
+    opt_name = compression_args.get(compression["type"])
+    return compression["type"], compression.get(opt_name) if opt_name else None
+
+
+def rechunk(
+    source: Dataset,
+    dest: Group,
+    name: str,
+    chunks: Optional[Tuple[int, ...]] = None,
+    compression: Optional[str] = None,
+    compression_opts=None,
+    max_mem: int = DEFAULT_MAX_MEM,
+) -> Dataset:
+    """Copy a dataset with different chunks and/or compression, with bounded memory.
+
+    The data is read and written in tiles chosen by ``tile_shape``,
+    reading the next tile while the current one is written;
+    each tile's chunks are decoded and encoded in parallel.
+    If the chunks and compression are unchanged, chunks are copied without decoding.
+
+    Tiles are written in order, and after each one the number written is recorded
+    in the destination's ``"rechunkProgress"`` attribute, which is removed when
+    the copy is complete.
+    If the destination dataset already exists (e.g. from an interrupted run),
+    its shape and dtype must match, and the tiles recorded as written are skipped;
+    if there is no record, everything is copied.
+    Chunks which would be entirely the fill value are not written.
+
+    :param source: dataset to copy
+    :param dest: group in which to create the copy
+    :param name: name of the copy
+    :param chunks: chunk shape of the copy (default same as ``source``)
+    :param compression: compression type of the copy (default same as ``source``)
+    :param compression_opts: option for ``compression``, as for ``create_dataset``
+    :param max_mem: approximate limit on memory used for data, in bytes
+    :return: the copy
+    """
+    src_compression = _compression(source)
+    if compression is None:
+        compression, compression_opts = _compression_args(source)
+    if chunks is None:
+        chunks = source.chunks
+    chunks = tuple(int(c) for c in chunks)
+
+    progress = None
+    if name in dest:
+        ds = dest[name]
+        if ds.shape != source.shape or ds.dtype != source.dtype:
+            raise ValueError(
+                f"Existing dataset {ds.name} has shape {ds.shape} and dtype {ds.dtype}, "
+                f"expected {source.shape} and {source.dtype}"
+            )
+        progress = ds.attrs.get(PROGRESS_KEY)
+    else:
+        ds = dest.create_dataset(
+            name,
+            shape=source.shape,
+            dtype=source.dtype,
+            chunks=chunks,
+            compression=compression,
+            compression_opts=compression_opts,
+            fillvalue=source.fillvalue,
+        )
+
+    if ds.chunks == source.chunks and _compression(ds) == src_compression:
+        copy_blocks(str(source._path), str(ds._path), source.ndim)
+        return ds
+
+    if progress is None:
+        # 3 tiles: one being read, one being written, and one being encoded
+        tile = tile_shape(
+            source.shape, source.chunks, ds.chunks, source.dtype.itemsize, max_mem // 3
+        )
+        done = 0
+    else:
+        # resume on the same grid of tiles, which are visited in C order
+        tile = tuple(progress["tileShape"])
+        done = progress["tilesDone"]
+    grid = tuple(-(-n // t) for n, t in zip(source.shape, tile))
+
+    def index(slices) -> int:
+        position = tuple(sl.start // t for sl, t in zip(slices, tile))
+        return int(np.ravel_multi_index(position, grid))
+
+    write_empty_chunks = ds.write_empty_chunks
+    ds.write_empty_chunks = False
+    try:
+        start = (0,) * source.ndim
+        for slices, arr in source._iter_tiles(
+            start, source.shape, tile, prefetch=1, skip=lambda sl: index(sl) < done
+        ):
+            ds[slices] = arr
+            ds.attrs[PROGRESS_KEY] = {
+                "tileShape": list(tile),
+                "tilesDone": index(slices) + 1,
+            }
+    finally:
+        ds.write_empty_chunks = write_empty_chunks
+    if PROGRESS_KEY in ds.attrs:
+        del ds.attrs[PROGRESS_KEY]
+    return ds
+
+
+def _parse_bytes(s: str) -> int:
+    """Parse a number of bytes with an optional K, M or G suffix"""
+    multiples = {"K": 2**10, "M": 2**20, "G": 2**30}
+    s = s.strip().upper().rstrip("B")
+    if s and s[-1] in multiples:
+        return int(float(s[:-1]) * multiples[s[-1]])
+    return int(s)
+
+
+def _parse_shape(s: str) -> Tuple[int, ...]:
+    return tuple(int(i) for i in s.split(","))
+
+
+def _parse_opts(s: str):
+    try:
+        return int(s)
+    except ValueError:
+        return s
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description="Copy an N5 dataset with different chunks and/or compression"
+    )
+    parser.add_argument("source", help="path of the source N5 container")
+    parser.add_argument("source_dataset", help="path of the dataset within the source")
+    parser.add_argument("dest", help="path of the destination N5 container")
+    parser.add_argument("dest_dataset", help="path of the copy within the destination")
+    parser.add_argument(
+        "-c",
+        "--chunks",
+        type=_parse_shape,
+        help="chunk shape of the copy, e.g. 64,64,64",
+    )
+    parser.add_argument(
+        "-z",
+        "--compression",
+        choices=sorted(str(c) for c in compression_args),
+        help="compression of the copy",
+    )
+    parser.add_argument(
+        "-o", "--compression-opts", type=_parse_opts, help="option for the compression"
+    )
+    parser.add_argument(
+        "-m",
+        "--max-mem",
+        type=_parse_bytes,
+        default=DEFAULT_MAX_MEM,
+        help="approximate memory limit, e.g. 2G (default 256M)",
+    )
+    parsed = parser.parse_args(args)
+
+    source = File(parsed.source, "r")[parsed.source_dataset]
+    dest = File(parsed.dest, "a")
+    group_name, _, name = parsed.dest_dataset.strip("/").rpartition("/")
+    group = dest.require_group(group_name) if group_name else dest
+    rechunk(
+        source,
+        group,
+        name,
+        parsed.chunks,
+        parsed.compression,
+        parsed.compression_opts,
+        parsed.max_mem,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,539 @@
+//! Scatter and gather between N5 blocks and (possibly strided) array views.
+//!
+//! All coordinates here are in N5 axis order, and block data is in the
+//! column-major layout used by the N5 format.
+use std::borrow::Borrow;
+use std::cmp;
+use std::collections::HashMap;
+use std::io;
+
+use n5::prelude::*;
+use n5::{BlockCoord, GridCoord};
+use ndarray::{
+    ArrayD, ArrayView1, ArrayView2, ArrayViewD, ArrayViewMutD, Axis, IxDyn, ShapeBuilder,
+    ShapeError, Slice,
+};
+use rayon::prelude::*;
+
+use stats::{self, IoStats};
+
+/// Array views which can be split into disjoint pieces along an axis.
+pub trait SplitView: Sized {
+    fn axis_len(&self, axis: usize) -> usize;
+    fn split_axis(self, axis: usize, index: usize) -> (Self, Self);
+}
+
+impl<'a, T> SplitView for ArrayViewD<'a, T> {
+    fn axis_len(&self, axis: usize) -> usize {
+        self.len_of(Axis(axis))
+    }
+
+    fn split_axis(self, axis: usize, index: usize) -> (Self, Self) {
+        self.split_at(Axis(axis), index)
+    }
+}
+
+impl<'a, T> SplitView for ArrayViewMutD<'a, T> {
+    fn axis_len(&self, axis: usize) -> usize {
+        self.len_of(Axis(axis))
+    }
+
+    fn split_axis(self, axis: usize, index: usize) -> (Self, Self) {
+        self.split_at(Axis(axis), index)
+    }
+}
+
+/// Split a view of the region starting at `offset` into one disjoint piece
+/// per intersecting block, keyed by the grid position of that block.
+pub fn split_by_block<V: SplitView>(
+    view: V,
+    offset: &[u64],
+    block_size: &[u32],
+) -> Vec<(Vec<u64>, V)> {
+    split_by_block_strided(view, offset, &vec![1; offset.len()], block_size)
+}
+
+/// Split a view of the voxels at `offset + index * step` into one disjoint
+/// piece per block containing any of them, keyed by the grid position of
+/// that block. Blocks which contain none of the voxels are skipped.
+pub fn split_by_block_strided<V: SplitView>(
+    view: V,
+    offset: &[u64],
+    step: &[u64],
+    block_size: &[u32],
+) -> Vec<(Vec<u64>, V)> {
+    let mut pieces = vec![(Vec::with_capacity(offset.len()), view)];
+    for (axis, ((&start, &st), &bs)) in offset
+        .iter()
+        .zip(step.iter())
+        .zip(block_size.iter())
+        .enumerate()
+    {
+        let bs = u64::from(bs);
+        let mut next = Vec::with_capacity(pieces.len());
+        for (coord, piece) in pieces {
+            let len = piece.axis_len(axis) as u64;
+            let mut rest = piece;
+            let mut index = 0;
+            while index < len {
+                let pos = start + index * st;
+                let grid = pos / bs;
+                let in_block = ((grid + 1) * bs - pos + st - 1) / st;
+                let count = cmp::min(in_block, len - index);
+                let (head, tail) = rest.split_axis(axis, count as usize);
+                let mut grid_position = coord.clone();
+                grid_position.push(grid);
+                next.push((grid_position, head));
+                rest = tail;
+                index += count;
+            }
+        }
+        pieces = next;
+    }
+    pieces
+}
+
+/// Offset within the block at `grid_position` of the first voxel at or after `offset`.
+pub fn offset_in_block(grid_position: &[u64], offset: &[u64], block_size: &[u32]) -> Vec<usize> {
+    offset_in_block_strided(grid_position, offset, &vec![1; offset.len()], block_size)
+}
+
+/// Offset within the block at `grid_position` of the first voxel at
+/// `offset + index * step` for some `index`.
+pub fn offset_in_block_strided(
+    grid_position: &[u64],
+    offset: &[u64],
+    step: &[u64],
+    block_size: &[u32],
+) -> Vec<usize> {
+    grid_position
+        .iter()
+        .zip(offset.iter().zip(step.iter()))
+        .zip(block_size.iter())
+        .map(|((&g, (&o, &st)), &bs)| {
+            let block_start = g * u64::from(bs);
+            let first = if o >= block_start {
+                o
+            } else {
+                o + (block_start - o + st - 1) / st * st
+            };
+            (first - block_start) as usize
+        })
+        .collect()
+}
+
+/// Shape of the block at `grid_position`, truncated at the dataset boundary.
+pub fn block_shape(grid_position: &[u64], attr: &DatasetAttributes) -> Vec<usize> {
+    grid_position
+        .iter()
+        .zip(
+            attr.get_block_size()
+                .iter()
+                .zip(attr.get_dimensions().iter()),
+        )
+        .map(|(&g, (&bs, &dim))| {
+            let start = g * u64::from(bs);
+            cmp::min(u64::from(bs), dim.saturating_sub(start)) as usize
+        })
+        .collect()
+}
+
+fn shape_error(e: ShapeError) -> io::Error {
+    io::Error::new(io::ErrorKind::InvalidData, e.to_string())
+}
+
+/// View the data of a block as a column-major array.
+pub fn block_view<T>(block: &VecDataBlock<T>) -> io::Result<ArrayViewD<T>>
+where
+    VecDataBlock<T>: DataBlock<T>,
+{
+    let size: Vec<usize> = block.get_size().iter().map(|&s| s as usize).collect();
+    ArrayViewD::from_shape(IxDyn(&size).f(), block.get_data()).map_err(shape_error)
+}
+
+/// Copy the data of a block into a new column-major array.
+pub fn block_to_array<T>(block: &VecDataBlock<T>) -> io::Result<ArrayD<T>>
+where
+    T: Clone,
+    VecDataBlock<T>: DataBlock<T>,
+{
+    let size: Vec<usize> = block.get_size().iter().map(|&s| s as usize).collect();
+    ArrayD::from_shape_vec(IxDyn(&size).f(), block.get_data().to_vec()).map_err(shape_error)
+}
+
+/// Restrict a view to its first `shape` voxels along each axis.
+pub fn truncate<'a, T>(mut view: ArrayViewD<'a, T>, shape: &[usize]) -> ArrayViewD<'a, T> {
+    for (axis, &len) in shape.iter().enumerate() {
+        view.slice_axis_inplace(Axis(axis), Slice::from(0..len));
+    }
+    view
+}
+
+/// Copy the part of `block` starting at `start` into `dst`.
+///
+/// Voxels of `dst` not covered by the block (because it is missing or
+/// truncated) are set to `fill`.
+pub fn scatter_block<T>(
+    block: Option<&VecDataBlock<T>>,
+    dst: ArrayViewMutD<T>,
+    start: &[usize],
+    fill: T,
+) -> io::Result<()>
+where
+    T: Copy,
+    VecDataBlock<T>: DataBlock<T>,
+{
+    scatter_block_strided(block, dst, start, &vec![1; start.len()], fill)
+}
+
+/// Copy every `step`th voxel of `block`, starting at `start`, into `dst`.
+///
+/// Voxels of `dst` not covered by the block (because it is missing or
+/// truncated) are set to `fill`.
+pub fn scatter_block_strided<T>(
+    block: Option<&VecDataBlock<T>>,
+    mut dst: ArrayViewMutD<T>,
+    start: &[usize],
+    step: &[usize],
+    fill: T,
+) -> io::Result<()>
+where
+    T: Copy,
+    VecDataBlock<T>: DataBlock<T>,
+{
+    let block = match block {
+        Some(b) => b,
+        None => {
+            dst.fill(fill);
+            return Ok(());
+        }
+    };
+
+    let mut src = block_view(block)?;
+    let mut covered = true;
+    for (axis, (&st, &k)) in start.iter().zip(step.iter()).enumerate() {
+        let len = dst.len_of(Axis(axis));
+        // one past the last voxel wanted
+        let end = st + len.saturating_sub(1) * k + cmp::min(len, 1);
+        let stop = cmp::min(end, src.len_of(Axis(axis)));
+        if stop < end {
+            covered = false;
+        }
+        src.slice_axis_inplace(
+            Axis(axis),
+            Slice::new(cmp::min(st, stop) as isize, Some(stop as isize), k as isize),
+        );
+    }
+
+    if covered {
+        dst.assign(&src);
+    } else {
+        dst.fill(fill);
+        let mut dst = dst.view_mut();
+        for axis in 0..start.len() {
+            let len = src.len_of(Axis(axis));
+            dst.slice_axis_inplace(Axis(axis), Slice::from(0..len));
+        }
+        dst.assign(&src);
+    }
+    Ok(())
+}
+
+/// Build the data of the block at `start` by overlaying `src` onto the
+/// `existing` block, or onto `fill` if there is none.
+///
+/// `shape` is the full (possibly truncated) shape of the block.
+pub fn gather_block<T>(
+    existing: Option<&VecDataBlock<T>>,
+    src: ArrayViewD<T>,
+    start: &[usize],
+    shape: &[usize],
+    fill: T,
+) -> io::Result<Vec<T>>
+where
+    T: Copy,
+    VecDataBlock<T>: DataBlock<T>,
+{
+    if start.iter().all(|&s| s == 0) && src.shape() == shape {
+        // iterating over the transpose visits voxels in column-major order
+        return Ok(src.t().iter().cloned().collect());
+    }
+
+    let mut buf = ArrayD::from_elem(IxDyn(shape).f(), fill);
+    if let Some(block) = existing {
+        let mut old = block_view(block)?;
+        let mut dst = buf.view_mut();
+        for axis in 0..shape.len() {
+            let len = cmp::min(old.len_of(Axis(axis)), shape[axis]);
+            old.slice_axis_inplace(Axis(axis), Slice::from(0..len));
+            dst.slice_axis_inplace(Axis(axis), Slice::from(0..len));
+        }
+        dst.assign(&old);
+    }
+
+    let mut dst = buf.view_mut();
+    for (axis, &st) in start.iter().enumerate() {
+        let len = src.len_of(Axis(axis));
+        dst.slice_axis_inplace(Axis(axis), Slice::from(st..st + len));
+    }
+    dst.assign(&src);
+    Ok(buf.into_raw_vec())
+}
+
+/// Read the region starting at `offset` into `dst`, decoding blocks in parallel.
+///
+/// `read_block` fetches and decodes the block at a grid position (or gets
+/// it from a cache), returning `None` if it does not exist.
+pub fn read_into<T, B, F>(
+    dst: ArrayViewMutD<T>,
+    offset: &[u64],
+    attr: &DatasetAttributes,
+    fill: T,
+    stats: &IoStats,
+    read_block: F,
+) -> io::Result<()>
+where
+    T: Copy + Send + Sync,
+    VecDataBlock<T>: DataBlock<T>,
+    B: Borrow<VecDataBlock<T>>,
+    F: Fn(GridCoord) -> io::Result<Option<B>> + Sync,
+{
+    read_strided_into(
+        dst,
+        offset,
+        &vec![1; offset.len()],
+        attr,
+        fill,
+        stats,
+        read_block,
+    )
+}
+
+/// Read the voxels at `offset + index * step` into `dst` at `index`,
+/// decoding blocks in parallel.
+///
+/// Only blocks containing at least one of those voxels are read.
+/// `read_block` is as for `read_into`.
+pub fn read_strided_into<T, B, F>(
+    dst: ArrayViewMutD<T>,
+    offset: &[u64],
+    step: &[u64],
+    attr: &DatasetAttributes,
+    fill: T,
+    stats: &IoStats,
+    read_block: F,
+) -> io::Result<()>
+where
+    T: Copy + Send + Sync,
+    VecDataBlock<T>: DataBlock<T>,
+    B: Borrow<VecDataBlock<T>>,
+    F: Fn(GridCoord) -> io::Result<Option<B>> + Sync,
+{
+    let block_size = attr.get_block_size();
+    let block_step: Vec<usize> = step.iter().map(|&s| s as usize).collect();
+    split_by_block_strided(dst, offset, step, block_size)
+        .into_par_iter()
+        .try_for_each(|(grid_position, view)| {
+            let start = offset_in_block_strided(&grid_position, offset, step, block_size);
+            let block = read_block(grid_position.into())?;
+            let block = block.as_ref().map(<B as Borrow<VecDataBlock<T>>>::borrow);
+            let timer = stats::start();
+            scatter_block_strided(block, view, &start, &block_step, fill)?;
+            stats.add_time(|s| &s.scatter_ns, timer);
+            Ok(())
+        })
+}
+
+/// Read the regions starting at each of `offsets` into the corresponding
+/// view in `dsts`, decoding blocks in parallel.
+///
+/// Each block is read once, however many regions it intersects.
+/// `read_block` is as for `read_into`.
+pub fn read_many_into<T, B, F>(
+    dsts: Vec<ArrayViewMutD<T>>,
+    offsets: &[Vec<u64>],
+    attr: &DatasetAttributes,
+    fill: T,
+    stats: &IoStats,
+    read_block: F,
+) -> io::Result<()>
+where
+    T: Copy + Send + Sync,
+    VecDataBlock<T>: DataBlock<T>,
+    B: Borrow<VecDataBlock<T>>,
+    F: Fn(GridCoord) -> io::Result<Option<B>> + Sync,
+{
+    let block_size = attr.get_block_size();
+    let mut by_block: HashMap<Vec<u64>, Vec<_>> = HashMap::new();
+    for (dst, offset) in dsts.into_iter().zip(offsets.iter()) {
+        for (grid_position, view) in split_by_block(dst, offset, block_size) {
+            let start = offset_in_block(&grid_position, offset, block_size);
+            by_block
+                .entry(grid_position)
+                .or_insert_with(Vec::new)
+                .push((start, view));
+        }
+    }
+
+    by_block
+        .into_par_iter()
+        .try_for_each(|(grid_position, pieces)| {
+            let block = read_block(grid_position.into())?;
+            let block = block.as_ref().map(<B as Borrow<VecDataBlock<T>>>::borrow);
+            let timer = stats::start();
+            for (start, view) in pieces {
+                scatter_block(block, view, &start, fill)?;
+            }
+            stats.add_time(|s| &s.scatter_ns, timer);
+            Ok(())
+        })
+}
+
+/// Read the voxels at `points`, an (N, ndim) array of coordinates, decoding
+/// each block containing any of them once, with blocks in parallel.
+///
+/// Returns the N voxels in the order of `points`. Points in missing blocks
+/// are `fill`, and points outside the dataset are `out_of_bounds`.
+/// `read_block` is as for `read_into`.
+pub fn read_points<T, B, F>(
+    points: ArrayView2<i64>,
+    attr: &DatasetAttributes,
+    fill: T,
+    out_of_bounds: T,
+    stats: &IoStats,
+    read_block: F,
+) -> io::Result<Vec<T>>
+where
+    T: Copy + Send + Sync,
+    VecDataBlock<T>: DataBlock<T>,
+    B: Borrow<VecDataBlock<T>>,
+    F: Fn(GridCoord) -> io::Result<Option<B>> + Sync,
+{
+    let block_size = attr.get_block_size();
+    let mut out = vec![fill; points.len_of(Axis(0))];
+    let mut by_block: HashMap<Vec<u64>, Vec<usize>> = HashMap::new();
+    for (i, point) in points.outer_iter().enumerate() {
+        if !point_in_bounds(point, attr) {
+            out[i] = out_of_bounds;
+            continue;
+        }
+        let grid_position = point
+            .iter()
+            .zip(block_size.iter())
+            .map(|(&p, &bs)| p as u64 / u64::from(bs))
+            .collect();
+        by_block
+            .entry(grid_position)
+            .or_insert_with(Vec::new)
+            .push(i);
+    }
+
+    let values = by_block
+        .into_par_iter()
+        .map(|(grid_position, indices)| -> io::Result<Vec<(usize, T)>> {
+            let block = match read_block(grid_position.clone().into())? {
+                Some(block) => block,
+                None => return Ok(Vec::new()),
+            };
+            let timer = stats::start();
+            let view = block_view(<B as Borrow<VecDataBlock<T>>>::borrow(&block))?;
+            let mut index = vec![0; grid_position.len()];
+            let values = indices
+                .into_iter()
+                .map(|i| {
+                    for (axis, ((ix, &g), &bs)) in index
+                        .iter_mut()
+                        .zip(grid_position.iter())
+                        .zip(block_size.iter())
+                        .enumerate()
+                    {
+                        *ix = (points[[i, axis]] as u64 - g * u64::from(bs)) as usize;
+                    }
+                    (i, view.get(IxDyn(&index)).cloned().unwrap_or(fill))
+                })
+                .collect();
+            stats.add_time(|s| &s.scatter_ns, timer);
+            Ok(values)
+        })
+        .collect::<io::Result<Vec<_>>>()?;
+    for (i, value) in values.into_iter().flatten() {
+        out[i] = value;
+    }
+    Ok(out)
+}
+
+/// Write `src` to the region starting at `offset`, encoding blocks in parallel.
+///
+/// Blocks only partially covered by `src` are read with `read_block` and
+/// updated; `write_block` encodes and writes a block given its size,
+/// grid position and column-major data.
+pub fn write_from<T, B, R, W>(
+    src: ArrayViewD<T>,
+    offset: &[u64],
+    attr: &DatasetAttributes,
+    fill: T,
+    stats: &IoStats,
+    read_block: R,
+    write_block: W,
+) -> io::Result<()>
+where
+    T: Copy + Send + Sync,
+    VecDataBlock<T>: DataBlock<T>,
+    B: Borrow<VecDataBlock<T>>,
+    R: Fn(GridCoord) -> io::Result<Option<B>> + Sync,
+    W: Fn(BlockCoord, GridCoord, Vec<T>) -> io::Result<()> + Sync,
+{
+    let block_size = attr.get_block_size();
+    split_by_block(src, offset, block_size)
+        .into_par_iter()
+        .try_for_each(|(grid_position, view)| {
+            let start = offset_in_block(&grid_position, offset, block_size);
+            let shape = block_shape(&grid_position, attr);
+            let covered = start.iter().all(|&s| s == 0) && view.shape() == &shape[..];
+            let existing = if covered {
+                None
+            } else {
+                read_block(grid_position.clone().into())?
+            };
+            let existing = existing
+                .as_ref()
+                .map(<B as Borrow<VecDataBlock<T>>>::borrow);
+            let timer = stats::start();
+            let data = gather_block(existing, view, &start, &shape, fill)?;
+            stats.add_time(|s| &s.gather_ns, timer);
+            let size: Vec<u32> = shape.iter().map(|&s| s as u32).collect();
+            write_block(size.into(), grid_position.into(), data)
+        })
+}
+
+/// Whether every element of `data` is `fill` (or NaN, if `fill` is NaN).
+#[allow(clippy::eq_op)]
+pub fn all_fill<T: Copy + PartialEq>(data: &[T], fill: T) -> bool {
+    if fill != fill {
+        data.iter().all(|&v| v != v)
+    } else {
+        data.iter().all(|&v| v == fill)
+    }
+}
+
+/// Check that the region starting at `offset` with the given shape lies within the dataset.
+pub fn in_bounds(offset: &[u64], shape: &[usize], attr: &DatasetAttributes) -> bool {
+    let dims = attr.get_dimensions();
+    offset.len() == dims.len()
+        && shape.len() == dims.len()
+        && offset
+            .iter()
+            .zip(shape.iter())
+            .zip(dims.iter())
+            .all(|((&o, &s), &d)| o + s as u64 <= d)
+}
+
+/// Check that a point (in N5 axis order) lies within the dataset.
+pub fn point_in_bounds(point: ArrayView1<i64>, attr: &DatasetAttributes) -> bool {
+    let dims = attr.get_dimensions();
+    point.len() == dims.len()
+        && point
+            .iter()
+            .zip(dims.iter())
+            .all(|(&p, &d)| p >= 0 && (p as u64) < d)
+}
@@ -0,0 +1,193 @@
+//! Byte-budgeted LRU cache of decoded blocks.
+//!
+//! One cache can be shared by datasets of different data types:
+//! entries are keyed by dataset and grid position, and type-erased.
+use std::any::Any;
+use std::collections::{BTreeMap, HashMap};
+use std::io;
+use std::mem;
+use std::sync::atomic::{AtomicU64, Ordering};
+use std::sync::{Arc, Mutex, MutexGuard};
+
+use n5::prelude::*;
+
+/// Approximate bookkeeping cost of an entry, so that missing blocks count too.
+const ENTRY_OVERHEAD: usize = 128;
+
+type Key = (String, Vec<u64>);
+
+struct Entry {
+    /// An `Option<Arc<VecDataBlock<T>>>`; `None` records a missing block.
+    value: Arc<dyn Any + Send + Sync>,
+    nbytes: usize,
+    tick: u64,
+}
+
+#[derive(Default)]
+struct Entries {
+    map: HashMap<Key, Entry>,
+    /// Keys by time of last use, least recent first.
+    order: BTreeMap<u64, Key>,
+    /// Keys being loaded, with the tick at which the load started;
+    /// invalidating a key removes it, so that a stale load is not inserted.
+    loading: HashMap<Key, u64>,
+    nbytes: usize,
+    tick: u64,
+}
+
+impl Entries {
+    fn touch(&mut self, key: &Key) {
+        self.tick += 1;
+        let tick = self.tick;
+        if let Some(entry) = self.map.get_mut(key) {
+            self.order.remove(&entry.tick);
+            entry.tick = tick;
+            self.order.insert(tick, key.clone());
+        }
+    }
+
+    fn remove(&mut self, key: &Key) {
+        if let Some(entry) = self.map.remove(key) {
+            self.order.remove(&entry.tick);
+            self.nbytes -= entry.nbytes;
+        }
+    }
+}
+
+pub struct BlockCache {
+    capacity: usize,
+    entries: Mutex<Entries>,
+    hits: AtomicU64,
+    misses: AtomicU64,
+}
+
+impl BlockCache {
+    /// Create a cache holding up to `capacity` bytes of decoded blocks.
+    pub fn new(capacity: usize) -> Self {
+        BlockCache {
+            capacity,
+            entries: Mutex::new(Entries::default()),
+            hits: AtomicU64::new(0),
+            misses: AtomicU64::new(0),
+        }
+    }
+
+    fn lock(&self) -> MutexGuard<Entries> {
+        self.entries.lock().unwrap_or_else(|e| e.into_inner())
+    }
+
+    /// Get the block of `dataset` at `grid_position`, calling `load` to read
+    /// and decode it if it is not cached.
+    pub fn get_or_load<T, F>(
+        &self,
+        dataset: &str,
+        grid_position: &[u64],
+        load: F,
+    ) -> io::Result<Option<Arc<VecDataBlock<T>>>>
+    where
+        T: Send + Sync + 'static,
+        VecDataBlock<T>: DataBlock<T>,
+        F: FnOnce() -> io::Result<Option<VecDataBlock<T>>>,
+    {
+        let key = (dataset.to_owned(), grid_position.to_vec());
+        let started = {
+            let mut entries = self.lock();
+            let cached = entries.map.get(&key).and_then(|entry| {
+                entry
+                    .value
+                    .clone()
+                    .downcast::<Option<Arc<VecDataBlock<T>>>>()
+                    .ok()
+            });
+            if let Some(value) = cached {
+                entries.touch(&key);
+                self.hits.fetch_add(1, Ordering::Relaxed);
+                return Ok((*value).clone());
+            }
+            entries.tick += 1;
+            let tick = entries.tick;
+            entries.loading.insert(key.clone(), tick);
+            tick
+        };
+
+        self.misses.fetch_add(1, Ordering::Relaxed);
+        let loaded = load();
+        let mut entries = self.lock();
+        // if the block was written while loading, what was loaded may be stale
+        let current = entries.loading.get(&key) == Some(&started);
+        if current {
+            entries.loading.remove(&key);
+        }
+        let block = loaded?.map(Arc::new);
+        let nbytes = ENTRY_OVERHEAD
+            + block
+                .as_ref()
+                .map_or(0, |b| b.get_data().len() * mem::size_of::<T>());
+        if current && nbytes <= self.capacity {
+            entries.remove(&key);
+            entries.tick += 1;
+            let tick = entries.tick;
+            entries.order.insert(tick, key.clone());
+            entries.map.insert(
+                key,
+                Entry {
+                    value: Arc::new(block.clone()),
+                    nbytes,
+                    tick,
+                },
+            );
+            entries.nbytes += nbytes;
+            while entries.nbytes > self.capacity {
+                let oldest = match entries.order.keys().next() {
+                    Some(&tick) => entries.order[&tick].clone(),
+                    None => break,
+                };
+                entries.remove(&oldest);
+            }
+        }
+        Ok(block)
+    }
+
+    /// Drop the cached block of `dataset` at `grid_position`, if any,
+    /// and any copy of it currently being loaded.
+    pub fn invalidate(&self, dataset: &str, grid_position: &[u64]) {
+        let key = (dataset.to_owned(), grid_position.to_vec());
+        let mut entries = self.lock();
+        entries.loading.remove(&key);
+        entries.remove(&key);
+    }
+
+    /// Drop all cached blocks.
+    pub fn clear(&self) {
+        let mut entries = self.lock();
+        entries.map.clear();
+        entries.order.clear();
+        entries.loading.clear();
+        entries.nbytes = 0;
+    }
+
+    pub fn capacity(&self) -> usize {
+        self.capacity
+    }
+
+    pub fn nbytes(&self) -> usize {
+        self.lock().nbytes
+    }
+
+    pub fn num_blocks(&self) -> usize {
+        self.lock().map.len()
+    }
+
+    pub fn hits(&self) -> u64 {
+        self.hits.load(Ordering::Relaxed)
+    }
+
+    pub fn misses(&self) -> u64 {
+        self.misses.load(Ordering::Relaxed)
+    }
+
+    pub fn reset_counters(&self) {
+        self.hits.store(0, Ordering::Relaxed);
+        self.misses.store(0, Ordering::Relaxed);
+    }
+}
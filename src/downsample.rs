@@ -0,0 +1,175 @@
+//! Downsampling kernels for building multiscale pyramids.
+//!
+//! These work on arrays in any axis order: factors are given in the same order as the axes.
+use std::cmp::{self, Ordering};
+use std::io;
+
+use ndarray::{ArrayD, ArrayViewD, Axis, IxDyn, Slice};
+use rayon::prelude::*;
+
+/// How to reduce each window of voxels to one.
+#[derive(Clone, Copy, Debug, PartialEq)]
+pub enum Method {
+    Mean,
+    Mode,
+    Max,
+}
+
+impl Method {
+    pub fn parse(name: &str) -> Option<Self> {
+        match name {
+            "mean" => Some(Method::Mean),
+            "mode" => Some(Method::Mode),
+            "max" => Some(Method::Max),
+            _ => None,
+        }
+    }
+}
+
+/// Element types which can be downsampled.
+pub trait Sample: Copy + Default + PartialOrd + Send + Sync {
+    /// Mean of the `len` (> 0) `values`; integer means are rounded to the nearest value.
+    fn mean<I: Iterator<Item = Self>>(values: I, len: usize) -> Self;
+
+    /// A total order, placing NaN after everything else.
+    fn sample_cmp(&self, other: &Self) -> Ordering {
+        self.partial_cmp(other).unwrap_or(Ordering::Equal)
+    }
+}
+
+macro_rules! sample_int {
+    ($($t:ty),*) => {
+        $(
+            impl Sample for $t {
+                fn mean<I: Iterator<Item = Self>>(values: I, len: usize) -> Self {
+                    // exact even for 64-bit values, which f64 cannot represent;
+                    // halves are rounded away from zero
+                    let sum: i128 = values.map(|v| v as i128).sum();
+                    let len = len as i128;
+                    let half = if sum < 0 { -len } else { len };
+                    ((2 * sum + half) / (2 * len)) as $t
+                }
+            }
+        )*
+    };
+}
+
+macro_rules! sample_float {
+    ($($t:ty),*) => {
+        $(
+            impl Sample for $t {
+                fn mean<I: Iterator<Item = Self>>(values: I, len: usize) -> Self {
+                    let sum: f64 = values.map(|v| v as f64).sum();
+                    (sum / len as f64) as $t
+                }
+
+                fn sample_cmp(&self, other: &Self) -> Ordering {
+                    self.partial_cmp(other)
+                        .unwrap_or_else(|| self.is_nan().cmp(&other.is_nan()))
+                }
+            }
+        )*
+    };
+}
+
+sample_int!(u8, u16, u32, u64, i8, i16, i32, i64);
+sample_float!(f32, f64);
+
+/// Reduce a window to one voxel. `buf` is scratch space for the mode.
+fn reduce<T: Sample>(window: ArrayViewD<T>, method: Method, buf: &mut Vec<T>) -> T {
+    match method {
+        Method::Mean => T::mean(window.iter().cloned(), window.len()),
+        Method::Max => {
+            let mut values = window.iter().cloned();
+            let first = values.next().unwrap_or_default();
+            values.fold(first, |acc, v| {
+                if v.sample_cmp(&acc) == Ordering::Greater {
+                    v
+                } else {
+                    acc
+                }
+            })
+        }
+        Method::Mode => {
+            // sorting a copy of the window is faster than hashing for the
+            // small windows used in pyramids; ties go to the smallest value
+            buf.clear();
+            buf.extend(window.iter().cloned());
+            buf.sort_unstable_by(T::sample_cmp);
+            let mut best = T::default();
+            let mut best_count = 0;
+            let mut start = 0;
+            while start < buf.len() {
+                let value = buf[start];
+                let mut stop = start + 1;
+                while stop < buf.len() && buf[stop].sample_cmp(&value) == Ordering::Equal {
+                    stop += 1;
+                }
+                if stop - start > best_count {
+                    best = value;
+                    best_count = stop - start;
+                }
+                start = stop;
+            }
+            best
+        }
+    }
+}
+
+/// Downsample `src` by an integer factor along each axis, reducing each window with `method`.
+///
+/// Windows at the upper edges are truncated, so the result has `ceil(len / factor)`
+/// voxels along each axis. Rows of the (C-contiguous) result are computed in parallel.
+pub fn downsample<T: Sample>(
+    src: ArrayViewD<T>,
+    factors: &[usize],
+    method: Method,
+) -> io::Result<ArrayD<T>> {
+    if factors.len() != src.ndim() || factors.contains(&0) {
+        return Err(io::Error::new(
+            io::ErrorKind::InvalidInput,
+            format!(
+                "Expected {} positive downsampling factors, got {:?}",
+                src.ndim(),
+                factors
+            ),
+        ));
+    }
+    let shape: Vec<usize> = src
+        .shape()
+        .iter()
+        .zip(factors.iter())
+        .map(|(&len, &f)| (len + f - 1) / f)
+        .collect();
+    let size: usize = shape.iter().product();
+    if src.ndim() == 0 {
+        return Ok(src.to_owned());
+    } else if size == 0 {
+        return Ok(ArrayD::from_elem(IxDyn(&shape), T::default()));
+    }
+
+    let last = src.ndim() - 1;
+    let mut data = vec![T::default(); size];
+    data.par_chunks_mut(shape[last])
+        .enumerate()
+        .for_each(|(row, out)| {
+            let mut window = src.view();
+            let mut rest = row;
+            for axis in (0..last).rev() {
+                let lo = (rest % shape[axis]) * factors[axis];
+                let hi = cmp::min(lo + factors[axis], src.len_of(Axis(axis)));
+                window.slice_axis_inplace(Axis(axis), Slice::from(lo..hi));
+                rest /= shape[axis];
+            }
+            let mut buf = Vec::new();
+            for (i, value) in out.iter_mut().enumerate() {
+                let lo = i * factors[last];
+                let hi = cmp::min(lo + factors[last], src.len_of(Axis(last)));
+                let mut w = window.view();
+                w.slice_axis_inplace(Axis(last), Slice::from(lo..hi));
+                *value = reduce(w, method, &mut buf);
+            }
+        });
+    ArrayD::from_shape_vec(IxDyn(&shape), data)
+        .map_err(|e| io::Error::new(io::ErrorKind::InvalidData, e.to_string()))
+}
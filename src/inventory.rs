@@ -0,0 +1,218 @@
+//! Listing the blocks of a dataset on the filesystem without reading them.
+//!
+//! Blocks of an N5 dataset are stored at `<dataset>/<i>/<j>/<k>/...`, one
+//! directory level per dimension except the last, which names the file.
+use std::fs;
+use std::io;
+use std::path::{Path, PathBuf};
+
+use rayon::prelude::*;
+
+/// Entries of `dir` whose names are grid coordinates, with their paths.
+fn numbered_entries(dir: &Path, want_dirs: bool) -> io::Result<Vec<(u64, PathBuf, u64)>> {
+    let mut entries = Vec::new();
+    for entry in fs::read_dir(dir)? {
+        let entry = entry?;
+        let index = match entry.file_name().to_str().and_then(|s| s.parse().ok()) {
+            Some(index) => index,
+            None => continue,
+        };
+        let file_type = entry.file_type()?;
+        if want_dirs && file_type.is_dir() {
+            entries.push((index, entry.path(), 0));
+        } else if !want_dirs && file_type.is_file() {
+            entries.push((index, entry.path(), entry.metadata()?.len()));
+        }
+    }
+    Ok(entries)
+}
+
+/// Find the blocks stored under the dataset directory `dir`, walking
+/// directories in parallel.
+///
+/// Returns the grid position (in N5 axis order) and size in bytes of each
+/// block file, sorted by grid position.
+pub fn list_blocks(dir: &Path, ndim: usize) -> io::Result<Vec<(Vec<u64>, u64)>> {
+    let mut prefixes = vec![(Vec::new(), dir.to_path_buf())];
+    for _ in 1..ndim {
+        prefixes = prefixes
+            .into_par_iter()
+            .map(|(coord, path)| -> io::Result<Vec<(Vec<u64>, PathBuf)>> {
+                Ok(numbered_entries(&path, true)?
+                    .into_iter()
+                    .map(|(index, path, _)| {
+                        let mut coord = coord.clone();
+                        coord.push(index);
+                        (coord, path)
+                    })
+                    .collect())
+            })
+            .collect::<io::Result<Vec<_>>>()?
+            .into_iter()
+            .flatten()
+            .collect();
+    }
+
+    let mut found: Vec<(Vec<u64>, u64)> = prefixes
+        .into_par_iter()
+        .map(|(coord, path)| -> io::Result<Vec<(Vec<u64>, u64)>> {
+            Ok(numbered_entries(&path, false)?
+                .into_iter()
+                .map(|(index, _, size)| {
+                    let mut coord = coord.clone();
+                    coord.push(index);
+                    (coord, size)
+                })
+                .collect())
+        })
+        .collect::<io::Result<Vec<_>>>()?
+        .into_iter()
+        .flatten()
+        .collect();
+    found.par_sort_unstable();
+    Ok(found)
+}
+
+/// Copy the block files of the dataset at `src` to the dataset directory
+/// `dst` byte for byte, in parallel, returning the number of bytes copied.
+///
+/// `fs::copy` uses `copy_file_range` where available, which lets
+/// filesystems supporting it share data (reflink) rather than duplicate it.
+pub fn copy_blocks(src: &Path, dst: &Path, ndim: usize) -> io::Result<u64> {
+    let copied = list_blocks(src, ndim)?
+        .into_par_iter()
+        .map(|(position, _)| {
+            let relative: PathBuf = position.iter().map(|p| p.to_string()).collect();
+            let target = dst.join(&relative);
+            if let Some(parent) = target.parent() {
+                fs::create_dir_all(parent)?;
+            }
+            fs::copy(src.join(&relative), target)
+        })
+        .collect::<io::Result<Vec<u64>>>()?;
+    Ok(copied.iter().sum())
+}
+
+/// Keys of the attributes which mark a directory as a dataset rather than a group.
+const DATASET_KEYS: [&str; 4] = ["dimensions", "blockSize", "dataType", "compression"];
+
+/// A group or dataset found by `scan_tree`.
+pub struct Node {
+    /// Path relative to the root of the walk, with `/` separators; empty for the root.
+    pub path: String,
+    pub is_dataset: bool,
+    /// Contents of the attributes file, if there is one.
+    pub attributes: Option<String>,
+    /// Modification time (ns), size and inode of the attributes file,
+    /// read before its contents, where the platform provides them.
+    pub stat: Option<(i64, u64, u64)>,
+}
+
+#[cfg(unix)]
+fn stat_key(meta: &fs::Metadata) -> Option<(i64, u64, u64)> {
+    use std::os::unix::fs::MetadataExt;
+    Some((
+        meta.mtime() * 1_000_000_000 + meta.mtime_nsec(),
+        meta.size(),
+        meta.ino(),
+    ))
+}
+
+#[cfg(not(unix))]
+fn stat_key(_meta: &fs::Metadata) -> Option<(i64, u64, u64)> {
+    None
+}
+
+/// Read the attributes file of the node at `dir`, and decide whether it is a dataset.
+fn read_node(path: String, dir: &Path) -> io::Result<Node> {
+    let attr_path = dir.join("attributes.json");
+    let (attributes, stat) = match fs::metadata(&attr_path) {
+        Ok(meta) => match fs::read_to_string(&attr_path) {
+            Ok(text) => (Some(text), stat_key(&meta)),
+            Err(ref e) if e.kind() == io::ErrorKind::NotFound => (None, None),
+            Err(e) => return Err(e),
+        },
+        Err(ref e) if e.kind() == io::ErrorKind::NotFound => (None, None),
+        Err(e) => return Err(e),
+    };
+    let is_dataset = attributes
+        .as_ref()
+        .and_then(|text| serde_json::from_str::<serde_json::Value>(text).ok())
+        .map_or(false, |value| {
+            DATASET_KEYS.iter().all(|key| value.get(key).is_some())
+        });
+    Ok(Node {
+        path,
+        is_dataset,
+        attributes,
+        stat,
+    })
+}
+
+/// Subdirectories of `dir`, following symlinks.
+fn subdirectories(dir: &Path) -> io::Result<Vec<(String, PathBuf)>> {
+    let mut found = Vec::new();
+    for entry in fs::read_dir(dir)? {
+        let entry = entry?;
+        let file_type = entry.file_type()?;
+        if file_type.is_dir() || (file_type.is_symlink() && entry.path().is_dir()) {
+            if let Ok(name) = entry.file_name().into_string() {
+                found.push((name, entry.path()));
+            }
+        }
+    }
+    Ok(found)
+}
+
+/// Read the node at `dir` and, if it is a group and `descend`, list its children.
+fn visit(path: String, dir: &Path, descend: bool) -> io::Result<(Node, Vec<(String, PathBuf)>)> {
+    let node = read_node(path, dir)?;
+    if !descend || node.is_dataset {
+        return Ok((node, Vec::new()));
+    }
+    let children = match subdirectories(dir) {
+        Ok(children) => children,
+        // removed since its parent was listed
+        Err(ref e) if e.kind() == io::ErrorKind::NotFound => Vec::new(),
+        Err(e) => return Err(e),
+    };
+    let children = children
+        .into_iter()
+        .map(|(name, child)| {
+            if node.path.is_empty() {
+                (name, child)
+            } else {
+                (format!("{}/{}", node.path, name), child)
+            }
+        })
+        .collect();
+    Ok((node, children))
+}
+
+/// Find the groups and datasets under the group directory `root`, walking
+/// directories in parallel, one level at a time, and reading every attributes file.
+///
+/// Datasets are not descended into, and nodes are not descended into beyond
+/// `max_depth` levels below `root`. Nodes are sorted by path, so parents come
+/// before their children.
+pub fn scan_tree(root: &Path, max_depth: Option<usize>) -> io::Result<Vec<Node>> {
+    let mut nodes = Vec::new();
+    let mut frontier = vec![(String::new(), root.to_path_buf())];
+    let mut depth = 0;
+    while !frontier.is_empty() {
+        let descend = max_depth.map_or(true, |max| depth < max);
+        let level = frontier
+            .into_par_iter()
+            .map(|(path, dir)| visit(path, &dir, descend))
+            .collect::<io::Result<Vec<_>>>()?;
+
+        frontier = Vec::new();
+        for (node, children) in level {
+            nodes.push(node);
+            frontier.extend(children);
+        }
+        depth += 1;
+    }
+    nodes.par_sort_unstable_by(|a, b| a.path.cmp(&b.path));
+    Ok(nodes)
+}
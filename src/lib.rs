@@ -1,13 +1,409 @@
+extern crate fs2;
 extern crate n5;
+extern crate ndarray;
 extern crate numpy;
 #[macro_use]
 extern crate pyo3;
+extern crate rayon;
 
-use n5::ndarray::prelude::*;
 use n5::prelude::*;
-use numpy::{IntoPyArray, PyArrayDyn};
+use n5::BlockCoord;
+use ndarray::{Array1, Array2, ArrayD, ArrayViewD, ArrayViewMutD, Axis};
+use numpy::{IntoPyArray, PyArray1, PyArray2, PyArrayDyn};
 use pyo3::exceptions;
 use pyo3::prelude::*;
+use rayon::prelude::*;
+use std::collections::HashMap;
+use std::io;
+use std::mem;
+use std::path::Path;
+use std::sync::atomic::{AtomicBool, Ordering};
+use std::sync::Arc;
+
+mod blocks;
+mod cache;
+mod downsample;
+mod inventory;
+mod pool;
+mod stats;
+mod store;
+
+/// Check that a numpy array can be written into from rust.
+///
+/// Arrays must be writeable and have non-negative strides;
+/// they need not be contiguous.
+fn check_output_array<T: numpy::Element>(out: &PyArrayDyn<T>, ndim: usize) -> PyResult<()> {
+    if out.ndim() != ndim {
+        return Err(exceptions::ValueError::py_err(format!(
+            "Output array has {} dimensions, expected {}",
+            out.ndim(),
+            ndim
+        )));
+    }
+    if !out
+        .getattr("flags")?
+        .getattr("writeable")?
+        .extract::<bool>()?
+    {
+        return Err(exceptions::ValueError::py_err(
+            "Output array is not writeable",
+        ));
+    }
+    if out.strides().iter().any(|&s| s < 0) {
+        return Err(exceptions::ValueError::py_err(
+            "Output array must not have negative strides",
+        ));
+    }
+    Ok(())
+}
+
+/// Check that ``translation`` has one coordinate per dimension of the dataset.
+fn check_translation(store: &store::BlockStore, translation: &[u64]) -> PyResult<()> {
+    let ndim = store.attr.get_dimensions().len();
+    if translation.len() != ndim {
+        return Err(exceptions::ValueError::py_err(format!(
+            "Translation has {} dimensions but dataset {} has {}",
+            translation.len(),
+            store.path,
+            ndim
+        )));
+    }
+    Ok(())
+}
+
+/// Check that an array of the given shape at ``translation`` (both in N5
+/// axis order) lies within the dataset.
+fn check_in_bounds(
+    store: &store::BlockStore,
+    translation: &[u64],
+    shape: &[usize],
+) -> PyResult<()> {
+    if !blocks::in_bounds(translation, shape, &store.attr) {
+        return Err(exceptions::ValueError::py_err(format!(
+            "Array of shape {:?} at {:?} is out of bounds of dataset {} with shape {:?}",
+            shape,
+            translation,
+            store.path,
+            store.attr.get_dimensions()
+        )));
+    }
+    Ok(())
+}
+
+/// Convert a translation given in C (h5py) axis order into N5 axis order.
+fn n5_translation(translation: Vec<u64>, c_order: bool) -> Vec<u64> {
+    if c_order {
+        translation.into_iter().rev().collect()
+    } else {
+        translation
+    }
+}
+
+/// Check that ``position`` is a block within the dataset and that ``shape``
+/// (in N5 axis order) is either its full shape or its shape truncated at
+/// the dataset boundary, returning the truncated shape.
+fn check_block_shape(
+    attr: &DatasetAttributes,
+    path: &str,
+    position: &[u64],
+    shape: &[usize],
+) -> PyResult<BlockCoord> {
+    let ndim = attr.get_dimensions().len();
+    let in_grid = position.len() == ndim
+        && position
+            .iter()
+            .zip(
+                attr.get_block_size()
+                    .iter()
+                    .zip(attr.get_dimensions().iter()),
+            )
+            .all(|(&g, (&bs, &dim))| g * u64::from(bs) < dim);
+    if !in_grid {
+        return Err(exceptions::ValueError::py_err(format!(
+            "Block {:?} is outside the grid of dataset {}",
+            position, path
+        )));
+    }
+
+    let truncated = blocks::block_shape(position, attr);
+    let full: Vec<usize> = attr.get_block_size().iter().map(|&s| s as usize).collect();
+    if shape == &truncated[..] || shape == &full[..] {
+        Ok(truncated.iter().map(|&s| s as u32).collect())
+    } else {
+        Err(exceptions::ValueError::py_err(format!(
+            "Data has shape {:?} but block {:?} of dataset {} has shape {:?}",
+            shape, position, path, truncated
+        )))
+    }
+}
+
+/// Extract block grid positions from an (N, ndim) array or a sequence of sequences.
+fn extract_positions(positions: &PyAny, ndim: usize) -> PyResult<Vec<Vec<u64>>> {
+    let positions: Vec<Vec<u64>> = match positions.extract::<&PyArray2<u64>>() {
+        Ok(arr) if arr.strides().iter().all(|&s| s >= 0) => arr
+            .readonly()
+            .as_array()
+            .outer_iter()
+            .map(|row| row.to_vec())
+            .collect(),
+        _ => positions.extract()?,
+    };
+    if positions.iter().any(|p| p.len() != ndim) {
+        return Err(exceptions::ValueError::py_err(format!(
+            "Positions must have {} dimensions",
+            ndim
+        )));
+    }
+    Ok(positions)
+}
+
+/// Set the number of threads in the pool shared by datasets which do not
+/// have their own (0 for one per CPU).
+#[pyfunction]
+fn set_num_threads(num_threads: usize) -> PyResult<()> {
+    pool::set_global(num_threads)?;
+    Ok(())
+}
+
+/// Get the number of threads in the pool shared by datasets which do not
+/// have their own.
+#[pyfunction]
+fn get_num_threads() -> PyResult<usize> {
+    Ok(pool::global()?.current_num_threads())
+}
+
+/// Turn collection of I/O statistics on or off for all datasets (default off).
+///
+/// When off, counters are not updated and timing costs nothing.
+#[pyfunction]
+fn set_stats_enabled(enabled: bool) -> PyResult<()> {
+    stats::set_enabled(enabled);
+    Ok(())
+}
+
+/// Whether I/O statistics are being collected.
+#[pyfunction]
+fn get_stats_enabled() -> PyResult<bool> {
+    Ok(stats::enabled())
+}
+
+/// I/O statistics summed over every dataset in this process, as a dict;
+/// see ``stats`` of the dataset classes.
+#[pyfunction]
+fn io_stats() -> PyResult<HashMap<&'static str, u64>> {
+    Ok(stats::GLOBAL.snapshot().into_iter().collect())
+}
+
+/// Set the process-wide I/O statistics to zero.
+#[pyfunction]
+fn reset_io_stats() -> PyResult<()> {
+    stats::GLOBAL.reset();
+    Ok(())
+}
+
+/// Parse the JSON of a ``"compression"`` attribute.
+fn parse_compression(compression: &str) -> PyResult<CompressionType> {
+    serde_json::from_str(compression)
+        .map_err(|_e| exceptions::ValueError::py_err("Could not deserialize compression"))
+}
+
+/// An open N5 container, shared by datasets opened with ``from_attributes``
+/// so that the container's version is only checked once.
+#[pyclass]
+struct FileHandle {
+    n5: N5Filesystem,
+    root_path: String,
+}
+
+#[pymethods]
+impl FileHandle {
+    #[new]
+    #[args(read_only = "true")]
+    fn __new__(root_path: &str, read_only: bool) -> PyResult<Self> {
+        let n5 = if read_only {
+            N5Filesystem::open(root_path)?
+        } else {
+            N5Filesystem::open_or_create(root_path)?
+        };
+        Ok(FileHandle {
+            n5,
+            root_path: root_path.to_owned(),
+        })
+    }
+
+    #[getter]
+    fn root_path(&self) -> PyResult<String> {
+        Ok(self.root_path.clone())
+    }
+}
+
+/// Cache of decoded blocks holding up to ``capacity`` bytes,
+/// evicting the least recently used blocks first.
+///
+/// A cache can be shared by any number of datasets, of any dtype.
+/// Blocks written through a dataset using the cache are invalidated.
+#[pyclass]
+struct BlockCache {
+    inner: Arc<cache::BlockCache>,
+}
+
+#[pymethods]
+impl BlockCache {
+    #[new]
+    fn __new__(capacity: usize) -> Self {
+        BlockCache {
+            inner: Arc::new(cache::BlockCache::new(capacity)),
+        }
+    }
+
+    /// Maximum number of bytes held.
+    #[getter]
+    fn capacity(&self) -> PyResult<usize> {
+        Ok(self.inner.capacity())
+    }
+
+    /// Number of bytes currently held.
+    #[getter]
+    fn nbytes(&self) -> PyResult<usize> {
+        Ok(self.inner.nbytes())
+    }
+
+    /// Number of blocks currently held, including missing blocks.
+    #[getter]
+    fn num_blocks(&self) -> PyResult<usize> {
+        Ok(self.inner.num_blocks())
+    }
+
+    #[getter]
+    fn hits(&self) -> PyResult<u64> {
+        Ok(self.inner.hits())
+    }
+
+    #[getter]
+    fn misses(&self) -> PyResult<u64> {
+        Ok(self.inner.misses())
+    }
+
+    /// Drop all cached blocks.
+    fn clear(&self) -> PyResult<()> {
+        self.inner.clear();
+        Ok(())
+    }
+
+    /// Set the hit and miss counters to zero.
+    fn reset_counters(&self) -> PyResult<()> {
+        self.inner.reset_counters();
+        Ok(())
+    }
+
+    /// Counters and usage as a dict.
+    fn stats(&self) -> PyResult<HashMap<&'static str, u64>> {
+        let mut stats = HashMap::new();
+        stats.insert("capacity", self.inner.capacity() as u64);
+        stats.insert("nbytes", self.inner.nbytes() as u64);
+        stats.insert("num_blocks", self.inner.num_blocks() as u64);
+        stats.insert("hits", self.inner.hits());
+        stats.insert("misses", self.inner.misses());
+        Ok(stats)
+    }
+}
+
+/// Handle on reading or writing which is running in the background.
+#[pyclass]
+struct PendingIo {
+    cancelled: Arc<AtomicBool>,
+}
+
+#[pymethods]
+impl PendingIo {
+    /// Stop fetching or writing blocks as soon as possible.
+    ///
+    /// Blocks already written stay written. The callback is still called,
+    /// with an error unless all blocks were already done.
+    fn cancel(&self) -> PyResult<()> {
+        self.cancelled.store(true, Ordering::Relaxed);
+        Ok(())
+    }
+
+    #[getter]
+    fn cancelled(&self) -> PyResult<bool> {
+        Ok(self.cancelled.load(Ordering::Relaxed))
+    }
+}
+
+fn cancelled_error() -> io::Error {
+    io::Error::new(io::ErrorKind::Interrupted, "I/O was cancelled")
+}
+
+/// Run ``job`` in the background on ``pool`` (or the shared pool), then call
+/// ``callback`` with None on success or an error message on failure.
+///
+/// ``job`` is given a flag which is set if the I/O is cancelled;
+/// ``keep_alive`` is dropped once the job is finished.
+fn spawn_io<F, K>(
+    pool: Option<&Arc<pool::Pool>>,
+    callback: PyObject,
+    keep_alive: K,
+    job: F,
+) -> PyResult<PendingIo>
+where
+    F: FnOnce(&AtomicBool) -> io::Result<()> + Send + 'static,
+    K: Send + 'static,
+{
+    let pool = pool::get(pool)?;
+    let cancelled = Arc::new(AtomicBool::new(false));
+    let flag = cancelled.clone();
+    pool.spawn(move || {
+        let error = job(&*flag).err().map(|e| e.to_string());
+        let gil = Python::acquire_gil();
+        let py = gil.python();
+        if let Err(e) = callback.call1(py, (error,)) {
+            e.print(py);
+        }
+        drop(keep_alive);
+    });
+    Ok(PendingIo { cancelled })
+}
+
+/// Copy the block files of the dataset in directory ``src`` to the directory
+/// ``dst`` without decoding them, in parallel on the shared pool.
+///
+/// Returns the number of bytes copied.
+#[pyfunction]
+fn copy_blocks(py: Python, src: &str, dst: &str, ndim: usize) -> PyResult<u64> {
+    let copied = py.allow_threads(|| {
+        pool::install(None, || {
+            inventory::copy_blocks(Path::new(src), Path::new(dst), ndim)
+        })
+    })?;
+    Ok(copied)
+}
+
+/// Walk the groups and datasets below the group directory ``root_path`` in
+/// parallel, reading every attributes file, without descending into datasets
+/// or beyond ``max_depth`` levels.
+///
+/// Returns a list of ``(path, is_dataset, attributes, stat)`` sorted by path,
+/// where ``path`` is relative to ``root_path`` ("" for the root itself),
+/// ``attributes`` is the text of the attributes file or None if there is none,
+/// and ``stat`` is its ``(st_mtime_ns, st_size, st_ino)``, or None where
+/// that is unavailable.
+#[pyfunction]
+fn scan_hierarchy(
+    py: Python,
+    root_path: &str,
+    max_depth: Option<usize>,
+) -> PyResult<Vec<(String, bool, Option<String>, Option<(i64, u64, u64)>)>> {
+    let nodes = py.allow_threads(|| {
+        pool::install(None, || {
+            inventory::scan_tree(Path::new(root_path), max_depth)
+        })
+    })?;
+    Ok(nodes
+        .into_iter()
+        .map(|node| (node.path, node.is_dataset, node.attributes, node.stat))
+        .collect())
+}
 
 #[pyfunction]
 fn create_dataset(
@@ -44,16 +440,9 @@ fn create_dataset(
 
     let n = N5Filesystem::open_or_create(root_path)?;
     if !n.exists(path_name)? {
-        let compression_type: CompressionType = match compression {
+        let compression_type = match compression {
             None => CompressionType::new::<compression::gzip::GzipCompression>(),
-            Some(s) => match serde_json::from_str(s) {
-                Ok(c) => c,
-                Err(_e) => {
-                    return Err(exceptions::ValueError::py_err(
-                        "Could not deserialize compression",
-                    ))
-                }
-            },
+            Some(s) => parse_compression(s)?,
         };
 
         let data_attrs = DatasetAttributes::new(
@@ -76,9 +465,9 @@ macro_rules! dataset {
     ($dataset_name:ident, $d_name:ident, $d_type:ty) => {
         #[pyclass]
         struct $dataset_name {
-            n5: N5Filesystem,
-            attr: DatasetAttributes,
-            path: String,
+            store: Arc<store::BlockStore>,
+            pool: Option<Arc<pool::Pool>>,
+            fill_value: $d_type,
         }
 
         #[pymethods]
@@ -89,88 +478,765 @@ macro_rules! dataset {
                 path_name: &str,
                 read_only: bool,
             ) -> PyResult<Self> {
-                if read_only {
-                    let n = N5Filesystem::open(root_path)?;
-                    let attributes = n.get_dataset_attributes(path_name)?;
-                    Ok(Self {
-                        n5: n,
-                        attr: attributes,
-                        path: path_name.to_string(),
-                    })
+                let n = if read_only {
+                    N5Filesystem::open(root_path)?
                 } else {
-                    let n = N5Filesystem::open_or_create(root_path)?;
-                    let attributes = n.get_dataset_attributes(path_name)?;
-                    Ok(Self {
-                        n5: n,
-                        attr: attributes,
-                        path: path_name.to_string(),
-                    })
+                    N5Filesystem::open_or_create(root_path)?
+                };
+                Ok(Self {
+                    store: Arc::new(store::BlockStore::new(n, root_path, path_name)?),
+                    pool: None,
+                    fill_value: <$d_type>::default(),
+                })
+            }
+
+            /// Open the dataset at ``path_name`` in ``file`` from its already-parsed
+            /// attributes, without reading anything from the filesystem.
+            ///
+            /// ``dimensions`` and ``block_size`` are in N5 axis order, and
+            /// ``compression`` is the JSON of the ``"compression"`` attribute.
+            #[staticmethod]
+            fn from_attributes(
+                file: &FileHandle,
+                path_name: &str,
+                dimensions: Vec<u64>,
+                block_size: Vec<u32>,
+                compression: &str,
+            ) -> PyResult<Self> {
+                if dimensions.len() != block_size.len() {
+                    return Err(exceptions::ValueError::py_err(format!(
+                        "Dimensions {:?} and block size {:?} have different lengths",
+                        dimensions, block_size
+                    )));
                 }
+                let attr = DatasetAttributes::new(
+                    dimensions.into(),
+                    block_size.into(),
+                    DataType::$d_name,
+                    parse_compression(compression)?,
+                );
+                Ok(Self {
+                    store: Arc::new(store::BlockStore::from_attributes(
+                        file.n5.clone(),
+                        &file.root_path,
+                        path_name,
+                        attr,
+                    )),
+                    pool: None,
+                    fill_value: <$d_type>::default(),
+                })
             }
 
             #[getter]
             fn block_shape(&self) -> PyResult<Vec<u32>> {
-                Ok(self.attr.get_block_size().into())
+                Ok(self.store.attr.get_block_size().into())
+            }
+
+            #[getter]
+            fn dtype(&self) -> PyResult<String> {
+                Ok(stringify!($d_name).to_lowercase())
+            }
+
+            /// Number of threads used to decode and encode blocks,
+            /// or None if this dataset uses the shared pool.
+            #[getter]
+            fn get_num_threads(&self) -> PyResult<Option<usize>> {
+                Ok(self.pool.as_ref().map(|p| p.current_num_threads()))
+            }
+
+            #[setter]
+            fn set_num_threads(&mut self, num_threads: Option<usize>) -> PyResult<()> {
+                self.pool = match num_threads {
+                    Some(n) if n > 0 => Some(pool::build(n)?),
+                    _ => None,
+                };
+                Ok(())
+            }
+
+            /// Value of voxels in missing blocks and beyond the edge of the dataset
+            /// when reading (default 0).
+            #[getter]
+            fn get_fill_value(&self) -> PyResult<$d_type> {
+                Ok(self.fill_value)
+            }
+
+            #[setter]
+            fn set_fill_value(&mut self, fill_value: $d_type) -> PyResult<()> {
+                self.fill_value = fill_value;
+                Ok(())
+            }
+
+            /// Cache of decoded blocks used by this dataset, or None.
+            #[getter]
+            fn get_block_cache(&self, py: Python) -> PyResult<Option<Py<BlockCache>>> {
+                match self.store.cache {
+                    Some(ref cache) => Ok(Some(Py::new(py, BlockCache { inner: cache.clone() })?)),
+                    None => Ok(None),
+                }
+            }
+
+            #[setter]
+            fn set_block_cache(&mut self, cache: Option<PyRef<BlockCache>>) -> PyResult<()> {
+                Arc::make_mut(&mut self.store).cache = cache.map(|c| c.inner.clone());
+                Ok(())
+            }
+
+            /// I/O statistics of this dataset as a dict, collected while
+            /// ``set_stats_enabled(True)``.
+            ///
+            /// Counts are of blocks (``blocks_read``, ``blocks_missing``,
+            /// ``blocks_written``, ``blocks_deleted``) and of bytes in block files
+            /// (``bytes_read``, ``bytes_written``) and as data (``bytes_decoded``,
+            /// ``bytes_encoded``). Blocks found in the block cache are not counted.
+            /// Times in nanoseconds, summed over threads, are spent reading files
+            /// (``read_ns``), decoding (``decode_ns``), copying into output arrays
+            /// (``scatter_ns``), copying out of input arrays (``gather_ns``),
+            /// encoding (``encode_ns``) and writing files (``write_ns``).
+            fn stats(&self) -> PyResult<HashMap<&'static str, u64>> {
+                Ok(self.store.stats.snapshot().into_iter().collect())
+            }
+
+            /// Set this dataset's I/O statistics to zero.
+            fn reset_stats(&self) -> PyResult<()> {
+                self.store.stats.reset();
+                Ok(())
             }
 
+            /// Share ``other``'s I/O statistics, e.g. when reopening a resized dataset.
+            fn share_stats(&mut self, other: PyRef<$dataset_name>) -> PyResult<()> {
+                Arc::make_mut(&mut self.store).stats = other.store.stats.clone();
+                Ok(())
+            }
+
+            /// Read the region with the given offset and shape.
+            ///
+            /// If ``c_order``, coordinates are in h5py axis order and a C-contiguous
+            /// array is returned; otherwise they are in N5 axis order and the
+            /// array is F-contiguous. Either way, the voxels are in the same
+            /// order in memory.
+            #[args(c_order = "false")]
             fn read_ndarray(
                 &self,
                 py: Python,
                 translation: Vec<u64>,
                 dimensions: Vec<u64>,
+                c_order: bool,
             ) -> PyResult<Py<PyArrayDyn<$d_type>>> {
-                let arr = py.allow_threads(move || {
-                    let bounding_box = BoundingBox::new(translation.into(), dimensions.into());
+                let shape: Vec<usize> = dimensions.iter().map(|&d| d as usize).collect();
+                let arr = PyArrayDyn::<$d_type>::zeros(py, shape, !c_order);
+                self.read_ndarray_into(py, translation, arr, c_order, None)?;
+                Ok(arr.to_owned())
+            }
 
-                    self.n5
-                        .read_ndarray::<$d_type>(&self.path, &self.attr, &bounding_box)
+            /// Read the region starting at ``translation`` directly into ``out``,
+            /// whose shape gives the size of the region.
+            ///
+            /// If ``step`` is given, every ``step``th voxel is read along each axis
+            /// (like slicing with ``[::step]``), so ``out[i]`` is the voxel at
+            /// ``translation + i * step``; blocks containing none of those voxels
+            /// are not read.
+            ///
+            /// ``c_order`` is as for ``read_ndarray``, and applies to ``step`` too.
+            #[args(c_order = "false", step = "None")]
+            fn read_ndarray_into(
+                &self,
+                py: Python,
+                translation: Vec<u64>,
+                out: &PyArrayDyn<$d_type>,
+                c_order: bool,
+                step: Option<Vec<u64>>,
+            ) -> PyResult<()> {
+                check_translation(&self.store, &translation)?;
+                check_output_array(out, translation.len())?;
+                let step = match step {
+                    Some(step) => {
+                        if step.len() != translation.len() || step.contains(&0) {
+                            return Err(exceptions::ValueError::py_err(format!(
+                                "Expected {} positive steps, got {:?}",
+                                translation.len(),
+                                step
+                            )));
+                        }
+                        n5_translation(step, c_order)
+                    }
+                    None => vec![1; translation.len()],
+                };
+                let translation = n5_translation(translation, c_order);
+                // Safety: `out` is writeable, has non-negative strides,
+                // and is kept alive by the caller for the duration of the read.
+                let mut view = unsafe { out.as_array_mut() };
+                if c_order {
+                    view = view.reversed_axes();
+                }
+                py.allow_threads(move || {
+                    pool::install(self.pool.as_ref(), || {
+                        blocks::read_strided_into(
+                            view,
+                            &translation,
+                            &step,
+                            &self.store.attr,
+                            self.fill_value,
+                            &self.store.stats,
+                            |grid_position| self.store.fetch_block::<$d_type>(grid_position),
+                        )
+                    })
                 })?;
-                Ok(arr.into_pyarray(py).to_owned())
+                Ok(())
             }
 
+            /// Read the voxels at many points, given as an (N, ndim) array of
+            /// coordinates, returning an (N,) array in the same order.
+            ///
+            /// Points are grouped by block, so each block containing any of them
+            /// is read once, and blocks are read in parallel. Points in missing
+            /// blocks are ``fill_value``. Points outside the dataset are
+            /// ``out_of_bounds``; if it is None, they raise a ValueError.
+            ///
+            /// ``c_order`` is as for ``read_ndarray``.
+            #[args(c_order = "false", out_of_bounds = "None")]
+            fn read_points(
+                &self,
+                py: Python,
+                points: &PyArray2<i64>,
+                c_order: bool,
+                out_of_bounds: Option<$d_type>,
+            ) -> PyResult<Py<PyArray1<$d_type>>> {
+                let ndim = self.store.attr.get_dimensions().len();
+                if points.shape()[1] != ndim {
+                    return Err(exceptions::ValueError::py_err(format!(
+                        "Points have {} dimensions but dataset {} has {}",
+                        points.shape()[1],
+                        self.store.path,
+                        ndim
+                    )));
+                }
+                if points.strides().iter().any(|&s| s < 0) {
+                    return Err(exceptions::ValueError::py_err(
+                        "Points must not have negative strides",
+                    ));
+                }
+                let read_only = points.readonly();
+                let mut points = read_only.as_array();
+                if c_order {
+                    points.invert_axis(Axis(1));
+                }
+                let out_of_bounds = match out_of_bounds {
+                    Some(value) => value,
+                    None => {
+                        if let Some(i) = points
+                            .outer_iter()
+                            .position(|p| !blocks::point_in_bounds(p, &self.store.attr))
+                        {
+                            return Err(exceptions::ValueError::py_err(format!(
+                                "Point {} is out of bounds of dataset {} with shape {:?}",
+                                i,
+                                self.store.path,
+                                self.store.attr.get_dimensions()
+                            )));
+                        }
+                        self.fill_value
+                    }
+                };
+                let values = py.allow_threads(|| {
+                    pool::install(self.pool.as_ref(), || {
+                        blocks::read_points(
+                            points,
+                            &self.store.attr,
+                            self.fill_value,
+                            out_of_bounds,
+                            &self.store.stats,
+                            |grid_position| self.store.fetch_block::<$d_type>(grid_position),
+                        )
+                    })
+                })?;
+                Ok(Array1::from(values).into_pyarray(py).to_owned())
+            }
+
+            /// Read many regions of the same shape, starting at ``offsets`` (an
+            /// (N, ndim) array), into ``out`` of shape (N, *region_shape).
+            ///
+            /// Blocks are read in parallel, and each block is read once however
+            /// many regions it intersects. Voxels beyond the edge of the dataset
+            /// are ``fill_value``, as for ``read_ndarray_into``.
+            ///
+            /// ``c_order`` is as for ``read_ndarray``.
+            #[args(c_order = "false")]
+            fn read_many_into(
+                &self,
+                py: Python,
+                offsets: &PyAny,
+                out: &PyArrayDyn<$d_type>,
+                c_order: bool,
+            ) -> PyResult<()> {
+                let ndim = self.store.attr.get_dimensions().len();
+                let offsets = extract_positions(offsets, ndim)?;
+                check_output_array(out, ndim + 1)?;
+                if out.shape()[0] != offsets.len() {
+                    return Err(exceptions::ValueError::py_err(format!(
+                        "Output array has shape {:?}, expected {} regions",
+                        out.shape(),
+                        offsets.len()
+                    )));
+                }
+                let offsets: Vec<Vec<u64>> = offsets
+                    .into_iter()
+                    .map(|offset| n5_translation(offset, c_order))
+                    .collect();
+                // Safety: `out` is writeable, has non-negative strides,
+                // and is kept alive by the caller for the duration of the read.
+                let mut view = unsafe { out.as_array_mut() };
+                let views: Vec<_> = view
+                    .outer_iter_mut()
+                    .map(|view| if c_order { view.reversed_axes() } else { view })
+                    .collect();
+                py.allow_threads(move || {
+                    pool::install(self.pool.as_ref(), || {
+                        blocks::read_many_into(
+                            views,
+                            &offsets,
+                            &self.store.attr,
+                            self.fill_value,
+                            &self.store.stats,
+                            |grid_position| self.store.fetch_block::<$d_type>(grid_position),
+                        )
+                    })
+                })?;
+                Ok(())
+            }
+
+            /// Write ``arr`` to the region starting at ``translation``.
+            ///
+            /// Parts of partially-covered blocks which do not yet exist are set to
+            /// ``fill_val``. If ``skip_fill``, blocks which end up entirely ``fill_val``
+            /// are deleted rather than written.
+            ///
+            /// ``c_order`` is as for ``read_ndarray``.
+            #[args(c_order = "false", skip_fill = "false")]
             fn write_ndarray(
                 &self,
                 py: Python,
                 translation: Vec<u64>,
                 arr: &PyArrayDyn<$d_type>,
                 fill_val: $d_type,
+                c_order: bool,
+                skip_fill: bool,
             ) -> PyResult<()> {
+                let translation = n5_translation(translation, c_order);
+                if arr.strides().iter().any(|&s| s < 0) {
+                    return Err(exceptions::ValueError::py_err(
+                        "Data must not have negative strides",
+                    ));
+                }
                 let read_only = arr.readonly();
-                let arr = read_only.as_array();
+                let mut arr = read_only.as_array();
+                if c_order {
+                    arr = arr.reversed_axes();
+                }
+                check_in_bounds(&self.store, &translation, arr.shape())?;
                 py.allow_threads(move || {
-                    self.n5.write_ndarray::<$d_type, _>(
-                        &self.path, &self.attr, translation.into(),
-                        arr, fill_val
-                    )
+                    pool::install(self.pool.as_ref(), || {
+                        blocks::write_from(
+                            arr,
+                            &translation,
+                            &self.store.attr,
+                            fill_val,
+                            &self.store.stats,
+                            |grid_position| self.store.fetch_block::<$d_type>(grid_position),
+                            |size, grid_position, data| {
+                                let block = VecDataBlock::<$d_type>::new(size, grid_position, data);
+                                self.store.store_block(&block, skip_fill, fill_val)
+                            },
+                        )
+                    })
                 })?;
                 Ok(())
             }
 
-            fn write_block(&self, py: Python, position: Vec<u64>, data: Vec<$d_type>) -> PyResult<()> {
+            /// Start reading the region at ``translation`` into ``out`` in the
+            /// background, as for ``read_ndarray_into``, returning immediately.
+            ///
+            /// ``callback`` is called from a pool thread with None once the read is
+            /// finished, or with an error message if it failed or was cancelled.
+            /// ``out`` must not be used until then.
+            #[args(c_order = "false")]
+            fn read_ndarray_into_async(
+                &self,
+                translation: Vec<u64>,
+                out: &PyArrayDyn<$d_type>,
+                callback: PyObject,
+                c_order: bool,
+            ) -> PyResult<PendingIo> {
+                check_translation(&self.store, &translation)?;
+                check_output_array(out, translation.len())?;
+                let translation = n5_translation(translation, c_order);
+                // Safety: `out` is writeable, has non-negative strides,
+                // and is kept alive until the read is finished.
+                let mut view: ArrayViewMutD<'static, $d_type> = unsafe { mem::transmute(out.as_array_mut()) };
+                if c_order {
+                    view = view.reversed_axes();
+                }
+                let store = self.store.clone();
+                let fill = self.fill_value;
+                spawn_io(self.pool.as_ref(), callback, out.to_owned(), move |cancelled| {
+                    blocks::read_into(view, &translation, &store.attr, fill, &store.stats, |grid_position| {
+                        if cancelled.load(Ordering::Relaxed) {
+                            return Err(cancelled_error());
+                        }
+                        store.fetch_block::<$d_type>(grid_position)
+                    })
+                })
+            }
+
+            /// Start writing ``arr`` to the region at ``translation`` in the
+            /// background, as for ``write_ndarray``, returning immediately.
+            ///
+            /// ``callback`` is as for ``read_ndarray_into_async``.
+            /// ``arr`` must not be modified until it is called.
+            #[args(c_order = "false", skip_fill = "false")]
+            fn write_ndarray_async(
+                &self,
+                translation: Vec<u64>,
+                arr: &PyArrayDyn<$d_type>,
+                fill_val: $d_type,
+                callback: PyObject,
+                c_order: bool,
+                skip_fill: bool,
+            ) -> PyResult<PendingIo> {
+                let translation = n5_translation(translation, c_order);
+                if arr.strides().iter().any(|&s| s < 0) {
+                    return Err(exceptions::ValueError::py_err(
+                        "Data must not have negative strides",
+                    ));
+                }
+                let read_only = arr.readonly();
+                // Safety: `arr` is kept alive until the write is finished.
+                let mut view: ArrayViewD<'static, $d_type> = unsafe { mem::transmute(read_only.as_array()) };
+                if c_order {
+                    view = view.reversed_axes();
+                }
+                check_in_bounds(&self.store, &translation, view.shape())?;
+                let store = self.store.clone();
+                spawn_io(self.pool.as_ref(), callback, arr.to_owned(), move |cancelled| {
+                    blocks::write_from(
+                        view,
+                        &translation,
+                        &store.attr,
+                        fill_val,
+                        &store.stats,
+                        |grid_position| store.fetch_block::<$d_type>(grid_position),
+                        |size, grid_position, data| {
+                            if cancelled.load(Ordering::Relaxed) {
+                                return Err(cancelled_error());
+                            }
+                            let block = VecDataBlock::<$d_type>::new(size, grid_position, data);
+                            store.store_block(&block, skip_fill, fill_val)
+                        },
+                    )
+                })
+            }
+
+            /// Read the block at grid position ``position``, or None if it does not exist.
+            ///
+            /// The array has the shape of the block as stored, and is in the axis
+            /// order given by ``c_order`` (as for ``read_ndarray``).
+            #[args(c_order = "false")]
+            fn read_block(
+                &self,
+                py: Python,
+                position: Vec<u64>,
+                c_order: bool,
+            ) -> PyResult<Option<Py<PyArrayDyn<$d_type>>>> {
+                let arr = py.allow_threads(|| -> io::Result<_> {
+                    match self.store.fetch_block::<$d_type>(position.into())? {
+                        Some(block) => {
+                            let arr = blocks::block_to_array(&*block)?;
+                            Ok(Some(if c_order { arr.reversed_axes() } else { arr }))
+                        }
+                        None => Ok(None),
+                    }
+                })?;
+                Ok(arr.map(|arr| arr.into_pyarray(py).to_owned()))
+            }
+
+            /// Write a single block at grid position ``position``.
+            ///
+            /// ``data`` is either a numpy array of this dataset's dtype with the shape
+            /// of the block (full-size, or truncated at the dataset boundary) in the
+            /// axis order given by ``c_order``; or a flat sequence with one element
+            /// per voxel of a full-size block, in column-major order.
+            #[args(c_order = "false")]
+            fn write_block(
+                &self,
+                py: Python,
+                position: Vec<u64>,
+                data: &PyAny,
+                c_order: bool,
+            ) -> PyResult<()> {
+                if let Ok(arr) = data.extract::<&PyArrayDyn<$d_type>>() {
+                    if arr.strides().iter().any(|&s| s < 0) {
+                        return Err(exceptions::ValueError::py_err(
+                            "Data must not have negative strides",
+                        ));
+                    }
+                    let read_only = arr.readonly();
+                    let mut view = read_only.as_array();
+                    if c_order {
+                        view = view.reversed_axes();
+                    }
+                    let size = check_block_shape(&self.store.attr, &self.store.path, &position, view.shape())?;
+                    let view = blocks::truncate(view, &size.iter().map(|&s| s as usize).collect::<Vec<_>>());
+                    return py.allow_threads(move || -> PyResult<()> {
+                        // iterating over the transpose visits voxels in column-major order
+                        let data: Vec<$d_type> = view.t().iter().cloned().collect();
+                        self.store.store_block(&VecDataBlock::new(size, position.into(), data), false, self.fill_value)?;
+                        Ok(())
+                    });
+                }
+
+                let data: Vec<$d_type> = data.extract()?;
                 py.allow_threads(move || {
-                    let block_shape = self.attr.get_block_size();
-                    let block_size = self.attr.get_block_num_elements();
+                    let block_shape = self.store.attr.get_block_size();
+                    let block_size = self.store.attr.get_block_num_elements();
 
                     if block_size != data.len() {
                         Err(exceptions::ValueError::py_err(format!(
                             "Data has length {} but dataset {} has blocks with shape {:?} and size {}",
                             data.len(),
-                            self.path,
+                            self.store.path,
                             block_shape,
                             block_size
                         )))
-                    } else if self.n5.exists(&self.path)? {
-                        let block_in = VecDataBlock::new(block_shape.into(), position.into(), data);
-                        self.n5.write_block(&self.path, &self.attr, &block_in)?;
+                    } else if self.store.n5.exists(&self.store.path)? {
+                        self.store.store_block(&VecDataBlock::new(block_shape.into(), position.into(), data), false, self.fill_value)?;
                         Ok(())
                     } else {
                         Err(exceptions::ValueError::py_err(format!(
                             "Dataset {} does not exist!",
-                            &self.path
+                            &self.store.path
                         )))
                     }
                 })
             }
+
+            /// Delete or truncate stored blocks so that none extend beyond
+            /// ``dimensions``, in preparation for shrinking the dataset.
+            ///
+            /// This does not change the dataset's attributes.
+            /// ``c_order`` is as for ``read_ndarray``.
+            #[args(c_order = "false")]
+            fn prune_blocks(&self, py: Python, dimensions: Vec<u64>, c_order: bool) -> PyResult<()> {
+                check_translation(&self.store, &dimensions)?;
+                let dimensions = n5_translation(dimensions, c_order);
+                py.allow_threads(|| {
+                    pool::install(self.pool.as_ref(), || self.store.prune::<$d_type>(&dimensions))
+                })?;
+                Ok(())
+            }
+
+            /// List the blocks which exist, without reading them.
+            ///
+            /// Returns an (N, ndim) array of their grid positions, in the axis order
+            /// given by ``c_order`` (as for ``read_ndarray``), and an (N,) array of
+            /// the size in bytes of each stored block.
+            #[args(c_order = "false")]
+            fn block_index(
+                &self,
+                py: Python,
+                c_order: bool,
+            ) -> PyResult<(Py<PyArray2<u64>>, Py<PyArray1<u64>>)> {
+                let ndim = self.store.attr.get_dimensions().len();
+                let found = py.allow_threads(|| {
+                    pool::install(self.pool.as_ref(), || inventory::list_blocks(&self.store.dir, ndim))
+                })?;
+                let mut positions = Vec::with_capacity(found.len() * ndim);
+                let mut sizes = Vec::with_capacity(found.len());
+                for (position, size) in found {
+                    positions.extend(n5_translation(position, c_order));
+                    sizes.push(size);
+                }
+                let positions = Array2::from_shape_vec((sizes.len(), ndim), positions)
+                    .map_err(|e| exceptions::ValueError::py_err(e.to_string()))?;
+                Ok((
+                    positions.into_pyarray(py).to_owned(),
+                    Array1::from(sizes).into_pyarray(py).to_owned(),
+                ))
+            }
+
+            /// Downsample ``arr`` by an integer factor along each axis, reducing each
+            /// window with ``method`` ("mean", "mode" or "max"), in parallel on this
+            /// dataset's pool. This neither reads nor writes the dataset.
+            ///
+            /// ``factors`` are in the same axis order as ``arr``. Windows at the upper
+            /// edges are truncated, so the result has ``ceil(n / factor)`` voxels
+            /// along each axis. Integer means are rounded to the nearest value,
+            /// and ties for the mode go to the smallest value.
+            fn downsample(
+                &self,
+                py: Python,
+                arr: &PyArrayDyn<$d_type>,
+                factors: Vec<usize>,
+                method: &str,
+            ) -> PyResult<Py<PyArrayDyn<$d_type>>> {
+                let method = downsample::Method::parse(method).ok_or_else(|| {
+                    exceptions::ValueError::py_err(format!(
+                        "Unknown downsampling method '{}': use one of mean, mode or max",
+                        method
+                    ))
+                })?;
+                if factors.len() != arr.ndim() || factors.contains(&0) {
+                    return Err(exceptions::ValueError::py_err(format!(
+                        "Expected {} positive downsampling factors, got {:?}",
+                        arr.ndim(),
+                        factors
+                    )));
+                }
+                let read_only = arr.readonly();
+                let view = read_only.as_array();
+                let out = py.allow_threads(|| {
+                    pool::install(self.pool.as_ref(), || {
+                        downsample::downsample(view, &factors, method)
+                    })
+                })?;
+                Ok(out.into_pyarray(py).to_owned())
+            }
+
+            /// Read the blocks at many grid positions, given as an (N, ndim) array.
+            ///
+            /// Returns a list of arrays as for ``read_block``, with None for missing blocks.
+            #[args(c_order = "false")]
+            fn read_blocks(
+                &self,
+                py: Python,
+                positions: &PyAny,
+                c_order: bool,
+            ) -> PyResult<Vec<Option<Py<PyArrayDyn<$d_type>>>>> {
+                let positions = extract_positions(positions, self.store.attr.get_dimensions().len())?;
+                let arrays = py.allow_threads(move || {
+                    pool::install(self.pool.as_ref(), || {
+                        positions
+                            .into_par_iter()
+                            .map(|position| -> io::Result<Option<ArrayD<$d_type>>> {
+                                let position = n5_translation(position, c_order);
+                                match self.store.fetch_block::<$d_type>(position.into())? {
+                                    Some(block) => Ok(Some(blocks::block_to_array(&*block)?)),
+                                    None => Ok(None),
+                                }
+                            })
+                            .collect::<io::Result<Vec<_>>>()
+                    })
+                })?;
+                Ok(arrays
+                    .into_iter()
+                    .map(|arr| {
+                        arr.map(|arr| {
+                            let arr = if c_order { arr.reversed_axes() } else { arr };
+                            arr.into_pyarray(py).to_owned()
+                        })
+                    })
+                    .collect())
+            }
+
+            /// Read the blocks at many grid positions, given as an (N, ndim) array,
+            /// into ``out`` of shape (N, *block_shape).
+            ///
+            /// Voxels of missing blocks, and beyond the edge of the dataset,
+            /// are ``fill_value``.
+            #[args(c_order = "false")]
+            fn read_blocks_into(
+                &self,
+                py: Python,
+                positions: &PyAny,
+                out: &PyArrayDyn<$d_type>,
+                c_order: bool,
+            ) -> PyResult<()> {
+                let ndim = self.store.attr.get_dimensions().len();
+                let positions = extract_positions(positions, ndim)?;
+                check_output_array(out, ndim + 1)?;
+                let mut block_size: Vec<usize> = self.store.attr.get_block_size().iter().map(|&s| s as usize).collect();
+                if c_order {
+                    block_size.reverse();
+                }
+                if out.shape()[0] != positions.len() || out.shape()[1..] != block_size[..] {
+                    return Err(exceptions::ValueError::py_err(format!(
+                        "Output array has shape {:?}, expected ({}, {:?})",
+                        out.shape(),
+                        positions.len(),
+                        block_size
+                    )));
+                }
+                // Safety: `out` is writeable, has non-negative strides,
+                // and is kept alive by the caller for the duration of the read.
+                let mut view = unsafe { out.as_array_mut() };
+                let views: Vec<_> = view.outer_iter_mut().collect();
+                let start = vec![0; ndim];
+                py.allow_threads(move || {
+                    pool::install(self.pool.as_ref(), || {
+                        positions.into_par_iter().zip(views).try_for_each(|(position, view)| {
+                            let position = n5_translation(position, c_order);
+                            let view = if c_order { view.reversed_axes() } else { view };
+                            let block = self.store.fetch_block::<$d_type>(position.into())?;
+                            let timer = stats::start();
+                            blocks::scatter_block(block.as_ref().map(|b| &**b), view, &start, self.fill_value)?;
+                            self.store.stats.add_time(|s| &s.scatter_ns, timer);
+                            Ok(())
+                        })
+                    })
+                })?;
+                Ok(())
+            }
+
+            /// Write many blocks, given their grid positions as an (N, ndim) array
+            /// and a sequence of N arrays as for ``write_block``.
+            ///
+            /// If ``skip_fill``, blocks entirely ``fill_value`` are deleted rather than written.
+            #[args(c_order = "false", skip_fill = "false")]
+            fn write_blocks(
+                &self,
+                py: Python,
+                positions: &PyAny,
+                arrays: Vec<&PyArrayDyn<$d_type>>,
+                c_order: bool,
+                skip_fill: bool,
+            ) -> PyResult<()> {
+                let positions = extract_positions(positions, self.store.attr.get_dimensions().len())?;
+                if positions.len() != arrays.len() {
+                    return Err(exceptions::ValueError::py_err(format!(
+                        "Got {} positions but {} arrays",
+                        positions.len(),
+                        arrays.len()
+                    )));
+                }
+                if arrays.iter().any(|arr| arr.strides().iter().any(|&s| s < 0)) {
+                    return Err(exceptions::ValueError::py_err(
+                        "Data must not have negative strides",
+                    ));
+                }
+
+                let read_only: Vec<_> = arrays.iter().map(|arr| arr.readonly()).collect();
+                let mut jobs = Vec::with_capacity(positions.len());
+                for (position, arr) in positions.into_iter().zip(read_only.iter()) {
+                    let position = n5_translation(position, c_order);
+                    let mut view = arr.as_array();
+                    if c_order {
+                        view = view.reversed_axes();
+                    }
+                    let size = check_block_shape(&self.store.attr, &self.store.path, &position, view.shape())?;
+                    let view = blocks::truncate(view, &size.iter().map(|&s| s as usize).collect::<Vec<_>>());
+                    jobs.push((position, size, view));
+                }
+
+                py.allow_threads(move || {
+                    pool::install(self.pool.as_ref(), || {
+                        jobs.into_par_iter().try_for_each(|(position, size, view)| {
+                            // iterating over the transpose visits voxels in column-major order
+                            let data: Vec<$d_type> = view.t().iter().cloned().collect();
+                            let block = VecDataBlock::<$d_type>::new(size, position.into(), data);
+                            self.store.store_block(&block, skip_fill, self.fill_value)
+                        })
+                    })
+                })?;
+                Ok(())
+            }
         }
     };
 }
@@ -189,6 +1255,17 @@ dataset!(DatasetFLOAT64, FLOAT64, f64);
 #[pymodule]
 fn pyn5(_py: Python, m: &PyModule) -> PyResult<()> {
     m.add_wrapped(wrap_pyfunction!(create_dataset))?;
+    m.add_wrapped(wrap_pyfunction!(copy_blocks))?;
+    m.add_wrapped(wrap_pyfunction!(scan_hierarchy))?;
+    m.add_wrapped(wrap_pyfunction!(set_num_threads))?;
+    m.add_wrapped(wrap_pyfunction!(get_num_threads))?;
+    m.add_wrapped(wrap_pyfunction!(set_stats_enabled))?;
+    m.add_wrapped(wrap_pyfunction!(get_stats_enabled))?;
+    m.add_wrapped(wrap_pyfunction!(io_stats))?;
+    m.add_wrapped(wrap_pyfunction!(reset_io_stats))?;
+    m.add_class::<BlockCache>()?;
+    m.add_class::<FileHandle>()?;
+    m.add_class::<PendingIo>()?;
     m.add_class::<DatasetUINT8>()?;
     m.add_class::<DatasetUINT16>()?;
     m.add_class::<DatasetUINT32>()?;
@@ -0,0 +1,91 @@
+//! Thread pools used to fetch, decode and encode blocks in parallel.
+//!
+//! Datasets use their own pool if one has been set,
+//! otherwise a process-wide pool shared by all datasets.
+//!
+//! A process forked from this one (e.g. a data loader worker) inherits the
+//! pools but not their threads, so there pools from the parent are ignored
+//! and a new process-wide pool is used instead.
+use std::io;
+use std::process;
+use std::sync::{Arc, Mutex};
+
+use rayon::{ThreadPool, ThreadPoolBuilder};
+
+static GLOBAL_POOL: Mutex<Option<Arc<Pool>>> = Mutex::new(None);
+
+/// A thread pool, and the process whose threads it uses.
+pub struct Pool {
+    pool: ThreadPool,
+    pid: u32,
+}
+
+impl Pool {
+    /// Whether the pool's threads are running in this process.
+    fn is_alive(&self) -> bool {
+        self.pid == process::id()
+    }
+
+    pub fn current_num_threads(&self) -> usize {
+        self.pool.current_num_threads()
+    }
+
+    pub fn spawn<F>(&self, f: F)
+    where
+        F: FnOnce() + Send + 'static,
+    {
+        self.pool.spawn(f)
+    }
+}
+
+/// Build a pool with the given number of threads (0 for one per CPU).
+pub fn build(num_threads: usize) -> io::Result<Arc<Pool>> {
+    ThreadPoolBuilder::new()
+        .num_threads(num_threads)
+        .thread_name(|idx| format!("pyn5-{}", idx))
+        .build()
+        .map(|pool| {
+            Arc::new(Pool {
+                pool,
+                pid: process::id(),
+            })
+        })
+        .map_err(|e| io::Error::new(io::ErrorKind::Other, e.to_string()))
+}
+
+/// Get the process-wide pool, building it if necessary.
+pub fn global() -> io::Result<Arc<Pool>> {
+    let mut pool = GLOBAL_POOL.lock().unwrap_or_else(|e| e.into_inner());
+    match *pool {
+        Some(ref p) if p.is_alive() => {}
+        _ => *pool = Some(build(0)?),
+    }
+    Ok(pool.as_ref().unwrap().clone())
+}
+
+/// Replace the process-wide pool with one of the given size (0 for one per CPU).
+///
+/// Operations already running keep the pool they started with.
+pub fn set_global(num_threads: usize) -> io::Result<()> {
+    let new_pool = build(num_threads)?;
+    *GLOBAL_POOL.lock().unwrap_or_else(|e| e.into_inner()) = Some(new_pool);
+    Ok(())
+}
+
+/// Get the given pool, or the process-wide pool if there is none
+/// (or it was inherited from a parent process).
+pub fn get(pool: Option<&Arc<Pool>>) -> io::Result<Arc<Pool>> {
+    match pool {
+        Some(pool) if pool.is_alive() => Ok(pool.clone()),
+        _ => global(),
+    }
+}
+
+/// Run `f` in the given pool, or the process-wide pool if there is none.
+pub fn install<R, F>(pool: Option<&Arc<Pool>>, f: F) -> io::Result<R>
+where
+    R: Send,
+    F: FnOnce() -> io::Result<R> + Send,
+{
+    get(pool)?.pool.install(f)
+}
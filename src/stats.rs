@@ -0,0 +1,94 @@
+//! Counters and timings of block I/O, per dataset and for the whole process.
+//!
+//! Collection is off by default: when off, the usual read and write paths
+//! are used, and each block costs one relaxed atomic load.
+use std::sync::atomic::{AtomicBool, AtomicU64, Ordering};
+use std::time::Instant;
+
+static ENABLED: AtomicBool = AtomicBool::new(false);
+
+/// Totals over every dataset in this process.
+pub static GLOBAL: IoStats = IoStats::new();
+
+pub fn enabled() -> bool {
+    ENABLED.load(Ordering::Relaxed)
+}
+
+pub fn set_enabled(enabled: bool) {
+    ENABLED.store(enabled, Ordering::Relaxed);
+}
+
+/// Start timing a phase, if collection is enabled.
+pub fn start() -> Option<Instant> {
+    if enabled() {
+        Some(Instant::now())
+    } else {
+        None
+    }
+}
+
+pub fn elapsed_ns(start: Instant) -> u64 {
+    let elapsed = start.elapsed();
+    elapsed.as_secs() * 1_000_000_000 + u64::from(elapsed.subsec_nanos())
+}
+
+macro_rules! io_stats {
+    ($($name:ident: $doc:expr,)*) => {
+        /// Counters of block I/O. Times are in nanoseconds, summed over threads.
+        pub struct IoStats {
+            $(
+                #[doc = $doc]
+                pub $name: AtomicU64,
+            )*
+        }
+
+        impl IoStats {
+            pub const fn new() -> Self {
+                IoStats {
+                    $($name: AtomicU64::new(0),)*
+                }
+            }
+
+            /// Names and values of every counter.
+            pub fn snapshot(&self) -> Vec<(&'static str, u64)> {
+                vec![$((stringify!($name), self.$name.load(Ordering::Relaxed)),)*]
+            }
+
+            pub fn reset(&self) {
+                $(self.$name.store(0, Ordering::Relaxed);)*
+            }
+        }
+    };
+}
+
+io_stats! {
+    blocks_read: "Blocks read from files (not counting cache hits).",
+    blocks_missing: "Blocks looked for but not found.",
+    blocks_written: "Blocks written to files.",
+    blocks_deleted: "Blocks deleted because they were entirely the fill value.",
+    bytes_read: "Bytes read from block files, i.e. compressed.",
+    bytes_decoded: "Bytes of data decoded from blocks.",
+    bytes_encoded: "Bytes of data encoded into blocks.",
+    bytes_written: "Bytes written to block files, i.e. compressed.",
+    read_ns: "Time reading block files.",
+    decode_ns: "Time decompressing and decoding blocks.",
+    scatter_ns: "Time copying decoded blocks into output arrays.",
+    gather_ns: "Time copying input arrays into blocks to encode.",
+    encode_ns: "Time encoding and compressing blocks.",
+    write_ns: "Time writing block files.",
+}
+
+impl IoStats {
+    /// Add to a counter of this dataset, and to the process-wide total.
+    pub fn add(&self, counter: fn(&IoStats) -> &AtomicU64, value: u64) {
+        counter(self).fetch_add(value, Ordering::Relaxed);
+        counter(&GLOBAL).fetch_add(value, Ordering::Relaxed);
+    }
+
+    /// Add the time since `start` (from `stats::start`) to a timing counter.
+    pub fn add_time(&self, counter: fn(&IoStats) -> &AtomicU64, start: Option<Instant>) {
+        if let Some(start) = start {
+            self.add(counter, elapsed_ns(start));
+        }
+    }
+}
@@ -0,0 +1,272 @@
+//! Reading and writing the blocks of one dataset, through an optional cache.
+use std::cmp;
+use std::fs::{self, File, OpenOptions};
+use std::io::{self, BufReader, Read, Write};
+use std::mem;
+use std::path::{Path, PathBuf};
+use std::sync::Arc;
+use std::time::Instant;
+
+use fs2::FileExt;
+use n5::prelude::*;
+use n5::{GridCoord, ReadableDataBlock, ReflectedType, WriteableDataBlock};
+use rayon::prelude::*;
+
+use blocks;
+use cache::BlockCache;
+use inventory;
+use stats::{self, IoStats};
+
+/// Reader which counts the bytes read and the time spent reading them.
+struct TimedRead<R> {
+    inner: R,
+    bytes: u64,
+    ns: u64,
+}
+
+impl<R: Read> Read for TimedRead<R> {
+    fn read(&mut self, buf: &mut [u8]) -> io::Result<usize> {
+        let start = Instant::now();
+        let n = self.inner.read(buf)?;
+        self.ns += stats::elapsed_ns(start);
+        self.bytes += n as u64;
+        Ok(n)
+    }
+}
+
+/// Everything needed to read and write the blocks of a dataset.
+///
+/// This is cheap to share between threads, so that I/O can outlive the
+/// call which started it.
+#[derive(Clone)]
+pub struct BlockStore {
+    pub n5: N5Filesystem,
+    pub attr: DatasetAttributes,
+    pub path: String,
+    /// Directory of the dataset on the filesystem.
+    pub dir: PathBuf,
+    pub cache: Option<Arc<BlockCache>>,
+    /// Identifies this dataset among all those sharing a cache.
+    cache_key: String,
+    pub stats: Arc<IoStats>,
+}
+
+impl BlockStore {
+    pub fn new(n5: N5Filesystem, root_path: &str, path_name: &str) -> io::Result<Self> {
+        let attr = n5.get_dataset_attributes(path_name)?;
+        Ok(Self::from_attributes(n5, root_path, path_name, attr))
+    }
+
+    /// Use attributes which have already been read, rather than reading them again.
+    pub fn from_attributes(
+        n5: N5Filesystem,
+        root_path: &str,
+        path_name: &str,
+        attr: DatasetAttributes,
+    ) -> Self {
+        BlockStore {
+            n5,
+            attr,
+            path: path_name.to_string(),
+            dir: Path::new(root_path).join(path_name),
+            cache: None,
+            cache_key: format!("{}/{}", root_path, path_name),
+            stats: Arc::new(IoStats::new()),
+        }
+    }
+
+    fn block_path(&self, grid_position: &[u64]) -> PathBuf {
+        grid_position
+            .iter()
+            .fold(self.dir.clone(), |path, g| path.join(g.to_string()))
+    }
+
+    /// Read and decode the block at `grid_position`, recording statistics
+    /// if they are enabled.
+    fn load_block<T>(&self, grid_position: GridCoord) -> io::Result<Option<VecDataBlock<T>>>
+    where
+        T: ReflectedType,
+        VecDataBlock<T>: DataBlock<T> + ReadableDataBlock,
+    {
+        if !stats::enabled() {
+            return self
+                .n5
+                .read_block::<T>(&self.path, &self.attr, grid_position);
+        }
+
+        // as N5Filesystem::read_block, but timing reading and decoding separately
+        let file = match File::open(self.block_path(&grid_position)) {
+            Ok(file) => file,
+            Err(ref e) if e.kind() == io::ErrorKind::NotFound => {
+                self.stats.add(|s| &s.blocks_missing, 1);
+                return Ok(None);
+            }
+            Err(e) => return Err(e),
+        };
+        file.lock_shared()?;
+        let mut reader = TimedRead {
+            inner: BufReader::new(file),
+            bytes: 0,
+            ns: 0,
+        };
+        let start = Instant::now();
+        let block = <n5::DefaultBlock as n5::DefaultBlockReader<T, _>>::read_block(
+            &mut reader,
+            &self.attr,
+            grid_position,
+        )?;
+        let total_ns = stats::elapsed_ns(start);
+        let nbytes = block.get_data().len() * mem::size_of::<T>();
+        self.stats.add(|s| &s.blocks_read, 1);
+        self.stats.add(|s| &s.bytes_read, reader.bytes);
+        self.stats.add(|s| &s.bytes_decoded, nbytes as u64);
+        self.stats.add(|s| &s.read_ns, reader.ns);
+        self.stats
+            .add(|s| &s.decode_ns, total_ns.saturating_sub(reader.ns));
+        Ok(Some(block))
+    }
+
+    /// Encode and write a block, recording statistics if they are enabled.
+    fn save_block<T>(&self, block: &VecDataBlock<T>) -> io::Result<()>
+    where
+        T: ReflectedType,
+        VecDataBlock<T>: DataBlock<T> + WriteableDataBlock,
+    {
+        if !stats::enabled() {
+            return self.n5.write_block(&self.path, &self.attr, block);
+        }
+
+        // as N5Filesystem::write_block, but timing encoding and writing separately
+        let start = Instant::now();
+        let mut buffer = Vec::new();
+        <n5::DefaultBlock as n5::DefaultBlockWriter<T, _, _>>::write_block(
+            &mut buffer,
+            &self.attr,
+            block,
+        )?;
+        self.stats.add_time(|s| &s.encode_ns, Some(start));
+
+        let start = Instant::now();
+        let path = self.block_path(block.get_grid_position());
+        if let Some(parent) = path.parent() {
+            fs::create_dir_all(parent)?;
+        }
+        let mut file = OpenOptions::new()
+            .read(true)
+            .write(true)
+            .create(true)
+            .open(path)?;
+        file.lock_exclusive()?;
+        file.set_len(0)?;
+        file.write_all(&buffer)?;
+        self.stats.add_time(|s| &s.write_ns, Some(start));
+
+        let nbytes = block.get_data().len() * mem::size_of::<T>();
+        self.stats.add(|s| &s.blocks_written, 1);
+        self.stats.add(|s| &s.bytes_encoded, nbytes as u64);
+        self.stats.add(|s| &s.bytes_written, buffer.len() as u64);
+        Ok(())
+    }
+
+    /// Read and decode the block at `grid_position`, through the cache if there is one.
+    pub fn fetch_block<T>(
+        &self,
+        grid_position: GridCoord,
+    ) -> io::Result<Option<Arc<VecDataBlock<T>>>>
+    where
+        T: ReflectedType + Send + Sync + 'static,
+        VecDataBlock<T>: DataBlock<T> + ReadableDataBlock,
+    {
+        match self.cache {
+            Some(ref cache) => cache.get_or_load(&self.cache_key, &grid_position, || {
+                self.load_block::<T>(grid_position.clone())
+            }),
+            None => Ok(self.load_block::<T>(grid_position)?.map(Arc::new)),
+        }
+    }
+
+    /// Encode and write a block, dropping any cached copy of it.
+    ///
+    /// If `skip_fill` and the block is entirely `fill`, it is deleted
+    /// (if it exists) instead.
+    pub fn store_block<T>(
+        &self,
+        block: &VecDataBlock<T>,
+        skip_fill: bool,
+        fill: T,
+    ) -> io::Result<()>
+    where
+        T: ReflectedType + Copy + PartialEq,
+        VecDataBlock<T>: DataBlock<T> + WriteableDataBlock,
+    {
+        let result = if skip_fill && blocks::all_fill(block.get_data(), fill) {
+            let deleted = self.n5.delete_block(&self.path, block.get_grid_position());
+            if let Ok(true) = deleted {
+                if stats::enabled() {
+                    self.stats.add(|s| &s.blocks_deleted, 1);
+                }
+            }
+            deleted.map(|_| ())
+        } else {
+            self.save_block(block)
+        };
+        if let Some(ref cache) = self.cache {
+            cache.invalidate(&self.cache_key, block.get_grid_position());
+        }
+        result
+    }
+
+    /// Remove the parts of stored blocks which are outside ``dimensions``,
+    /// in preparation for shrinking the dataset to them.
+    ///
+    /// Blocks entirely outside are deleted, and blocks which straddle the new
+    /// boundary are rewritten truncated to it, so that growing the dataset
+    /// again does not resurrect old data. Blocks are handled in parallel.
+    pub fn prune<T>(&self, dimensions: &[u64]) -> io::Result<()>
+    where
+        T: ReflectedType + Copy + Send + Sync + 'static,
+        VecDataBlock<T>: DataBlock<T> + ReadableDataBlock + WriteableDataBlock,
+    {
+        let new_attr = DatasetAttributes::new(
+            dimensions.into(),
+            self.attr.get_block_size().into(),
+            self.attr.get_data_type().clone(),
+            self.attr.get_compression().clone(),
+        );
+        let stored = inventory::list_blocks(&self.dir, dimensions.len())?;
+        stored
+            .into_par_iter()
+            .try_for_each(|(position, _)| -> io::Result<()> {
+                let old_shape = blocks::block_shape(&position, &self.attr);
+                let new_shape = blocks::block_shape(&position, &new_attr);
+                if new_shape.iter().any(|&s| s == 0) {
+                    self.n5.delete_block(&self.path, &position)?;
+                } else if new_shape.iter().zip(old_shape.iter()).any(|(n, o)| n < o) {
+                    if let Some(block) =
+                        self.n5
+                            .read_block::<T>(&self.path, &self.attr, position.clone().into())?
+                    {
+                        let view = blocks::block_view(&block)?;
+                        let shape: Vec<usize> = new_shape
+                            .iter()
+                            .zip(view.shape())
+                            .map(|(&n, &s)| cmp::min(n, s))
+                            .collect();
+                        let view = blocks::truncate(view, &shape);
+                        // iterating over the transpose visits voxels in column-major order
+                        let data: Vec<T> = view.t().iter().cloned().collect();
+                        let size: Vec<u32> = shape.iter().map(|&s| s as u32).collect();
+                        let block =
+                            VecDataBlock::<T>::new(size.into(), position.clone().into(), data);
+                        self.n5.write_block(&self.path, &new_attr, &block)?;
+                    }
+                } else {
+                    return Ok(());
+                }
+                if let Some(ref cache) = self.cache {
+                    cache.invalidate(&self.cache_key, &position);
+                }
+                Ok(())
+            })
+    }
+}
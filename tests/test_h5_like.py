@@ -1,4 +1,10 @@
+import asyncio
 import json
+import multiprocessing
+import pickle
+import subprocess
+import sys
+import textwrap
 
 import numpy as np
 import pytest
@@ -14,7 +20,11 @@ from h5py_like.test_utils import (
     GroupTestBase,
     ModeTestBase,
 )
-from pyn5 import File
+import pyn5
+from pyn5 import File, build_pyramid, rechunk
+from pyn5.pyramid import pyramid_tile_shape
+from pyn5.dataset import Dataset
+from pyn5.rechunk import main as rechunk_main, tile_shape
 
 from .common import blocks_hash
 from .common import blocks_in, attrs_in
@@ -88,6 +98,16 @@ def test_data_ordering(file_, h5_file):
     assert np.allclose(file_["ds"][:], h5_file["ds"][:])
 
 
+def test_read_c_contiguous(file_):
+    shape = (5, 10, 15)
+    data = np.arange(np.product(shape)).reshape(shape)
+    ds = file_.create_dataset("ds", data=data, chunks=(4, 4, 4))
+
+    arr = ds[1:, :7, 3:]
+    assert arr.flags.c_contiguous
+    np.testing.assert_equal(arr, data[1:, :7, 3:])
+
+
 def test_created_dirs(file_):
     shape = (10, 20)
     data = np.ones(shape)
@@ -145,3 +165,700 @@ def test_compression_opts(file_, compression_name_opt):
     assert compression_dict.pop("type") == compression
     if opt is not None:
         assert list(compression_dict.values()).pop() == opt
+
+
+def test_read_direct(file_):
+    data = np.arange(10 * 20, dtype=np.uint16).reshape((10, 20))
+    ds = file_.create_dataset("ds", data=data, chunks=(3, 7))
+
+    dest = np.zeros((12, 22), dtype=data.dtype)
+    ds.read_direct(dest, np.s_[2:8, 5:], np.s_[1:7, 2:17])
+
+    expected = np.zeros_like(dest)
+    expected[1:7, 2:17] = data[2:8, 5:]
+    np.testing.assert_equal(dest, expected)
+
+
+def test_read_direct_fallback(file_):
+    data = np.arange(10 * 20, dtype=np.uint16).reshape((10, 20))
+    ds = file_.create_dataset("ds", data=data, chunks=(3, 7))
+
+    dest = np.zeros((5, 20), dtype=np.float64)
+    ds.read_direct(dest, np.s_[::2])
+
+    np.testing.assert_equal(dest, data[::2])
+
+
+@pytest.mark.parametrize(
+    "sl",
+    [
+        np.s_[::4, ::3],
+        np.s_[1::3, 2:17:5],
+        np.s_[::-2, 3],
+        np.s_[::-3, 5::-4],
+        np.s_[2, 1::7],
+    ],
+)
+def test_getitem_strided(file_, sl):
+    data = np.arange(10 * 20, dtype=np.uint16).reshape((10, 20))
+    ds = file_.create_dataset("ds", data=data, chunks=(3, 7))
+
+    np.testing.assert_equal(ds[sl], data[sl])
+
+
+def test_getitem_strided_skips_blocks(file_):
+    data = np.arange(12 * 12, dtype=np.uint16).reshape((12, 12))
+    ds = file_.create_dataset("ds", data=data, chunks=(2, 2), compression="gzip")
+    # blocks with odd grid positions contain no voxel selected by [::4]
+    for path in ds._path.glob("*/*"):
+        if any(int(p) % 2 for p in path.relative_to(ds._path).parts):
+            path.write_bytes(b"not a block")
+
+    np.testing.assert_equal(ds[::4, ::4], data[::4, ::4])
+    with pytest.raises(OSError):
+        ds[::3, ::3]
+
+
+def test_read_points(file_, random):
+    data = random.randint(1, 1000, (10, 20, 15)).astype(np.uint16)
+    ds = file_.create_dataset(
+        "ds", shape=data.shape, dtype=data.dtype, chunks=(3, 7, 4), fillvalue=5
+    )
+    # leave some chunks missing
+    ds[:6] = data[:6]
+    expected_data = data.copy()
+    expected_data[6:] = 5
+
+    coords = np.stack([random.randint(0, n, 500) for n in data.shape], axis=1)
+    np.testing.assert_equal(ds.read_points(coords), expected_data[tuple(coords.T)])
+    # views with negative strides are copied before reaching rust
+    reversed_coords = coords[::-1]
+    np.testing.assert_equal(
+        ds.read_points(reversed_coords), expected_data[tuple(reversed_coords.T)]
+    )
+
+    coords[::7, 1] = -1
+    coords[::11, 2] = 15
+    with pytest.raises(ValueError):
+        ds.read_points(coords)
+
+    arr = ds.read_points(coords, fill_value=0)
+    outside = (coords[:, 1] < 0) | (coords[:, 2] >= 15)
+    assert np.all(arr[outside] == 0)
+    np.testing.assert_equal(arr[~outside], expected_data[tuple(coords[~outside].T)])
+
+
+def test_read_many(file_, random):
+    data = random.randint(0, 1000, (10, 20, 15)).astype(np.int32)
+    ds = file_.create_dataset("ds", data=data, chunks=(3, 7, 4))
+    shape = (4, 5, 6)
+    offsets = np.stack(
+        [random.randint(0, n - s + 1, 30) for n, s in zip(data.shape, shape)], axis=1
+    )
+    expected = np.stack(
+        [
+            data[tuple(slice(o, o + s) for o, s in zip(offset, shape))]
+            for offset in offsets
+        ]
+    )
+
+    np.testing.assert_equal(ds.read_many(offsets, shape), expected)
+
+    out = np.zeros((30,) + shape, dtype=data.dtype)
+    assert ds.read_many(offsets, shape, out) is out
+    np.testing.assert_equal(out, expected)
+
+    offsets[3] = (7, 0, 0)
+    with pytest.raises(ValueError):
+        ds.read_many(offsets, shape)
+
+
+def test_pickle(file_):
+    data = np.arange(10 * 20, dtype=np.uint16).reshape((10, 20))
+    ds = file_.create_dataset("group/ds", data=data, chunks=(3, 7))
+    ds.threads = 2
+
+    ds2 = pickle.loads(pickle.dumps(ds))
+    assert ds2.name == ds.name
+    assert ds2.threads == 2
+    assert ds2.mode.writable
+    np.testing.assert_equal(ds2[:], data)
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="needs fork")
+def test_read_many_forked(file_):
+    data = np.arange(10 * 20, dtype=np.uint16).reshape((10, 20))
+    ds = file_.create_dataset("ds", data=data, chunks=(3, 7))
+    offsets = [(0, 0), (5, 11), (2, 3)]
+    expected = ds.read_many(offsets, (4, 8))  # starts the thread pool in this process
+
+    ctx = multiprocessing.get_context("fork")
+    queue = ctx.Queue()
+    proc = ctx.Process(target=lambda: queue.put(ds.read_many(offsets, (4, 8)).tolist()))
+    proc.start()
+    try:
+        # the child hangs if it uses the threads it did not inherit
+        np.testing.assert_equal(queue.get(timeout=30), expected)
+    finally:
+        proc.join(5)
+        proc.terminate()
+
+
+@pytest.mark.parametrize("dtype", ["uint8", "int16", "float64"])
+def test_mmap(file_, random, dtype):
+    data = (random.random_sample((10, 13, 7)) * 100).astype(dtype)
+    ds = file_.create_dataset(
+        "ds",
+        shape=data.shape,
+        dtype=dtype,
+        chunks=(3, 4, 5),
+        compression="raw",
+        fillvalue=7,
+    )
+    ds[:6] = data[:6]
+    ds[8:] = data[8:]
+    expected = data.copy()
+    expected[6:8] = 7
+
+    ds.use_mmap = True
+    for sl in [np.s_[...], np.s_[2:9, 3:11, 4:], np.s_[4, 5], np.s_[1:3, 4:6, 5:7]]:
+        np.testing.assert_equal(ds[sl], expected[sl])
+
+    # copies by default, so rewriting the chunk does not invalidate earlier reads
+    arr = ds[1:3, 4:6, 0:2]
+    ds[:3, 4:8, :5] = 0
+    np.testing.assert_equal(arr, expected[1:3, 4:6, 0:2])
+    ds[:6] = data[:6]
+
+    ds.mmap_views = True
+    arr = ds[1:3, 4:6, 0:2]
+    np.testing.assert_equal(arr, expected[1:3, 4:6, 0:2])
+    if np.dtype(dtype).itemsize == 1:
+        assert not arr.flags.owndata and not arr.flags.writeable
+    del arr
+
+    out = np.zeros(data.shape, dtype)
+    ds.read_direct(out)
+    np.testing.assert_equal(out, expected)
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="needs the resource module")
+def test_read_direct_peak_rss(tmp_path):
+    """Reading into a preallocated array should not allocate another ROI-sized array"""
+    shape = (128, 256, 256)
+    nbytes = int(np.prod(shape)) * 4
+    fpath = tmp_path / "test.n5"
+
+    write_script = f"""
+        import numpy as np
+        import pyn5
+
+        f = pyn5.File({str(fpath)!r}, "a")
+        ds = f.create_dataset(
+            "ds", shape={shape}, dtype="float32", chunks=(64, 64, 64), compression="raw"
+        )
+        for z in range(0, {shape[0]}, 64):
+            ds[z:z + 64] = np.full((64,) + {shape[1:]}, z, dtype="float32")
+    """
+    read_script = f"""
+        import resource
+        import numpy as np
+        import pyn5
+
+        ds = pyn5.File({str(fpath)!r}, "r")["ds"]
+        dest = np.ones({shape}, dtype="float32")
+        before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        ds.read_direct(dest)
+        after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        assert dest[-1, -1, -1] == {shape[0] - 64}
+        print((after - before) * (1 if {sys.platform == "darwin"} else 1024))
+    """
+
+    for script in (write_script, read_script):
+        result = subprocess.run(
+            [sys.executable, "-c", textwrap.dedent(script)],
+            check=True,
+            stdout=subprocess.PIPE,
+        )
+
+    rss_increase = int(result.stdout)
+    assert rss_increase < nbytes / 4
+
+
+def test_read_write_blocks(file_):
+    ds = file_.create_dataset("ds", shape=(10, 7), dtype="uint8", chunks=(4, 4))
+    data = np.arange(3 * 4 * 4, dtype=np.uint8).reshape((3, 4, 4))
+
+    ds.write_blocks([[0, 0], [1, 1], [2, 0]], data)
+
+    expected = np.zeros(ds.shape, ds.dtype)
+    expected[:4, :4] = data[0]
+    expected[4:8, 4:] = data[1, :, :3]
+    expected[8:, :4] = data[2, :2]
+    np.testing.assert_equal(ds[:], expected)
+
+    stacked = ds.read_blocks([[1, 1], [2, 1]])
+    assert stacked.shape == (2, 4, 4)
+    np.testing.assert_equal(stacked[0, :, :3], data[1, :, :3])
+    assert not stacked[0, :, 3:].any()
+    assert not stacked[1].any()
+
+    listed = ds.read_blocks([[2, 0], [2, 1]], stack=False)
+    np.testing.assert_equal(listed[0], data[2, :2])
+    assert listed[1] is None
+
+
+def test_file_block_cache(tmp_path):
+    with File(tmp_path / "test.n5", block_cache=2**20) as f:
+        ds = f.create_dataset(
+            "ds", data=np.arange(100).reshape((10, 10)), chunks=(5, 5)
+        )
+        ds[:]
+        ds[:5, :5]
+        assert f.block_cache.hits == 1
+        assert f.block_cache.misses == 4
+
+        # the cache is shared with other handles on the same dataset
+        f["ds"][:5, :5] = 0
+        assert not ds[:5, :5].any()
+        assert f["ds"].block_cache.stats() == f.block_cache.stats()
+
+
+def test_attrs_cached(file_):
+    attrs = file_.create_group("g").attrs
+    attrs["a"] = [1, 2]
+    assert attrs["a"] == [1, 2]
+
+    # mutating a returned value does not affect the cache
+    attrs["a"].append(3)
+    assert attrs["a"] == [1, 2]
+
+    # changes made elsewhere are picked up
+    with open(attrs._path, "w") as f:
+        json.dump({"a": [4], "b": 5}, f)
+    assert attrs["a"] == [4]
+    assert set(attrs) == {"a", "b"}
+
+
+def test_attrs_batch(file_):
+    attrs = file_.create_group("g").attrs
+
+    with attrs.batch():
+        for i in range(10):
+            attrs[str(i)] = i
+        assert attrs["9"] == 9
+        assert not attrs._path.exists()
+    assert attrs_in(attrs._path.parent) == {str(i): i for i in range(10)}
+    assert [p.name for p in attrs._path.parent.iterdir()] == ["attributes.json"]
+
+    with pytest.raises(RuntimeError):
+        with attrs.batch():
+            del attrs["0"]
+            raise RuntimeError()
+    assert "0" in attrs
+
+    attrs.update({"0": "zero"}, ten=10)
+    assert attrs_in(attrs._path.parent)["0"] == "zero"
+    assert attrs["ten"] == 10
+
+
+def test_fillvalue(file_):
+    ds = file_.create_dataset(
+        "ds", shape=(4, 4), dtype="int16", chunks=(2, 2), fillvalue=-1
+    )
+    assert ds.fillvalue == -1
+    assert attrs_in(ds._path)["fillValue"] == -1
+    assert (file_["ds"][:] == -1).all()
+
+    ds[:2, :1] = 5
+    expected = np.full((4, 4), -1)
+    expected[:2, :1] = 5
+    np.testing.assert_equal(file_["ds"][:], expected)
+
+
+def test_write_empty_chunks(file_):
+    ds = file_.create_dataset("ds", shape=(4, 4), dtype="uint8", chunks=(2, 2))
+    ds[:] = 1
+    ds.write_empty_chunks = False
+    ds[:2] = 0
+    assert blocks_in(ds._path) == {"0", "1", "0/1", "1/1"}
+    np.testing.assert_equal(ds[:], [[0] * 4] * 2 + [[1] * 4] * 2)
+
+
+def test_chunk_index(file_):
+    ds = file_.create_dataset("ds", shape=(10, 7), dtype="uint16", chunks=(4, 4))
+    assert len(ds.chunk_index()) == 0
+    assert ds.nonempty_bounding_box() is None
+    assert ds.nbytes_stored == 0
+
+    ds[5:9, 6] = 1
+    np.testing.assert_equal(ds.chunk_index(), [[1, 1], [2, 1]])
+    assert list(ds.iter_chunks()) == [
+        (slice(4, 8), slice(4, 7)),
+        (slice(8, 10), slice(4, 7)),
+    ]
+    assert ds.nonempty_bounding_box() == (slice(4, 10), slice(4, 7))
+
+    positions, sizes = ds.chunk_index(sizes=True)
+    assert ds.nbytes_stored == sizes.sum() > 0
+    assert ds.compression_ratio == (4 * 3 + 2 * 3) * 2 / ds.nbytes_stored
+
+    # resized and written through another handle
+    other = file_["ds"]
+    other.resize((14, 7))
+    other[12, 0] = 1
+    np.testing.assert_equal(ds.chunk_index(), [[1, 1], [2, 1], [3, 0]])
+    assert ds._shape == (14, 7)
+
+
+def test_stats(file_):
+    ds = file_.create_dataset("ds", shape=(10, 20), dtype="int32", chunks=(5, 10))
+    pyn5.set_stats_enabled(True)
+    try:
+        ds[:] = np.arange(200, dtype=np.int32).reshape((10, 20))
+        ds[2:7, 3:12]
+        stats = ds.stats()
+    finally:
+        pyn5.set_stats_enabled(False)
+    assert stats["blocks_written"] == 4
+    assert stats["blocks_read"] == 4
+
+    # reopening after a resize through another handle keeps the counts
+    file_["ds"].resize((12, 20))
+    assert ds.shape == (12, 20)
+    assert ds.stats() == stats
+
+    ds.reset_stats()
+    assert ds.stats()["blocks_read"] == 0
+
+
+def test_aread_awrite(file_):
+    ds = file_.create_dataset("ds", shape=(10, 20), dtype="int32", chunks=(3, 7))
+    data = np.arange(200, dtype=np.int32).reshape((10, 20))
+
+    async def main():
+        await ds.awrite(..., data)
+        crops = [ds.aread((slice(i, i + 3), slice(None, None, 2))) for i in range(8)]
+        return await asyncio.gather(*crops, ds.aread((4, 5)))
+
+    crops = asyncio.run(main())
+    for i, crop in enumerate(crops[:-1]):
+        np.testing.assert_equal(crop, data[slice(i, i + 3), ::2])
+    assert crops[-1] == data[4, 5]
+    np.testing.assert_equal(ds[:], data)
+
+
+def test_aread_cancel(file_):
+    ds = file_.create_dataset("ds", data=np.ones((100, 100)), chunks=(1, 1))
+
+    async def main():
+        task = asyncio.ensure_future(ds.aread())
+        await asyncio.sleep(0)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(main())
+
+
+@pytest.mark.parametrize("order", ["C", "F", "morton"])
+def test_iter_blocks(file_, order):
+    data = np.arange(10 * 13, dtype=np.uint16).reshape((10, 13))
+    ds = file_.create_dataset("ds", data=data, chunks=(3, 4))
+
+    seen = np.zeros(data.shape, dtype=int)
+    tiles = list(ds.iter_blocks(np.s_[1:, 2:12], tile_shape=(5, 4), order=order))
+    for slices, arr in tiles:
+        np.testing.assert_equal(arr, data[slices])
+        seen[slices] += 1
+    assert (seen[1:, 2:12] == 1).all()
+    assert seen.sum() == 9 * 10
+    # tiles are rounded up to (6, 4)
+    assert len(tiles) == 2 * 3
+    assert tiles[0][0] == (slice(1, 6), slice(2, 4))
+    second = {
+        "C": (slice(1, 6), slice(4, 8)),
+        "F": (slice(6, 10), slice(2, 4)),
+        "morton": (slice(1, 6), slice(4, 8)),
+    }
+    assert tiles[1][0] == second[order]
+
+
+def test_iter_blocks_early_exit(file_):
+    ds = file_.create_dataset("ds", data=np.ones((20, 20)), chunks=(2, 2))
+    for i, (slices, arr) in enumerate(ds.iter_blocks(prefetch=5)):
+        assert arr.shape == (2, 2)
+        if i == 3:
+            break
+    assert slices == (slice(0, 2), slice(6, 8))
+
+
+def test_resize(file_):
+    data = np.arange(10 * 10, dtype=np.uint8).reshape((10, 10))
+    ds = file_.create_dataset("ds", data=data, chunks=(4, 4))
+    other = file_["ds"]
+    assert ds.maxshape == (None, None)
+
+    ds.resize((12, 10))
+    assert ds.shape == other.shape == (12, 10)
+    assert attrs_in(ds._path)["dimensions"] == [10, 12]
+    np.testing.assert_equal(ds[:10], data)
+    assert not other[10:].any()
+
+    ds.resize(6, axis=0)
+    assert other.shape == (6, 10)
+    assert not [p for p in blocks_in(ds._path) if p.endswith("/2")]
+    np.testing.assert_equal(ds[:], data[:6])
+
+    # growing again does not resurrect truncated data
+    ds.resize((10, 10))
+    expected = data.copy()
+    expected[6:] = 0
+    np.testing.assert_equal(other[:], expected)
+
+
+def test_shape_stat_once(file_, monkeypatch):
+    ds = file_.create_dataset(
+        "ds", data=np.ones((10, 10), dtype=np.uint8), chunks=(4, 4)
+    )
+    calls = []
+    stat = ds._attrs._stat
+    monkeypatch.setattr(ds._attrs, "_stat", lambda: calls.append(1) or stat())
+
+    ds[2:5, 3]
+    assert len(calls) == 1
+    ds[2:5, 3] = 2
+    assert len(calls) == 2
+
+
+def test_append(file_):
+    ds = file_.create_dataset("ds", shape=(0, 3), dtype="float32", chunks=(2, 3))
+    assert ds.append(np.ones((3, 3))) == (slice(0, 3), slice(0, 3))
+    ds.append([2, 2, 2])
+    assert ds.shape == (4, 3)
+    np.testing.assert_equal(ds[:, 0], [1, 1, 1, 2])
+
+    for data in (np.ones((1, 4)), np.ones((1, 2)), np.ones(2), np.ones((1, 1, 3))):
+        with pytest.raises(ValueError):
+            ds.append(data)
+    assert ds.shape == (4, 3)
+
+
+def test_copy(file_, tmp_path):
+    data = np.arange(10 * 7, dtype=np.int64).reshape((10, 7))
+    ds = file_.create_dataset("g/ds", data=data, chunks=(4, 4), compression="gzip")
+    ds.attrs["a"] = 1
+    file_["g"].attrs["b"] = 2
+    file_.create_group("g/sub/subsub")
+
+    file_.copy("g/ds", "ds_copy")
+    copied = file_["ds_copy"]
+    np.testing.assert_equal(copied[:], data)
+    assert copied.attrs["a"] == 1
+    assert blocks_hash(copied._path) == blocks_hash(ds._path)
+
+    other = File(tmp_path / "other.n5", "a")
+    file_.copy(file_["g"], other)
+    np.testing.assert_equal(other["g/ds"][:], data)
+    assert other["g"].attrs["b"] == 2
+    assert "subsub" in other["g/sub"]
+
+    other.copy("g", other, name="shallow", shallow=True, without_attrs=True)
+    assert "b" not in other["shallow"].attrs
+    assert "a" not in other["shallow/ds"].attrs
+    assert "subsub" not in other["shallow/sub"]
+    np.testing.assert_equal(other["shallow/ds"][:], data)
+
+    with pytest.raises(FileExistsError):
+        other.copy("g", other)
+    with pytest.raises(ValueError):
+        other.copy("g", "g/sub/g")
+
+
+def test_tile_shape():
+    # aligned to both chunkings where possible
+    assert tile_shape((100, 100), (4, 6), (6, 4), 1, 10000) == (84, 108)
+    assert tile_shape((100, 100), (4, 6), (6, 4), 1, 144) == (12, 12)
+    # falls back to destination chunks
+    assert tile_shape((100, 100), (4, 6), (6, 4), 1, 100) == (6, 16)
+    assert tile_shape((100, 100), (4, 6), (6, 4), 1, 1) == (6, 4)
+
+
+def test_rechunk(file_):
+    data = np.arange(20 * 30, dtype=np.uint16).reshape((20, 30))
+    data[:10, :10] = 0
+    src = file_.create_dataset("src", data=data, chunks=(4, 6), compression="gzip")
+
+    dst = rechunk(src, file_, "dst", chunks=(10, 5), compression="raw", max_mem=600)
+    assert dst.chunks == (10, 5)
+    assert dst.attrs._attributes()["compression"]["type"] == "raw"
+    np.testing.assert_equal(dst[:], data)
+    assert (0, 0) not in {tuple(p) for p in dst.chunk_index().tolist()}
+
+    copied = rechunk(src, file_, "copied")
+    assert blocks_hash(copied._path) == blocks_hash(src._path)
+
+
+def test_rechunk_resume(file_, monkeypatch):
+    data = np.arange(20 * 30, dtype=np.uint16).reshape((20, 30))
+    data[10:, 20:] = 0
+    src = file_.create_dataset("src", data=data, chunks=(4, 6))
+
+    # interrupt the copy in (10, 10) tiles while writing the third,
+    # leaving a truncated chunk
+    setitem = Dataset.__setitem__
+
+    def interrupted(self, args, val):
+        if self.name == "/dst" and args == (slice(0, 10), slice(20, 30)):
+            chunk = Path(self._path) / "2" / "0"
+            chunk.parent.mkdir(exist_ok=True)
+            chunk.write_bytes(b"\0\0")
+            raise RuntimeError("interrupted")
+        return setitem(self, args, val)
+
+    monkeypatch.setattr(Dataset, "__setitem__", interrupted)
+    with pytest.raises(RuntimeError):
+        rechunk(src, file_, "dst", chunks=(10, 10), max_mem=600)
+    monkeypatch.undo()
+
+    dst = file_["dst"]
+    assert dst.attrs["rechunkProgress"] == {"tileShape": [10, 10], "tilesDone": 2}
+    # tiles recorded as written are not copied again
+    dst[:10, :20] = 1
+
+    rechunk(src, file_, "dst", chunks=(10, 10), max_mem=600)
+    expected = data.copy()
+    expected[:10, :20] = 1
+    np.testing.assert_equal(dst[:], expected)
+    assert "rechunkProgress" not in dst.attrs
+    # the all-fill tile was never written, but the copy is complete
+    assert (1, 2) not in {tuple(p) for p in dst.chunk_index().tolist()}
+
+    file_.create_dataset("bad", shape=(1, 1), dtype=data.dtype)
+    with pytest.raises(ValueError):
+        rechunk(src, file_, "bad")
+
+
+def test_rechunk_main(file_, tmp_path):
+    data = np.arange(20 * 30, dtype=np.uint16).reshape((20, 30))
+    file_.create_dataset("g/src", data=data, chunks=(4, 6))
+    other = tmp_path / "other.n5"
+    rechunk_main(
+        [str(file_.filename), "g/src", str(other), "h/dst", "-c", "10,10", "-m", "1K"]
+    )
+    dst = File(other, "r")["h/dst"]
+    assert dst.chunks == (10, 10)
+    np.testing.assert_equal(dst[:], data)
+
+
+def downsample_reference(arr, factors, method):
+    """Downsample with truncated windows at the upper edges, one window at a time"""
+    shape = tuple(-(-s // f) for s, f in zip(arr.shape, factors))
+    out = np.empty(shape, arr.dtype)
+    for idx in np.ndindex(*shape):
+        window = arr[tuple(slice(i * f, (i + 1) * f) for i, f in zip(idx, factors))]
+        if method == "mean":
+            mean = window.mean()
+            out[idx] = np.floor(mean + 0.5) if arr.dtype.kind in "iu" else mean
+        elif method == "max":
+            out[idx] = window.max()
+        else:
+            values, counts = np.unique(window, return_counts=True)
+            out[idx] = values[np.argmax(counts)]
+    return out
+
+
+def test_pyramid_tile_shape():
+    factors = [(2, 2), (4, 4)]
+    # whole chunks at every level
+    assert pyramid_tile_shape((100, 100), (10, 10), factors, 8, 10**9) == (120, 120)
+    # whole source chunks
+    assert pyramid_tile_shape((100, 100), (10, 10), factors, 8, 400 * 8) == (20, 20)
+    # whole windows
+    assert pyramid_tile_shape((100, 100), (10, 10), factors, 8, 16 * 8) == (4, 4)
+
+
+@pytest.mark.parametrize("method", ["mean", "mode", "max"])
+@pytest.mark.parametrize("dtype", ["uint64", "float32"])
+def test_build_pyramid(file_, method, dtype):
+    data = np.random.RandomState(0).randint(0, 4, (13, 21, 10)).astype(dtype)
+    s0 = file_.create_dataset("pyr/s0", data=data, chunks=(4, 4, 4))
+
+    levels = build_pyramid(s0, [2, (1, 2, 2)], method, max_mem=3 * 8 * 8**3)
+    assert [ds.name for ds in levels] == ["/pyr/s0", "/pyr/s1", "/pyr/s2"]
+
+    expected = data
+    for ds, factors in zip(levels[1:], [(2, 2, 2), (1, 2, 2)]):
+        expected = downsample_reference(expected, factors, method)
+        assert ds.chunks == s0.chunks
+        np.testing.assert_allclose(ds[:], expected, rtol=1e-6)
+
+    assert levels[2].attrs["downsamplingFactors"] == [4, 4, 2]
+    assert file_["pyr"].attrs["scales"] == [[1, 1, 1], [2, 2, 2], [4, 4, 2]]
+
+    # rebuilding overwrites the existing levels
+    s0[:] = 1
+    build_pyramid(s0, [2, (1, 2, 2)], method)
+    np.testing.assert_equal(levels[2][:], 1)
+
+
+def test_build_pyramid_mean_uint64(file_):
+    # means of values above 2 ** 53 are exact
+    top = np.iinfo(np.uint64).max
+    data = np.array([[top, top - 2], [top - 4, top - 6], [1, 2]], dtype=np.uint64)
+    s0 = file_.create_dataset("pyr/s0", data=data, chunks=(2, 2))
+
+    s1 = build_pyramid(s0, [2])[1]
+    np.testing.assert_equal(s1[:], np.array([[top - 3], [2]], dtype=np.uint64))
+
+
+def test_build_pyramid_invalid(file_):
+    ds = file_.create_dataset("ds", shape=(10, 10), dtype="uint8", chunks=(5, 5))
+    with pytest.raises(ValueError):
+        build_pyramid(ds, [2])
+    s0 = file_.create_dataset("pyr/s0", shape=(10, 10), dtype="uint8", chunks=(5, 5))
+    with pytest.raises(ValueError):
+        build_pyramid(s0, [2], method="median")
+    with pytest.raises(ValueError):
+        build_pyramid(s0, [(2, 2, 2)])
+    with pytest.raises(ValueError):
+        build_pyramid(s0, [0])
+
+
+@pytest.mark.parametrize("cache_hierarchy", [False, True])
+def test_hierarchy(tmp_path, cache_hierarchy):
+    f = File(tmp_path / "test.n5", "a", cache_hierarchy=cache_hierarchy)
+    f.create_group("a/b/c")
+    f.create_dataset("a/ds", shape=(4, 4), dtype="uint8", chunks=(2, 2))
+    f["a/ds"][:] = 1
+
+    assert sorted(f["a"]) == ["b", "ds"]
+    assert len(f["a"]) == 2
+    assert "a/b/c" in f
+    assert "/a/ds" in f["a/b"]
+    assert "a/missing" not in f
+
+    visited = []
+    f.visititems(lambda name, obj: visited.append((name, type(obj).__name__)))
+    assert visited == [
+        ("a", "Group"),
+        ("a/b", "Group"),
+        ("a/b/c", "Group"),
+        ("a/ds", "Dataset"),
+    ]
+    np.testing.assert_equal(f["a/ds"][:], 1)
+
+    del f["a/b"]
+    assert "a/b/c" not in f
+    assert list(f["a"]) == ["ds"]
+
+
+def test_hierarchy_cache_stale(tmp_path):
+    f = File(tmp_path / "test.n5", "a", cache_hierarchy=True)
+    f.create_group("a")
+    assert list(f) == ["a"]
+
+    File(tmp_path / "test.n5", "a").create_group("b")
+    assert list(f) == ["a"]
+    f.clear_hierarchy_cache()
+    assert sorted(f) == ["a", "b"]
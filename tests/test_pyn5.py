@@ -2,10 +2,12 @@
 # -*- coding: utf-8 -*-
 
 """Tests for `pyn5` package."""
+
 import unittest
 from pathlib import Path
 import shutil
 import json
+import threading
 
 import numpy as np
 import pytest
@@ -13,7 +15,7 @@ import pytest
 import pyn5
 
 from .common import blocks_in, attrs_in, z5py, blocks_hash
-from .conftest import BLOCKSIZE
+from .conftest import BLOCKSIZE, DS_SIZE
 
 
 def dtype_info(dtype):
@@ -63,6 +65,91 @@ def test_read_write_valid(ds_dtype):
     )
 
 
+def test_read_ndarray_into(ds_dtype):
+    ds, dtype = ds_dtype
+    block_idx = [0, 0, 0]
+
+    expected = valid_block(dtype)
+    ds.write_block(block_idx, expected)
+
+    out = np.zeros(BLOCKSIZE, dtype=dtype, order="F")
+    assert ds.read_ndarray_into(block_idx, out) is None
+    np.testing.assert_equal(out, ravel_block(expected))
+
+
+def test_read_ndarray_into_view(ds_dtype):
+    ds, dtype = ds_dtype
+    expected = valid_block(dtype)
+    ds.write_block([1, 0, 0], expected)
+
+    host = np.ones((6, 6, 6), dtype=dtype)
+    ds.read_ndarray_into([2, 0, 0], host[1:5, 2:4, :2])
+
+    np.testing.assert_equal(host[1:3, 2:4, :2], ravel_block(expected))
+    np.testing.assert_equal(host[3:5, 2:4, :2], np.zeros(BLOCKSIZE))
+    assert np.all(host[0] == 1)
+
+
+def test_read_ndarray_into_step(ds_dtype):
+    ds, dtype = ds_dtype
+    data = np.arange(np.prod(DS_SIZE), dtype=dtype).reshape(DS_SIZE)
+    ds.write_ndarray([0, 0, 0], data, 0, c_order=True)
+
+    out = np.zeros((3, 4, 2), dtype=dtype)
+    ds.read_ndarray_into([1, 0, 5], out, c_order=True, step=[3, 3, 4])
+    np.testing.assert_equal(out, data[1::3, ::3, 5::4])
+
+    with pytest.raises(ValueError):
+        ds.read_ndarray_into([0, 0, 0], out, step=[1, 0, 1])
+
+
+def test_read_points(ds_dtype):
+    ds, dtype = ds_dtype
+    data = np.arange(np.prod(DS_SIZE), dtype=dtype).reshape(DS_SIZE)
+    ds.write_ndarray([0, 0, 0], data, 0)
+
+    points = np.array([[9, 0, 3], [1, 2, 3], [9, 0, 3], [-1, 0, 0]], dtype=np.int64)
+    np.testing.assert_equal(
+        ds.read_points(points[:3]), [data[9, 0, 3], data[1, 2, 3], data[9, 0, 3]]
+    )
+    np.testing.assert_equal(
+        ds.read_points(points, c_order=True, out_of_bounds=1),
+        [data[3, 0, 9], data[3, 2, 1], data[3, 0, 9], 1],
+    )
+    with pytest.raises(ValueError):
+        ds.read_points(points)
+    with pytest.raises(ValueError):
+        ds.read_points(points[1::-1])
+    np.testing.assert_equal(
+        ds.read_points(np.ascontiguousarray(points[1::-1])),
+        [data[1, 2, 3], data[9, 0, 3]],
+    )
+
+
+def test_read_ndarray_into_readonly(ds_dtype):
+    ds, dtype = ds_dtype
+    out = np.zeros(BLOCKSIZE, dtype=dtype)
+    out.flags.writeable = False
+
+    with pytest.raises(ValueError):
+        ds.read_ndarray_into([0, 0, 0], out)
+
+
+def test_c_order(ds_dtype):
+    ds, dtype = ds_dtype
+    data = np.arange(4 * 3 * 5, dtype=dtype).reshape((4, 3, 5))
+
+    ds.write_ndarray([1, 2, 3], data, 0, c_order=True)
+
+    c_arr = ds.read_ndarray([1, 2, 3], data.shape, c_order=True)
+    assert c_arr.flags.c_contiguous
+    np.testing.assert_equal(c_arr, data)
+
+    f_arr = ds.read_ndarray([3, 2, 1], data.shape[::-1])
+    assert f_arr.flags.f_contiguous
+    np.testing.assert_equal(f_arr, data.transpose())
+
+
 def test_read_write_overflow(ds_dtype):
     ds, dtype = ds_dtype
     if np.issubdtype(dtype, np.floating):
@@ -329,3 +416,364 @@ class TestPythonReadWrite(unittest.TestCase):
                 self.n5.read_ndarray(np.array([0, 0, 0]), np.array([1, 2, 3])), data
             )
         )
+
+
+@pytest.fixture
+def global_threads():
+    yield
+    pyn5.set_num_threads(0)
+
+
+@pytest.mark.parametrize("num_threads", [None, 1, 3])
+def test_parallel_read_write(tmp_path, random, num_threads, global_threads):
+    root = tmp_path / "test.n5"
+    shape = (20, 30, 40)
+    data = random.randint(0, 1000, shape).astype(np.uint16)
+
+    pyn5.create_dataset(str(root), "ds", shape, (7, 6, 5), "UINT16")
+    ds = pyn5.DatasetUINT16(str(root), "ds", False)
+    ds.num_threads = num_threads
+    assert ds.num_threads == num_threads
+
+    pyn5.set_num_threads(2)
+    assert pyn5.get_num_threads() == 2
+
+    ds.write_ndarray((0, 0, 0), data, 0)
+    ds.write_ndarray((3, 4, 5), data[3:11, 4:9, 5:30] + 1, 0)
+    expected = data.copy()
+    expected[3:11, 4:9, 5:30] += 1
+
+    np.testing.assert_equal(ds.read_ndarray((0, 0, 0), shape), expected)
+    np.testing.assert_equal(
+        ds.read_ndarray((2, 3, 4), (10, 10, 10)), expected[2:12, 3:13, 4:14]
+    )
+
+
+def test_write_out_of_bounds(tmp_path):
+    root = tmp_path / "test.n5"
+    pyn5.create_dataset(str(root), "ds", (10, 10), (5, 5), "UINT8")
+    ds = pyn5.DatasetUINT8(str(root), "ds", False)
+
+    with pytest.raises(ValueError):
+        ds.write_ndarray((8, 0), np.ones((5, 5), dtype=np.uint8), 0)
+
+
+def test_write_negative_strides(tmp_path):
+    root = tmp_path / "test.n5"
+    pyn5.create_dataset(str(root), "ds", (10, 10), (5, 5), "UINT8")
+    ds = pyn5.DatasetUINT8(str(root), "ds", False)
+    data = np.arange(100, dtype=np.uint8).reshape(10, 10)
+
+    with pytest.raises(ValueError):
+        ds.write_ndarray((0, 0), data[::-1], 0)
+
+    ds.write_ndarray((0, 0), np.ascontiguousarray(data[::-1]), 0)
+    np.testing.assert_equal(ds.read_ndarray((0, 0), (10, 10)), data[::-1])
+
+
+def test_read_write_block_array(ds_dtype):
+    ds, dtype = ds_dtype
+    data = np.asarray(valid_block(dtype), dtype=dtype).reshape(BLOCKSIZE)
+    assert ds.dtype == dtype.name
+
+    assert ds.read_block([1, 2, 3]) is None
+
+    ds.write_block([1, 2, 3], data)
+    np.testing.assert_equal(ds.read_block([1, 2, 3]), data)
+    np.testing.assert_equal(ds.read_ndarray([2, 4, 6], BLOCKSIZE), data)
+
+    ds.write_block([1, 2, 3], data, c_order=True)
+    c_block = ds.read_block([1, 2, 3], c_order=True)
+    assert c_block.flags.c_contiguous
+    np.testing.assert_equal(c_block, data)
+    np.testing.assert_equal(ds.read_ndarray([2, 4, 6], BLOCKSIZE), data.transpose())
+
+
+def test_write_block_edge(tmp_path):
+    root = tmp_path / "test.n5"
+    pyn5.create_dataset(str(root), "ds", (5, 4), (2, 3), "UINT8")
+    ds = pyn5.DatasetUINT8(str(root), "ds", False)
+
+    edge = np.array([[1], [2]], dtype=np.uint8)
+    ds.write_block([2, 0], np.array([[7, 8, 9]], dtype=np.uint8))
+    ds.write_block([2, 1], np.array([[10]], dtype=np.uint8))
+    ds.write_block([1, 1], edge)
+
+    assert ds.read_block([2, 0]).shape == (1, 3)
+    np.testing.assert_equal(ds.read_block([1, 1]), edge)
+    np.testing.assert_equal(ds.read_ndarray([2, 3], (3, 1)).flatten(), [1, 2, 10])
+    np.testing.assert_equal(ds.read_ndarray([4, 0], (1, 4)).flatten(), [7, 8, 9, 10])
+
+    with pytest.raises(ValueError):
+        ds.write_block([1, 1], np.ones((2, 2), dtype=np.uint8))
+
+    with pytest.raises(ValueError):
+        ds.write_block([3, 0], np.ones((2, 3), dtype=np.uint8))
+
+
+def test_read_write_blocks(tmp_path, random):
+    root = tmp_path / "test.n5"
+    pyn5.create_dataset(str(root), "ds", (5, 4), (2, 3), "INT16")
+    ds = pyn5.DatasetINT16(str(root), "ds", False)
+
+    positions = np.array([[0, 0], [2, 1], [1, 0]], dtype=np.uint64)
+    arrays = [
+        random.randint(-100, 100, shape).astype(np.int16)
+        for shape in [(2, 3), (1, 1), (2, 3)]
+    ]
+    ds.write_blocks(positions, arrays)
+
+    blocks = ds.read_blocks(positions)
+    for block, arr in zip(blocks, arrays):
+        np.testing.assert_equal(block, arr)
+    assert ds.read_blocks([[0, 1]]) == [None]
+
+    out = np.full((3, 2, 3), 99, dtype=np.int16)
+    ds.read_blocks_into(positions, out)
+    np.testing.assert_equal(out[0], arrays[0])
+    np.testing.assert_equal(out[1], [[arrays[1][0, 0], 0, 0], [0, 0, 0]])
+
+    with pytest.raises(ValueError):
+        ds.write_blocks(positions, arrays[:2])
+
+
+def test_block_cache(tmp_path):
+    root = tmp_path / "test.n5"
+    pyn5.create_dataset(str(root), "ds", (4, 4), (2, 2), "UINT16")
+    ds = pyn5.DatasetUINT16(str(root), "ds", False)
+    ds.write_ndarray((0, 0), np.arange(16, dtype=np.uint16).reshape((4, 4)), 0)
+
+    cache = pyn5.BlockCache(2**20)
+    ds.block_cache = cache
+    assert ds.block_cache.capacity == 2**20
+
+    first = ds.read_ndarray((0, 0), (4, 4))
+    assert (cache.hits, cache.misses, cache.num_blocks) == (0, 4, 4)
+    np.testing.assert_equal(ds.read_ndarray((0, 0), (4, 4)), first)
+    assert (cache.hits, cache.misses) == (4, 4)
+
+    ds.write_block([0, 0], np.full((2, 2), 100, dtype=np.uint16))
+    assert cache.num_blocks == 3
+    assert ds.read_ndarray((0, 0), (1, 1))[0, 0] == 100
+    assert cache.stats()["misses"] == 5
+
+    cache.reset_counters()
+    cache.clear()
+    assert (cache.hits, cache.misses, cache.nbytes) == (0, 0, 0)
+
+    ds.block_cache = None
+    assert ds.block_cache is None
+
+
+def test_block_cache_concurrent_write(tmp_path):
+    root = tmp_path / "test.n5"
+    pyn5.create_dataset(str(root), "ds", (4, 4), (4, 4), "UINT16")
+    ds = pyn5.DatasetUINT16(str(root), "ds", False)
+    ds.block_cache = pyn5.BlockCache(2**20)
+    ds.num_threads = 4
+    done = threading.Event()
+
+    def read():
+        while not done.is_set():
+            ds.read_ndarray((0, 0), (4, 4))
+
+    readers = [threading.Thread(target=read) for _ in range(4)]
+    for thread in readers:
+        thread.start()
+    try:
+        # a read which started before a write must not cache the old block
+        for value in range(1, 200):
+            ds.write_ndarray((0, 0), np.full((4, 4), value, dtype=np.uint16), 0)
+            assert np.all(ds.read_ndarray((0, 0), (4, 4)) == value)
+    finally:
+        done.set()
+        for thread in readers:
+            thread.join()
+
+
+def test_block_cache_eviction(tmp_path):
+    root = tmp_path / "test.n5"
+    pyn5.create_dataset(str(root), "ds", (8,), (2,), "UINT64")
+    ds = pyn5.DatasetUINT64(str(root), "ds", False)
+    ds.write_ndarray((0,), np.arange(8, dtype=np.uint64), 0)
+
+    # room for two blocks of 2 uint64s, plus bookkeeping
+    ds.block_cache = cache = pyn5.BlockCache(2 * (128 + 16))
+    for _ in range(2):
+        np.testing.assert_equal(ds.read_ndarray((0,), (8,)), np.arange(8))
+    assert cache.num_blocks == 2
+    assert cache.nbytes <= cache.capacity
+    assert cache.hits + cache.misses == 8
+
+
+@pytest.fixture
+def stats_enabled():
+    pyn5.set_stats_enabled(True)
+    yield
+    pyn5.set_stats_enabled(False)
+
+
+def test_stats(tmp_path, stats_enabled):
+    root = tmp_path / "test.n5"
+    pyn5.create_dataset(str(root), "ds", (4, 6), (2, 2), "UINT16")
+    ds = pyn5.DatasetUINT16(str(root), "ds", False)
+    assert pyn5.get_stats_enabled()
+    pyn5.reset_io_stats()
+
+    data = np.arange(16, dtype=np.uint16).reshape((4, 4))
+    ds.write_ndarray((0, 0), data, 0)
+    stats = ds.stats()
+    assert stats["blocks_written"] == 4
+    assert stats["bytes_encoded"] == data.nbytes
+    assert stats["bytes_written"] > 0
+    assert stats["blocks_read"] == 0
+
+    np.testing.assert_equal(ds.read_ndarray((0, 0), (4, 6))[:, :4], data)
+    stats = ds.stats()
+    assert (stats["blocks_read"], stats["blocks_missing"]) == (4, 2)
+    assert stats["bytes_decoded"] == data.nbytes
+    assert stats["bytes_read"] > 0
+    assert all(
+        stats[k] > 0 for k in ("read_ns", "decode_ns", "scatter_ns", "encode_ns")
+    )
+    assert pyn5.io_stats() == stats
+
+    ds.write_ndarray((0, 0), np.zeros((2, 2), dtype=np.uint16), 0, skip_fill=True)
+    assert ds.stats()["blocks_deleted"] == 1
+
+    ds.reset_stats()
+    assert not any(ds.stats().values())
+    assert pyn5.io_stats()["blocks_read"] == 4
+
+    pyn5.set_stats_enabled(False)
+    ds.read_ndarray((0, 0), (4, 6))
+    assert not any(ds.stats().values())
+
+
+def test_fill_value(tmp_path):
+    root = tmp_path / "test.n5"
+    pyn5.create_dataset(str(root), "ds", (4, 3), (2, 2), "FLOAT32")
+    ds = pyn5.DatasetFLOAT32(str(root), "ds", False)
+    assert ds.fill_value == 0
+
+    ds.fill_value = np.nan
+    assert np.isnan(ds.read_ndarray((0, 0), (4, 3))).all()
+    out = np.zeros((1, 2, 2), np.float32)
+    ds.read_blocks_into([[1, 1]], out)
+    assert np.isnan(out).all()
+
+
+def test_write_skip_fill(tmp_path):
+    root = tmp_path / "test.n5"
+    pyn5.create_dataset(str(root), "ds", (4, 4), (2, 2), "UINT8")
+    ds = pyn5.DatasetUINT8(str(root), "ds", False)
+
+    data = np.full((4, 4), 7, dtype=np.uint8)
+    data[:2, :2] = 1
+    ds.write_ndarray((0, 0), data, 0)
+    assert len(blocks_in(root / "ds")) == 4 + 2  # blocks and their directories
+
+    ds.write_ndarray((0, 0), data, 7, skip_fill=True)
+    assert blocks_in(root / "ds") == {"0", "0/0", "1"}
+    np.testing.assert_equal(ds.read_ndarray((0, 0), (2, 2)), data[:2, :2])
+    assert not ds.read_ndarray((2, 2), (2, 2)).any()
+
+    ds.fill_value = 1
+    ds.write_blocks([[0, 0]], [np.ones((2, 2), np.uint8)], skip_fill=True)
+    assert blocks_in(root / "ds") == {"0", "1"}
+    np.testing.assert_equal(ds.read_ndarray((0, 0), (4, 4)), np.ones((4, 4)))
+
+
+def test_block_index(tmp_path):
+    root = tmp_path / "test.n5"
+    pyn5.create_dataset(
+        str(root), "ds", (5, 4, 3), (2, 2, 2), "UINT8", '{"type": "raw"}'
+    )
+    ds = pyn5.DatasetUINT8(str(root), "ds", False)
+
+    positions, sizes = ds.block_index()
+    assert positions.shape == (0, 3)
+    assert sizes.shape == (0,)
+
+    ds.write_block([2, 1, 0], np.ones((1, 2, 2), dtype=np.uint8))
+    ds.write_block([0, 0, 1], np.ones((2, 2, 1), dtype=np.uint8))
+    positions, sizes = ds.block_index()
+    np.testing.assert_equal(positions, [[0, 0, 1], [2, 1, 0]])
+    assert list(sizes) == [(root / "ds" / p).stat().st_size for p in ["0/0/1", "2/1/0"]]
+
+    positions, _ = ds.block_index(c_order=True)
+    np.testing.assert_equal(positions, [[1, 0, 0], [0, 1, 2]])
+
+
+def test_read_write_async(tmp_path):
+    root = tmp_path / "test.n5"
+    pyn5.create_dataset(str(root), "ds", (5, 4), (2, 3), "UINT8")
+    ds = pyn5.DatasetUINT8(str(root), "ds", False)
+    data = np.arange(20, dtype=np.uint8).reshape((5, 4))
+
+    results = []
+    done = threading.Event()
+
+    def callback(error):
+        results.append(error)
+        done.set()
+
+    pending = ds.write_ndarray_async((0, 0), data, 0, callback)
+    assert done.wait(10)
+    assert results == [None]
+    assert not pending.cancelled
+
+    done.clear()
+    out = np.zeros((4, 3), dtype=np.uint8)
+    ds.read_ndarray_into_async((1, 1), out, callback)
+    assert done.wait(10)
+    assert results == [None, None]
+    np.testing.assert_equal(out, data[1:, 1:])
+
+    with pytest.raises(ValueError):
+        ds.write_ndarray_async((1, 1), data, 0, callback)
+
+
+def test_from_attributes(tmp_path):
+    root = tmp_path / "test.n5"
+    pyn5.create_dataset(str(root), "ds", (5, 4), (2, 3), "UINT16", '{"type": "raw"}')
+    attrs = json.loads((root / "ds" / "attributes.json").read_text())
+    handle = pyn5.FileHandle(str(root))
+    assert handle.root_path == str(root)
+
+    ds = pyn5.DatasetUINT16.from_attributes(
+        handle, "ds", attrs["dimensions"], attrs["blockSize"], '{"type": "raw"}'
+    )
+    assert ds.block_shape == [2, 3]
+    data = np.arange(20, dtype=np.uint16).reshape((5, 4), order="F")
+    ds.write_ndarray((0, 0), data, 0)
+
+    other = pyn5.DatasetUINT16(str(root), "ds", True)
+    np.testing.assert_equal(other.read_ndarray((0, 0), (5, 4)), data)
+
+    with pytest.raises(ValueError):
+        pyn5.DatasetUINT16.from_attributes(handle, "ds", [5, 4], [2], '{"type": "raw"}')
+    with pytest.raises(ValueError):
+        pyn5.DatasetUINT16.from_attributes(handle, "ds", [5, 4], [2, 3], "{")
+
+
+@pytest.mark.parametrize("shape", [(7,), (9, 5), (5, 6, 4, 3)])
+def test_python_read_write_nd(tmp_path, random, shape):
+    root = str(tmp_path / "test.n5")
+    pyn5.create_dataset(root, "ds", shape, (2,) * len(shape), "UINT16")
+    ds = pyn5.open(root, "ds", read_only=False)
+
+    data = random.randint(0, 1000, shape)
+    bounds = (np.zeros(len(shape), dtype=int), np.array(shape))
+    pyn5.write(ds, bounds, data)
+    np.testing.assert_equal(pyn5.read(ds, bounds), data)
+
+    # partially covered blocks keep their other contents
+    start = np.ones(len(shape), dtype=int)
+    stop = np.array(shape) - 1
+    pyn5.write(ds, (start, stop), np.zeros(stop - start))
+    inner = tuple(slice(1, s - 1) for s in shape)
+    data[inner] = 0
+    result = pyn5.read(ds, bounds, np.uint16)
+    assert result.dtype == np.uint16
+    np.testing.assert_equal(result, data)